@@ -11,8 +11,9 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-import io
-import contextlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Any, Dict, List, Union
 
@@ -21,53 +22,82 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 scripts_path = os.path.join(current_dir, 'scripts')
 data_file_name = 'concat_all.csv'
 data_path = os.path.join(current_dir, 'data', data_file_name)
+BATCH_WORKERS = 3  # 批次查詢執行緒池大小（所有批次共用，與單筆查詢的執行緒池分開）
+QUERY_WORKERS = 4  # 單筆查詢背景執行緒池大小（所有使用者共用）
+LOG_POLL_SECONDS = 0.5  # 背景查詢進行中，畫面更新日誌的間隔（秒）
+BATCH_LOG_TAIL_LINES = 40  # 批次進行中，每筆查詢中項目只顯示最後幾行日誌
 
 if scripts_path not in sys.path:
     sys.path.append(scripts_path)
 
-# --- 嘗試 Import 您的背景程式 (放在 Global Scope 確保一次導入) ---
-backend_script = None
-try:
-    # 這裡假設您的檔案叫做 "商工登記實質受益人查詢.py"
-    import 商工登記實質受益人查詢 as imported_script
-    backend_script = imported_script
-except ImportError as e:
-    # 這裡只會顯示錯誤，但不會讓整個 Streamlit 停止，讓使用者看到介面
-    st.error(f"找不到背景程式，請確認 'scripts' 資料夾下有 '商工登記實質受益人查詢.py'。\n錯誤訊息: {e}")
-except Exception as e:
-    st.error(f"導入背景程式時發生未知錯誤: {e}")
-
-# --- 側邊欄：讀取資料庫 (使用 Streamlit Cache 加速) ---
-@st.cache_data
-def load_company_data(file_path: str) -> pd.DataFrame:
-    """載入並快取公司名單 CSV 資料"""
+from listed_registry import ListedRegistry, get_listed_registry
+from log_channel import LogChannel, capture, install as install_log_routing
+from report_writer import REPORT_FORMATS, available_formats, batch_sheets, report_bytes, result_sheets
+
+# 背景查詢的 print 依查詢分流到各自的日誌頻道
+install_log_routing()
+
+# --- 背景程式在第一次需要查詢時才導入（之後由 sys.modules 沿用），畫面不必等它載入 ---
+def load_backend():
+    """導入背景程式；失敗時顯示錯誤並回傳 None"""
+    try:
+        # 這裡假設您的檔案叫做 "商工登記實質受益人查詢.py"
+        import 商工登記實質受益人查詢 as imported_script
+        return imported_script
+    except ImportError as e:
+        # 這裡只會顯示錯誤，但不會讓整個 Streamlit 停止，讓使用者看到介面
+        st.error(f"找不到背景程式，請確認 'scripts' 資料夾下有 '商工登記實質受益人查詢.py'。\n錯誤訊息: {e}")
+    except Exception as e:
+        st.error(f"導入背景程式時發生未知錯誤: {e}")
+    return None
+
+
+@st.cache_resource
+def get_shared_query_cache(_backend):
+    """所有工作階段共用的查詢快取（一位使用者查過的集團，下一位直接命中）"""
+    return _backend.get_memory_cache()
+
+
+# --- 背景查詢：每筆查詢各自的日誌頻道 ---
+@st.cache_resource
+def get_query_executor() -> ThreadPoolExecutor:
+    """跨 rerun、跨使用者共用的背景查詢執行緒池"""
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+
+
+@st.cache_resource
+def get_batch_executor() -> ThreadPoolExecutor:
+    """所有批次共用的執行緒池；與單筆查詢分開，批次再大也不會讓單筆查詢排隊"""
+    return ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+
+def _run_query_job(backend_script, tax_id: str, refresh: bool, channel: LogChannel):
+    """在背景執行緒中查詢，print 的內容只寫入這筆查詢的 channel"""
+    with capture(channel):
+        if not hasattr(backend_script, 'run_query'):
+            print("錯誤：在背景程式中找不到 'run_query' 函數。")
+            return None
+        return backend_script.run_query(tax_id, refresh=refresh)
+
+
+# --- 側邊欄：讀取資料庫 (與後端共用同一份上市櫃名單) ---
+def load_company_data(file_path: str) -> ListedRegistry:
+    """載入上市櫃名單（統編已正規化為 8 碼，行程內共用、CSV 變動才重建）"""
     st.header("資料庫狀態")
     
     if not os.path.exists(file_path):
         st.warning(f"找不到檔案：{file_path}")
-        return pd.DataFrame()
+        return ListedRegistry({}, {})
 
     try:
-        # 讀取 CSV (假設編碼為 utf-8-sig)
-        df = pd.read_csv(file_path, encoding='utf-8-sig',dtype={'統編': str})
-        
-        # 確保統編是字串格式，避免開頭 0 被吃掉
-        if '統編' in df.columns:
-            #df['統編'] = df['統編'].astype(str)
-            # 先轉成浮點數（處理可能的空值）
-            df['統編'] = pd.to_numeric(df['統編'], errors='coerce')
-            # 移除 NaN 列
-            df = df.dropna(subset=['統編'])
-            # 轉成整數再轉字串，這樣就沒有 .0 了
-            df['統編'] = df['統編'].astype(int).astype(str).str.strip().str.zfill(8)
-        
-        st.success(f"已載入上市櫃名單：{len(df)} 筆")
-        if not df.empty and '統編' in df.columns:
-            st.info(f"範例統編：{df['統編'].head().tolist()}")
-        return df
+        registry = get_listed_registry(file_path)
+        st.success(f"已載入上市櫃名單：{len(registry)} 筆")
+        if len(registry):
+            st.info(f"範例統編：{list(registry.ban_to_name)[:5]}")
+        return registry
     except Exception as e:
         st.error(f"讀取 CSV 失敗: {e}")
-        return pd.DataFrame()
+        return ListedRegistry({}, {})
 
 # --- 介面設定 ---
 st.set_page_config(page_title="實質受益人查詢系統", layout="wide")
@@ -75,63 +105,295 @@ st.title("🔍 商工登記實質受益人查詢系統")
 st.markdown("---")
 
 with st.sidebar:
-    df_companies = load_company_data(data_path)
+    listed_registry = load_company_data(data_path)
+    query_mode = st.radio("查詢模式", ["單筆查詢", "批次查詢"], horizontal=True)
+    with st.expander("查詢快取"):
+        # 背景程式尚未導入時不為了顯示狀態而導入
+        loaded_backend = sys.modules.get("商工登記實質受益人查詢")
+        if loaded_backend is None:
+            st.caption("尚未執行查詢")
+        else:
+            cache_stats = get_shared_query_cache(loaded_backend).stats()
+            lookups = cache_stats["hits"] + cache_stats["misses"]
+            st.caption(
+                f"{cache_stats['entries']} 筆（約 {cache_stats['bytes'] / 1024 / 1024:.1f} MB）；"
+                f"命中率 {cache_stats['hits'] / lookups:.0%}" if lookups else f"{cache_stats['entries']} 筆"
+            )
+            st.caption(f"淘汰 {cache_stats['evictions']} 筆、過期 {cache_stats['expirations']} 筆")
+            if st.button("清除快取"):
+                get_shared_query_cache(loaded_backend).clear()
+
+
+# --- 批次查詢 ---
+def read_tax_id_file(uploaded_file) -> pd.DataFrame:
+    """讀取上傳的 CSV / Excel，回傳 原始值、統編、格式是否正確 三欄"""
+    if uploaded_file.name.lower().endswith(('.xlsx', '.xls')):
+        raw_df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        raw_df = pd.read_csv(uploaded_file, dtype=str, encoding='utf-8-sig')
+    if raw_df.empty:
+        return pd.DataFrame(columns=['原始值', '統編', '格式正確'])
+
+    # 有「統編」欄就用它，否則取第一欄
+    col = '統編' if '統編' in raw_df.columns else raw_df.columns[0]
+    raw = raw_df[col].dropna().astype(str).str.strip()
+    raw = raw[raw != '']
+    cleaned = raw.str.replace(r'\.0$', '', regex=True)
+    valid = cleaned.str.fullmatch(r'\d{7,8}')
+    ids = cleaned.where(~valid, cleaned.str.zfill(8))
+    df = pd.DataFrame({'原始值': raw, '統編': ids, '格式正確': valid})
+    return df.drop_duplicates(subset=['統編']).reset_index(drop=True)
+
+
+def summarize_query_result(result_data: Any) -> Dict[str, Any]:
+    """把 run_query 的回傳值整理成批次摘要的一列"""
+    if not result_data:
+        return {"狀態": "查無資料", "公司名稱": "", "實質受益人": ""}
+    if isinstance(result_data, list):
+        first = result_data[0] if result_data else {}
+        return {"狀態": first.get("狀態", "早退"), "公司名稱": first.get("公司名稱", ""), "實質受益人": ""}
+
+    company_name = ""
+    company_info_df = result_data.get("company_info", pd.DataFrame())
+    if not company_info_df.empty:
+        names = company_info_df.loc[company_info_df['欄位'] == '公司名稱', '內容']
+        company_name = names.iloc[0] if not names.empty else ""
+    owners = []
+    for item in result_data.get("beneficial_owners", []):
+        label = item.get("姓名") or item.get("代表人") or item.get("法人") or item.get("類型")
+        if label:
+            owners.append(str(label))
+    return {"狀態": "完成", "公司名稱": company_name, "實質受益人": "、".join(owners)}
+
+
+def render_report_download(store: Dict[str, Any], make_sheets, base_name: str, key: str) -> None:
+    """選擇格式並按下「產生報表」才寫出檔案；同一格式產生過就直接沿用"""
+    formats = available_formats()
+    fmt = st.selectbox("報表格式", formats, format_func=lambda f: REPORT_FORMATS[f].label, key=f"{key}_format")
+    reports = store.setdefault("reports", {})
+    if fmt not in reports and st.button("產生報表", key=f"{key}_generate"):
+        with st.spinner("報表產生中..."):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            reports[fmt] = (report_bytes(make_sheets(), fmt), f"{base_name}_{timestamp}{REPORT_FORMATS[fmt].extension}")
+    if fmt in reports:
+        data, filename = reports[fmt]
+        st.download_button(
+            f"下載查詢結果 ({REPORT_FORMATS[fmt].label})",
+            data=data,
+            file_name=filename,
+            mime=REPORT_FORMATS[fmt].mime,
+            key=f"{key}_download"
+        )
+
+
+def _start_next_batch_item(job: Dict[str, Any]) -> None:
+    """從批次的待查清單取下一筆送進批次執行緒池；每筆完成時補下一筆，不必等畫面 rerun
+
+    每個批次同時最多 BATCH_WORKERS 筆在池中，多個批次同時執行時輪流取得執行緒。
+    """
+    with job["lock"]:
+        if not job["queue"]:
+            return
+        idx, tax_id = job["queue"].pop(0)
+        channel = LogChannel()
+        future = job["executor"].submit(_run_query_job, job["backend"], tax_id, False, channel)
+        job["items"][idx] = {"tax_id": tax_id, "channel": channel, "future": future}
+    future.add_done_callback(lambda _: _start_next_batch_item(job))
+
+
+def run_batch_screening(ids_df: pd.DataFrame) -> None:
+    """批次篩檢：先一次比對上市櫃名單，其餘交給批次執行緒池，進度由 render_batch_job 輪詢"""
+    summary_df = ids_df[['原始值', '統編']].copy()
+    summary_df['公司名稱'] = ""
+    summary_df['狀態'] = "等待中"
+    summary_df['實質受益人'] = ""
+    summary_df.loc[~ids_df['格式正確'], '狀態'] = "統編格式錯誤"
+
+    # 一次向量化比對上市櫃名單
+    listed_names = ids_df['統編'].map(listed_registry.ban_to_name)
+    listed_mask = ids_df['格式正確'] & listed_names.notna()
+    summary_df.loc[listed_mask, '公司名稱'] = listed_names[listed_mask]
+    summary_df.loc[listed_mask, '狀態'] = "免辨識(上市櫃)"
+
+    pending = summary_df.index[ids_df['格式正確'] & ~listed_mask].tolist()
+
+    backend_script = load_backend() if pending else None
+    if pending and backend_script is None:
+        st.error("無法執行背景程式，請先修復導入錯誤。")
+        st.stop()
+
+    job = {
+        "summary": summary_df,
+        "results": {},
+        "collected": set(),
+        "total": len(pending),
+        "queue": [(idx, summary_df.at[idx, '統編']) for idx in pending],
+        "items": {},
+        "lock": threading.Lock(),
+        "backend": backend_script,
+        "executor": get_batch_executor(),
+    }
+    st.session_state["batch_job"] = job
+    for _ in range(BATCH_WORKERS):
+        _start_next_batch_item(job)
+
+
+def render_batch_job(job: Dict[str, Any]) -> None:
+    """顯示批次進度與查詢中項目的日誌；未完成時定期 rerun 輪詢，完成後存入結果"""
+    summary_df = job["summary"]
+    with job["lock"]:
+        items = dict(job["items"])
+    for idx, item in items.items():
+        future = item["future"]
+        if idx in job["collected"]:
+            continue
+        if not future.done():
+            summary_df.at[idx, '狀態'] = "查詢中"
+            continue
+        try:
+            result_data = future.result()
+            job["results"][item["tax_id"]] = result_data
+            for key, value in summarize_query_result(result_data).items():
+                summary_df.at[idx, key] = value
+        except Exception as e:
+            summary_df.at[idx, '狀態'] = f"失敗: {e}"
+        job["collected"].add(idx)
+
+    done = len(job["collected"])
+    st.progress(done / job["total"] if job["total"] else 1.0, text=f"{done} / {job['total']}")
+    st.dataframe(summary_df, use_container_width=True)
+    active = [item for idx, item in sorted(items.items()) if idx not in job["collected"]]
+    if active:
+        with st.expander("執行日誌（查詢中）", expanded=True):
+            # 每筆查詢各自的頻道，平行查詢的日誌不會交錯；只取最後幾行，每次更新的量與批次大小無關
+            logs = "".join(
+                f"===== 統編 {item['tax_id']} =====\n"
+                + "\n".join(item['channel'].getvalue().splitlines()[-BATCH_LOG_TAIL_LINES:]) + "\n"
+                for item in active
+            )
+            st.code(logs, language="text")
+
+    if done < job["total"]:
+        time.sleep(LOG_POLL_SECONDS)
+        st.rerun()
+
+    st.session_state["batch_summary"] = summary_df
+    st.session_state["batch_results"] = job["results"]
+    st.session_state["batch_reports"] = {}
+    del st.session_state["batch_job"]
+
+
+if query_mode == "批次查詢":
+    st.subheader("批次查詢")
+    st.caption("上傳含統編的 CSV 或 Excel（有「統編」欄位時使用該欄，否則取第一欄）。")
+    uploaded_file = st.file_uploader("上傳統編清單", type=["csv", "xlsx", "xls"])
+    batch_running = "batch_job" in st.session_state
+    batch_btn = st.button("開始批次查詢", type="primary", disabled=uploaded_file is None or batch_running)
+
+    if batch_btn and uploaded_file is not None:
+        try:
+            ids_df = read_tax_id_file(uploaded_file)
+        except Exception as e:
+            st.error(f"讀取上傳檔案失敗: {e}")
+            st.stop()
+        if ids_df.empty:
+            st.warning("檔案中沒有可查詢的統編。")
+            st.stop()
+        run_batch_screening(ids_df)
+
+    if "batch_job" in st.session_state:
+        render_batch_job(st.session_state["batch_job"])
+    elif "batch_summary" in st.session_state:
+        st.dataframe(st.session_state["batch_summary"], use_container_width=True)
+
+    if "batch_results" in st.session_state:
+        render_report_download(
+            st.session_state["batch_reports"],
+            lambda: batch_sheets(st.session_state["batch_summary"], st.session_state["batch_results"]),
+            "batch_beneficial_owners",
+            key="batch"
+        )
+    st.stop()
 
 # --- 主畫面 ---
+job = st.session_state.get("query_job")
+job_running = job is not None and not job["future"].done()
+
 col1, col2 = st.columns([1, 2])
 
 with col1:
     st.subheader("1. 輸入查詢資訊")
     input_tax_id = st.text_input("請輸入統一編號 (8碼)", max_chars=8)
-    run_btn = st.button("開始查詢", type="primary")
+    refresh_mode = st.checkbox("增量重查（只重查董監事有變動的公司，並比對上次結果）")
+    run_btn = st.button("開始查詢", type="primary", disabled=job_running)
 
 with col2:
     st.subheader("2. 執行日誌與結果")
     log_area = st.empty() # 預留位置顯示 Log
     result_area = st.empty() # 預留位置顯示結果
 
+
+def render_query_result(tax_id: str, result_data: Any) -> None:
+    """顯示背景查詢的結果並提供下載"""
+    if not result_data:
+        st.error("程式執行完畢，但沒有回傳資料，請檢查日誌。")
+        return
+
+    if isinstance(result_data, list):
+        # 早退情境（免辨識/非核准設立等）：後端回傳 list
+        st.success("查詢完成（免辨識或早退情境）")
+        df_quick = pd.DataFrame(result_data)
+
+        with result_area.container():
+            st.dataframe(df_quick)
+            csv_quick = df_quick.to_csv(index=False).encode('utf-8-sig')
+            st.download_button("下載查詢結果 (CSV)", csv_quick,
+                               "quick_result.csv", "text/csv")
+        return
+
+    st.success("查詢完成！")
+
+    beneficial_owners = pd.DataFrame(result_data.get("beneficial_owners", []))
+
+    with result_area.container():
+        st.dataframe(beneficial_owners)
+        if "diff" in result_data:
+            if result_data["diff"].empty:
+                st.info("與上次查詢結果相同")
+            else:
+                st.markdown("**與上次查詢的差異**")
+                st.dataframe(result_data["diff"])
+        if "timing" in result_data:
+            with st.expander("各階段耗時"):
+                st.dataframe(result_data["timing"])
+        # 報表只在使用者要下載時才產生
+        render_report_download(job, lambda: result_sheets(result_data),
+                               f"{tax_id}_beneficial_owners", key="single")
+
+
 # --- 執行邏輯 ---
 if run_btn:
-    
+
     # 格式檢查
     if not input_tax_id or len(input_tax_id) != 8 or not input_tax_id.isdigit():
         st.error("請輸入有效的 **8 碼數字** 統一編號。")
         st.stop() # 停止執行後續邏輯
-    
+
     # 統一格式處理
     input_tax_id = input_tax_id.strip().zfill(8)
 
-    
-    # 確保 DataFrame 格式一致
-    if '統編' in df_companies.columns:
-        
-        df_companies['統編'] = df_companies['統編'].astype(str).str.strip().str.zfill(8)
-        #st.write("處理後的統編欄位(前10筆):")
-        #st.write(df_companies['統編'].head(10).tolist())
-    else:
-        st.error("❌ DataFrame 中沒有「統編」欄位!")
-        st.stop()
-    
-    # 比對
-    exempt_company = df_companies[df_companies['統編'] == input_tax_id]
-    # 除錯:顯示比對結果
-    st.write(f"比對結果筆數: {len(exempt_company)}")
-
 
+    # 比對（名單已在載入時正規化，直接 O(1) 查表）
+    listed_name = listed_registry.name_of(input_tax_id)
 
-    if not exempt_company.empty:
+    if listed_name is not None:
         # --- 情況 A: 在名單內 (免辨識) ---
-        
-        # *** 修正：使用 .iloc[0] 取得第一筆資料，避免 'i' undefined 的錯誤 ***
-        if '公司名稱' in exempt_company.columns:
-            # 使用 .iloc[0] 確保獲取唯一匹配項的第一列
-            comp_name = exempt_company.iloc[0]['公司名稱'] 
-        else:
-            comp_name = "未知公司"
-            
+        st.session_state.pop("query_job", None)
+        comp_name = listed_name or "未知公司"
+
         st.success(f"✅ 統編 **{input_tax_id}** ({comp_name}) 位於上市櫃名單中。")
         st.info("💡 依規定：**免除辨識實質受益人**。")
-        
+
         # 產生簡單的 CSV 下載
         res_df = pd.DataFrame([{"統編": input_tax_id, "公司名稱": comp_name, "狀態": "免辨識(上市櫃)"}])
         # 使用 st.download_button 顯示在結果區
@@ -139,88 +401,35 @@ if run_btn:
             st.dataframe(res_df)
             csv = res_df.to_csv(index=False).encode('utf-8-sig')
             st.download_button("下載查詢結果 (CSV)", csv, "exempt_result.csv", "text/csv")
+        st.stop()
 
-    else:
-        # --- 情況 B: 不在名單內 (執行背景程式) ---
-        st.warning(f"統編 {input_tax_id} 不在免辨識名單中，啟動背景程式查詢...")
-        
-        if backend_script is None:
-            # 如果一開始導入失敗，則不再執行後續邏輯
-            st.error("無法執行背景程式，請先修復導入錯誤。")
-            st.stop()
+    # --- 情況 B: 不在名單內 (交給背景執行緒池查詢) ---
+    backend_script = load_backend()
+    if backend_script is None:
+        # 如果一開始導入失敗，則不再執行後續邏輯
+        st.error("無法執行背景程式，請先修復導入錯誤。")
+        st.stop()
 
-        # 捕捉 print 輸出的核心邏輯
-        output_buffer = io.StringIO()
-        result_data: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None
-        
-        try:
-            with st.spinner("背景程式運行中..."):
-                # 使用 redirect_stdout 將 print 導向到 buffer
-                with contextlib.redirect_stdout(output_buffer):
-                    # *** 呼叫您的背景程式 ***
-                    if hasattr(backend_script, 'run_query'):
-                        result_data = backend_script.run_query(input_tax_id)
-                    else:
-                        print("錯誤：在背景程式中找不到 'run_query' 函數。")
-                        
-            # 顯示程式跑出來的 Log (Print 的內容)
-            log_content = output_buffer.getvalue()
-            log_area.code(log_content, language="text", line_numbers=True)
-
-            # 處理結果並提供下載
-            
-            
-            if result_data:
-                
-                if isinstance(result_data, list):
-                        # 早退情境（免辨識/非核准設立等）：後端回傳 list
-                        st.success("查詢完成（免辨識或早退情境）")
-                        df_quick = pd.DataFrame(result_data)
-
-                        with result_area.container():
-                            st.dataframe(df_quick)
-                            csv_quick = df_quick.to_csv(index=False).encode('utf-8-sig')
-                            st.download_button("下載查詢結果 (CSV)", csv_quick,
-                                               "quick_result.csv", "text/csv")
-
-                        # 早退情境不需要再走 Excel 匯出等完整流程
-                        st.stop()
-
-                st.success("查詢完成！")
-            
-                # 取得各表格
-                beneficial_owners = pd.DataFrame(result_data.get("beneficial_owners", []))
-                company_info_df = result_data.get("company_info", pd.DataFrame())
-                holding_process_df = result_data.get("holding_process", pd.DataFrame())
-                warnings_df = result_data.get("warnings", pd.DataFrame())
-                #result_data = backend_script.run_query(input_tax_id)
-            
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    result_data["full_result"].to_excel(writer, sheet_name='完整查詢結果', index=False)
-                    beneficial_owners.to_excel(writer, sheet_name='實質受益人', index=False)
-                    company_info_df.to_excel(writer, sheet_name='公司基本資料', index=False)
-                    holding_process_df.to_excel(writer, sheet_name='持股計算過程', index=False)
-                    warnings_df.to_excel(writer, sheet_name='警示報告', index=False)
-                output.seek(0)
-            
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{input_tax_id}_beneficial_owners_{timestamp}.xlsx"
-            
-                with result_area.container():
-                    st.dataframe(beneficial_owners)
-                    st.download_button(
-                        "下載完整查詢結果 (Excel)",
-                        data=output,
-                        file_name=filename,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+    channel = LogChannel()
+    job = {
+        "tax_id": input_tax_id,
+        "channel": channel,
+        "future": get_query_executor().submit(_run_query_job, backend_script, input_tax_id, refresh_mode, channel),
+    }
+    st.session_state["query_job"] = job
 
+# --- 背景查詢進度：未完成時定期 rerun 輪詢，畫面不會被查詢卡住 ---
+if job is not None:
+    finished = job["future"].done()
+    # 日誌只來自本次查詢自己的頻道，不會混入其他使用者的輸出
+    log_area.code(job["channel"].getvalue(), language="text", line_numbers=True)
 
-            else:
-                st.error("程式執行完畢，但沒有回傳資料，請檢查日誌。")
+    if not finished:
+        st.warning(f"統編 {job['tax_id']} 不在免辨識名單中，背景程式查詢中...")
+        time.sleep(LOG_POLL_SECONDS)
+        st.rerun()
 
-        except Exception as e:
-            st.error(f"執行背景程式時發生錯誤: {e}")
-            # 發生錯誤還是要把已經 print 的東西秀出來
-            log_area.code(output_buffer.getvalue(), language="text", line_numbers=True)
\ No newline at end of file
+    try:
+        render_query_result(job["tax_id"], job["future"].result())
+    except Exception as e:
+        st.error(f"執行背景程式時發生錯誤: {e}")
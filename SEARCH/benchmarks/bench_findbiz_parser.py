@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+FindBiz 詳細頁解析器微基準
+
+比對 lxml 版與 BeautifulSoup 版解析結果是否完全相同，並量測每頁解析時間。
+頁面來源：
+- --pages 指定的 .html 檔，或 replay.py 錄製的 cassette（.json，取出其中的 FindBiz 詳細頁）
+- 內建的合成頁面（一般頁面，以及含大量所營事業資料與雜訊的大型頁面）
+
+用法：
+    python benchmarks/bench_findbiz_parser.py
+    python benchmarks/bench_findbiz_parser.py --pages saved/*.html cassette.json --number 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from findbiz_parser import parse_with_bs4, parse_with_lxml
+
+
+def load_pages(paths: List[str]) -> List[Tuple[str, str]]:
+    """讀取 (名稱, HTML)；cassette 中只取含 table-striped 的頁面"""
+    pages = []
+    for path in paths:
+        if path.lower().endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+            for key, items in entries.items():
+                for i, item in enumerate(items):
+                    html = item.get("html") or item.get("text") or ""
+                    if "table-striped" in html:
+                        pages.append((f"{os.path.basename(path)}:{key[:60]}#{i}", html))
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def synthetic_page(business_items: int, noise_rows: int) -> str:
+    """仿 FindBiz 詳細頁結構的合成頁面"""
+    nav = "".join(f'<li><a href="/fts/query/{i}.do">選單{i}</a></li>' for i in range(80))
+    items = "<br/>".join(f"{chr(65 + i % 26)}{100000 + i:06d} 測試業別第{i}項業務" for i in range(business_items))
+    rows = [
+        ("統一編號", '12345678 <a href="#">訂閱</a>'),
+        ("登記現況", "核准設立 <span>「查詢最新營業狀況請至財政部稅務入口網」</span>"),
+        ("公司名稱", '測試股份有限公司 <a href="#">Google搜尋</a> <a href="#">國際貿易署廠商英文名稱查詢</a>'),
+        ("資本總額(元)", "1,000,000,000"),
+        ("實收資本額(元)", "850,000,000"),
+        ("每股金額(元)", "10"),
+        ("已發行股份總數(股)", "85,000,000"),
+        ("代表人姓名", "王 小明"),
+        ("公司所在地", '臺北市中正區重慶南路一段122號 <a href="#">電子地圖</a> 電子地圖同地址公司家數: 12'),
+        ("所營事業資料", items),
+    ]
+    rows += [(f"其他欄位{i}", f"<span>說明文字{i}</span><!-- 註解 -->") for i in range(noise_rows)]
+    body = "".join(f'<tr><td class="txt_td"><span>{k}</span></td><td>{v}</td></tr>' for k, v in rows)
+    script = "<script>var data = {" + ",".join(f"k{i}: {i}" for i in range(200)) + "};</script>"
+    return (
+        f"<html><head><title>商工登記公示資料查詢服務</title>{script}<style>.a{{color:red}}</style></head>"
+        f'<body><ul class="nav">{nav}</ul><div class="tab-content">'
+        f'<table class="table table-striped"><tbody>{body}</tbody></table>'
+        f'<table class="table"><tr><td>董監事</td><td>略</td></tr></table></div></body></html>'
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FindBiz 詳細頁解析器比對與微基準")
+    parser.add_argument("--pages", nargs="*", default=[], help=".html 檔或 cassette .json")
+    parser.add_argument("--number", type=int, default=100, help="每頁重複解析次數")
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.pages)
+    pages += [
+        ("合成頁面（一般）", synthetic_page(business_items=15, noise_rows=10)),
+        ("合成頁面（大型）", synthetic_page(business_items=400, noise_rows=60)),
+    ]
+
+    mismatches = 0
+    total_bs4 = total_lxml = 0.0
+    print(f"{'頁面':<40} {'BeautifulSoup(ms)':>18} {'lxml(ms)':>10} {'倍數':>6}")
+    for name, html in pages:
+        expected = parse_with_bs4(html, "12345678")
+        actual = parse_with_lxml(html, "12345678")
+        if actual != expected:
+            mismatches += 1
+            print(f"[ERROR] 解析結果不一致: {name}\n  bs4 : {expected}\n  lxml: {actual}")
+            continue
+        t_bs4 = timeit.timeit(lambda: parse_with_bs4(html, "12345678"), number=args.number) / args.number
+        t_lxml = timeit.timeit(lambda: parse_with_lxml(html, "12345678"), number=args.number) / args.number
+        total_bs4 += t_bs4
+        total_lxml += t_lxml
+        print(f"{name[:40]:<40} {t_bs4 * 1000:>18.3f} {t_lxml * 1000:>10.3f} {t_bs4 / t_lxml:>6.1f}")
+
+    if total_lxml:
+        print(f"合計 {len(pages) - mismatches} 頁：BeautifulSoup {total_bs4 * 1000:.2f} ms，"
+              f"lxml {total_lxml * 1000:.2f} ms（{total_bs4 / total_lxml:.1f} 倍）")
+    if mismatches:
+        print(f"[ERROR] {mismatches} 頁解析結果不一致")
+        sys.exit(1)
+    print("✓ 所有頁面的解析結果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+匯入時間預算檢查
+
+在全新的 Python 行程中量測：
+- import 後端模組所需時間，並確認 pandas、requests、selenium 等較慢的套件尚未被載入；
+- import 報表模組（app_final 啟動時載入）時同樣不載入 pandas、numpy；
+- 只判斷上市櫃名單的 CLI（--listed）從啟動到結束的總時間。
+每項重複數次取最短時間（第一次可能包含編譯 .pyc），超過預算時以結束碼 1 結束。
+
+用法：
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --import-budget 0.3 --cli-budget 0.8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+BACKEND_MODULE = "商工登記實質受益人查詢"
+
+# import 後端時不應載入的套件（第一次使用時才 import）
+DEFERRED_MODULES = ("pandas", "numpy", "requests", "urllib3", "bs4", "lxml", "selenium", "webdriver_manager",
+                    "openpyxl", "http.server", "httpx", "asyncio")
+
+# app_final 啟動時 import 的報表模組，同樣不應載入 DEFERRED_MODULES
+REPORT_MODULE = "report_writer"
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(repeat: int, module: str = BACKEND_MODULE) -> dict:
+    """回傳最短的 import 時間與載入了哪些不應載入的套件"""
+    probe = _IMPORT_PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=SCRIPTS_DIR, check=True,
+                             capture_output=True, text=True, encoding="utf-8").stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        if best is None or sample["elapsed"] < best["elapsed"]:
+            best = sample
+    return best
+
+
+def measure_cli(args: List[str], repeat: int) -> float:
+    """回傳 CLI 從啟動到結束的最短時間（秒）"""
+    script = os.path.join(SCRIPTS_DIR, f"{BACKEND_MODULE}.py")
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script] + args, cwd=SCRIPTS_DIR, check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="後端匯入時間預算檢查")
+    parser.add_argument("--import-budget", type=float, default=0.3, help="import 後端的時間上限（秒）")
+    parser.add_argument("--cli-budget", type=float, default=0.8, help="--listed CLI 總時間上限（秒，含 Python 啟動）")
+    parser.add_argument("--repeat", type=int, default=5, help="每項量測次數（取最短）")
+    args = parser.parse_args(argv)
+
+    failures = []
+    result = measure_import(args.repeat)
+    print(f"import {BACKEND_MODULE}: {result['elapsed'] * 1000:.1f} ms（預算 {args.import_budget * 1000:.0f} ms）")
+    if result["elapsed"] > args.import_budget:
+        failures.append("import 時間超過預算")
+    if result["loaded"]:
+        failures.append(f"import 時已載入: {', '.join(result['loaded'])}")
+
+    report = measure_import(args.repeat, REPORT_MODULE)
+    print(f"import {REPORT_MODULE}: {report['elapsed'] * 1000:.1f} ms")
+    if report["loaded"]:
+        failures.append(f"import {REPORT_MODULE} 時已載入: {', '.join(report['loaded'])}")
+
+    cli_elapsed = measure_cli(["--listed", "00000000"], args.repeat)
+    print(f"CLI --listed: {cli_elapsed * 1000:.1f} ms（預算 {args.cli_budget * 1000:.0f} ms）")
+    if cli_elapsed > args.cli_budget:
+        failures.append("--listed CLI 時間超過預算")
+
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ 匯入時間在預算內")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+本機假 FindBiz / GCIS / opendata.vip 伺服器
+
+單一 HTTP 伺服器依路徑模擬三個外部來源：
+- FindBiz 查詢頁（含 qryCond / qryBtn 表單）、查詢結果頁（panel-heading + a.hover）
+  與公司詳細頁（table-striped）
+- GCIS 董監事 API（支援 $filter 的 or 條件、$skip / $top 分頁）
+- opendata.vip 公司名稱搜尋
+回應內容來自 synthetic_graph.SyntheticWorld，並依來源統計請求次數。
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_graph import SyntheticWorld
+
+FINDBIZ_INIT_PATH = "/fts/query/QueryBar/queryInit.do"
+FINDBIZ_LIST_PATH = "/fts/query/QueryList/queryList.do"
+FINDBIZ_DETAIL_PATH = "/fts/query/QueryCmpyDetail/queryCmpyDetail.do"
+GCIS_DIRECTOR_PATH = "/od/data/api/4E5F7653-1B91-4DDC-99D5-468530FAE396"
+OPENDATA_SEARCH_PATH = "/data/company"
+
+_INIT_PAGE = """<html><body>
+<form id="queryListForm" method="post" action="{action}">
+  <input type="hidden" name="validatorOpen" value="N">
+  <input type="hidden" name="token" value="bench-token">
+  <input type="text" id="qryCond" name="qryCond" value="">
+  <input type="checkbox" name="infoType" value="D" checked>
+  <button id="qryBtn" type="submit">查詢</button>
+</form>
+</body></html>"""
+
+_LIST_PAGE = """<html><body>
+<div class="panel panel-default"><div class="panel-heading">
+  <a class="hover" href="{detail}?banNo={ban}">{name}</a>
+</div></div>
+</body></html>"""
+
+_EMPTY_LIST_PAGE = """<html><body><div class="panel-heading">查無資料</div></body></html>"""
+
+_DETAIL_ROW = "<tr><td>{key}</td><td>{value}</td></tr>"
+
+
+class FakeSites:
+    """在背景執行緒啟動假外部來源；world 可在各次量測之間替換"""
+
+    def __init__(self, world: SyntheticWorld, latency: float = 0.0, port: int = 0):
+        self.world = world
+        self.latency = latency
+        self.counts: Counter = Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def urls(self) -> dict:
+        """後端需要替換的網址設定"""
+        base = self.base_url
+        return {
+            "COMPANY_SEARCH_URL": base + OPENDATA_SEARCH_PATH + "?keyword={keyword}",
+            "FINDBIZ_QUERY_INIT_URL": base + FINDBIZ_INIT_PATH,
+            "FINDBIZ_QUERY_LIST_URL": base + FINDBIZ_LIST_PATH,
+            "FINDBIZ_DETAIL_URL": base + FINDBIZ_DETAIL_PATH,
+            "GCIS_DIRECTOR_API": base + GCIS_DIRECTOR_PATH,
+        }
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.counts.clear()
+            self.bytes_sent = 0
+
+    def start(self) -> "FakeSites":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-sites", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _count(self, source: str, nbytes: int) -> None:
+        with self._lock:
+            self.counts[source] += 1
+            self.bytes_sent += nbytes
+
+    # --- 各來源的回應 ---
+    def findbiz_init(self) -> str:
+        return _INIT_PAGE.format(action=FINDBIZ_LIST_PATH)
+
+    def findbiz_list(self, ban: str) -> str:
+        company = self.world.companies.get(ban)
+        if company is None:
+            return _EMPTY_LIST_PAGE
+        return _LIST_PAGE.format(detail=FINDBIZ_DETAIL_PATH, ban=ban, name=escape(company.名稱))
+
+    def findbiz_detail(self, ban: str) -> Optional[str]:
+        company = self.world.companies.get(ban)
+        if company is None:
+            return None
+        chairman = next((d.姓名 for d in company.董監事 if d.職稱 == "董事長"), "")
+        capital = company.已發行股數 * company.每股金額
+        fields = [
+            ("統一編號", f"{company.統編} 訂閱"),
+            ("登記現況", "核准設立"),
+            ("公司名稱", f"{company.名稱} Google搜尋"),
+            ("資本總額(元)", f"{capital:,}"),
+            ("實收資本額(元)", f"{capital:,}"),
+            ("每股金額(元)", str(company.每股金額)),
+            ("已發行股份總數(股)", f"{company.已發行股數:,}"),
+            ("代表人姓名", chairman),
+            ("公司所在地", "臺北市中正區重慶南路一段122號 電子地圖"),
+            ("所營事業資料", "I103060 管理顧問業 ZZ99999 除許可業務外，得經營法令非禁止或限制之業務"),
+        ]
+        rows = "".join(_DETAIL_ROW.format(key=k, value=escape(v)) for k, v in fields)
+        return f'<html><body><table class="table table-striped">{rows}</table></body></html>'
+
+    def gcis_directors(self, query: dict) -> list:
+        filter_text = query.get("$filter", [""])[0]
+        bans = {m.zfill(8) for m in re.findall(r"Business_Accounting_NO eq (\d+)", filter_text)}
+        rows = []
+        for ban in sorted(bans):
+            company = self.world.companies.get(ban)
+            if company is None:
+                continue
+            for d in company.董監事:
+                rows.append({
+                    "Business_Accounting_NO": company.統編,
+                    "Person_Position_Name": d.職稱,
+                    "Person_Name": d.姓名,
+                    "Juristic_Person_Name": d.所代表法人,
+                    "Person_Shareholding": f"{d.持有股數:,}",
+                    "Person_Investment_Amount": "",
+                })
+        skip = int(query.get("$skip", ["0"])[0] or 0)
+        top = int(query.get("$top", [str(len(rows) or 1)])[0] or len(rows))
+        return rows[skip:skip + top]
+
+    def opendata_search(self, keyword: str) -> dict:
+        company = self.world.by_name.get(keyword.strip())
+        if company is None:
+            return {"output": []}
+        return {"output": [{"Company_Name": company.名稱, "Business_Accounting_NO": company.統編}]}
+
+    def _handler_class(self):
+        sites = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, source: str, body: str, content_type: str, status: int = 200):
+                data = body.encode("utf-8")
+                if sites.latency:
+                    time.sleep(sites.latency)
+                sites._count(source, len(data))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                if parsed.path == FINDBIZ_INIT_PATH:
+                    self._reply("findbiz", sites.findbiz_init(), "text/html; charset=utf-8")
+                elif parsed.path == FINDBIZ_DETAIL_PATH:
+                    html = sites.findbiz_detail(query.get("banNo", [""])[0])
+                    if html is None:
+                        self._reply("findbiz", "not found", "text/plain", status=404)
+                    else:
+                        self._reply("findbiz", html, "text/html; charset=utf-8")
+                elif parsed.path == GCIS_DIRECTOR_PATH:
+                    body = json.dumps(sites.gcis_directors(query), ensure_ascii=False)
+                    self._reply("gcis", body, "application/json; charset=utf-8")
+                elif parsed.path == OPENDATA_SEARCH_PATH:
+                    body = json.dumps(sites.opendata_search(query.get("keyword", [""])[0]), ensure_ascii=False)
+                    self._reply("opendata", body, "application/json; charset=utf-8")
+                else:
+                    self._reply("other", "not found", "text/plain", status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                if urlparse(self.path).path == FINDBIZ_LIST_PATH:
+                    ban = form.get("qryCond", [""])[0].strip()
+                    self._reply("findbiz", sites.findbiz_list(ban), "text/html; charset=utf-8")
+                else:
+                    self._reply("other", "not found", "text/plain", status=404)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+run_query 端對端效能量測
+
+以 fake_sites.py 的本機假伺服器取代 FindBiz / GCIS / opendata.vip，
+對不同規模的合成持股結構執行 run_query，回報牆鐘時間、各來源網路請求數與記憶體峰值。
+不會連到真正的政府網站。
+
+用法：
+    python benchmarks/run_benchmark.py                       # 預設規模
+    python benchmarks/run_benchmark.py --sizes 2x2,3x3,4x3 --cross 0.2 --latency-ms 20
+    python benchmarks/run_benchmark.py --csv result.csv
+    python benchmarks/run_benchmark.py --async               # 改跑 run_query_async（需安裝 httpx）
+
+--sizes 的每一項為 <深度>x<法人股東數>。記憶體峰值以 tracemalloc 另跑一次量測
+（只計 Python 配置的記憶體），避免 tracemalloc 的額外負擔影響計時。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import pandas as pd
+
+from fake_sites import FakeSites
+from listed_registry import DEFAULT_CSV_PATH, get_listed_registry
+from synthetic_graph import SyntheticWorld, generate_world
+
+DEFAULT_SIZES = "2x2,3x2,3x3,4x3"
+
+
+def load_backend():
+    """載入後端並關閉所有會讀寫本機檔案的功能，讓每次量測都從冷快取開始"""
+    import 商工登記實質受益人查詢 as backend
+    backend.PERSISTENT_CACHE_ENABLED = False
+    backend.SNAPSHOT_ENABLED = False
+    backend.NAME_INDEX_ENABLED = False
+    backend.METRICS_TEXTFILE_PATH = None
+    return backend
+
+
+def point_backend_at(backend, sites: FakeSites, rate_limit: Tuple[float, int]) -> None:
+    """把後端的外部網址換成假伺服器，並重建限速器"""
+    for name, url in sites.urls().items():
+        setattr(backend, name, url)
+    backend.RATE_LIMITS = {"127.0.0.1": rate_limit}
+    backend._rate_limiter = None
+
+
+def run_once(backend, sites: FakeSites, world: SyntheticWorld, trace_memory: bool, use_async: bool = False) -> Dict:
+    backend.clear_memory_caches()
+    sites.reset_counts()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if use_async:
+            result = asyncio.run(backend.run_query_async(world.root.統編))
+        else:
+            result = backend.run_query(world.root.統編)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if not isinstance(result, dict) or result["full_result"].empty:
+        raise RuntimeError(f"run_query 未回傳完整結果: {result!r}")
+    return {
+        "elapsed": elapsed,
+        "peak": peak,
+        "counts": dict(sites.counts),
+        "bytes": sites.bytes_sent,
+        "rows": len(result["full_result"]),
+    }
+
+
+def parse_sizes(text: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in text.split(","):
+        depth, fanout = item.lower().split("x")
+        sizes.append((int(depth), int(fanout)))
+    return sizes
+
+
+def run_benchmark(
+    sizes: List[Tuple[int, int]],
+    cross_ratio: float = 0.1,
+    latency: float = 0.0,
+    repeat: int = 3,
+    seed: int = 0,
+    rate_limit: Tuple[float, int] = (1e6, 1000),
+    prune_threshold: Optional[float] = None,
+    prefetch: bool = True,
+    use_async: bool = False
+) -> pd.DataFrame:
+    backend = load_backend()
+    backend.CRAWL_PRUNE_THRESHOLD = prune_threshold
+    backend.PREFETCH_ENABLED = prefetch
+    excluded = set(get_listed_registry().ban_to_name) if os.path.exists(DEFAULT_CSV_PATH) else set()
+    rows = []
+    first_world = generate_world(1, 1, seed=seed)
+    with FakeSites(first_world, latency=latency) as sites:
+        point_backend_at(backend, sites, rate_limit)
+        for depth, fanout in sizes:
+            world = generate_world(depth, fanout, cross_ratio, seed=seed, excluded_bans=excluded)
+            sites.world = world
+            timings = [run_once(backend, sites, world, trace_memory=False, use_async=use_async) for _ in range(repeat)]
+            memory = run_once(backend, sites, world, trace_memory=True, use_async=use_async)
+            best = min(timings, key=lambda r: r["elapsed"])
+            counts = best["counts"]
+            rows.append({
+                "規模": f"{depth}x{fanout}",
+                "公司數": world.size,
+                "董監事數": world.director_count(),
+                "明細列數": best["rows"],
+                "最佳耗時(秒)": round(best["elapsed"], 3),
+                "平均耗時(秒)": round(sum(r["elapsed"] for r in timings) / len(timings), 3),
+                "FindBiz請求": counts.get("findbiz", 0),
+                "GCIS請求": counts.get("gcis", 0),
+                "opendata請求": counts.get("opendata", 0),
+                "回應位元組": best["bytes"],
+                "記憶體峰值(MB)": round(memory["peak"] / 1024 / 1024, 2),
+            })
+            print(f"[INFO] {depth}x{fanout}: {world.size} 家公司，{best['elapsed']:.3f} 秒")
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run_query 端對端效能量測（本機假伺服器）")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="以逗號分隔的 <深度>x<法人股東數>")
+    parser.add_argument("--cross", type=float, default=0.1, help="每家公司額外交叉持股的機率")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="假伺服器每個請求的延遲（毫秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="每個規模計時的次數（取最佳值）")
+    parser.add_argument("--seed", type=int, default=0, help="合成資料亂數種子")
+    parser.add_argument("--prune-threshold", type=float, help="啟用門檻剪枝（例如 0.25）")
+    parser.add_argument("--no-prefetch", action="store_true", help="關閉子法人預取")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="改跑 run_query_async")
+    parser.add_argument("--csv", help="另存結果 CSV 的路徑")
+    args = parser.parse_args(argv)
+
+    df = run_benchmark(
+        parse_sizes(args.sizes),
+        cross_ratio=args.cross,
+        latency=args.latency_ms / 1000.0,
+        repeat=max(1, args.repeat),
+        seed=args.seed,
+        prune_threshold=args.prune_threshold,
+        prefetch=not args.no_prefetch,
+        use_async=args.use_async,
+    )
+    print(df.to_string(index=False))
+    if args.csv:
+        df.to_csv(args.csv, index=False, encoding="utf-8-sig")
+        print(f"✓ 已儲存 {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
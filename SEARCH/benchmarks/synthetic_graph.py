@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+合成持股結構產生器
+
+產生指定深度、每家公司法人股東數（fan-out）與交叉持股比例的公司集團，
+供 fake_sites.py 的假 FindBiz / GCIS / opendata.vip 伺服器回應使用。
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+
+@dataclass
+class Director:
+    職稱: str
+    姓名: str
+    所代表法人: str       # 空字串表示自然人股東
+    持有股數: int
+
+
+@dataclass
+class Company:
+    統編: str
+    名稱: str
+    已發行股數: int
+    每股金額: int = 10
+    董監事: List[Director] = field(default_factory=list)
+
+
+@dataclass
+class SyntheticWorld:
+    root: Company
+    companies: Dict[str, Company]          # 統編 → 公司
+    by_name: Dict[str, Company]            # 名稱 → 公司
+
+    @property
+    def size(self) -> int:
+        return len(self.companies)
+
+    def director_count(self) -> int:
+        return sum(len(c.董監事) for c in self.companies.values())
+
+
+def generate_world(
+    depth: int = 3,
+    fanout: int = 3,
+    cross_ratio: float = 0.1,
+    persons_per_company: int = 2,
+    seed: int = 0,
+    excluded_bans: Optional[Set[str]] = None
+) -> SyntheticWorld:
+    """產生合成集團
+
+    depth：法人股東往上幾層；fanout：每家公司的法人股東數；
+    cross_ratio：每家公司額外持有一家已存在公司（形成交叉持股或循環）的機率。
+    excluded_bans 中的統編（例如上市櫃名單）不會被使用。
+    """
+    rng = random.Random(seed)
+    excluded = excluded_bans or set()
+    companies: Dict[str, Company] = {}
+    next_ban = [90000000]
+
+    def new_company() -> Company:
+        while True:
+            next_ban[0] += 1
+            ban = str(next_ban[0])
+            if ban not in excluded:
+                break
+        company = Company(
+            統編=ban,
+            名稱=f"合成測試{len(companies) + 1}股份有限公司",
+            已發行股數=rng.randrange(1, 100) * 100000,
+        )
+        companies[ban] = company
+        return company
+
+    root = new_company()
+    frontier = [root]
+    for level in range(depth):
+        next_frontier = []
+        for company in frontier:
+            parents = [new_company() for _ in range(fanout)]
+            next_frontier.extend(parents)
+            _fill_directors(rng, company, parents, persons_per_company)
+        frontier = next_frontier
+    for company in frontier:
+        _fill_directors(rng, company, [], persons_per_company)
+
+    # 交叉持股：隨機讓公司多一位代表其他既有公司的董事（可能形成循環）
+    all_companies = list(companies.values())
+    for company in all_companies:
+        if len(all_companies) > 1 and rng.random() < cross_ratio:
+            holder = rng.choice([c for c in all_companies if c is not company])
+            shares = max(1, int(company.已發行股數 * rng.uniform(0.01, 0.1)))
+            company.董監事.append(Director("董事", f"{holder.名稱[:6]}代表人", holder.名稱, shares))
+
+    return SyntheticWorld(root=root, companies=companies, by_name={c.名稱: c for c in all_companies})
+
+
+def _fill_directors(rng: random.Random, company: Company, parents: List[Company], persons: int) -> None:
+    """依法人股東與自然人股東切分已發行股數（總和不超過 90%）"""
+    holders = len(parents) + persons
+    weights = [rng.random() + 0.1 for _ in range(holders)]
+    scale = company.已發行股數 * 0.9 / sum(weights)
+    for i, parent in enumerate(parents):
+        company.董監事.append(Director("董事", f"{parent.名稱[:6]}代表人{i + 1}", parent.名稱, int(weights[i] * scale)))
+    for j in range(persons):
+        title = "董事長" if j == 0 else "監察人"
+        person = f"自然人{company.統編[-4:]}{j + 1}"
+        company.董監事.append(Director(title, person, "", int(weights[len(parents) + j] * scale)))
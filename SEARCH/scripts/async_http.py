@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+非同步 HTTP 連線層
+
+以單一 httpx.AsyncClient 在同一個事件迴圈中同時送出多個請求：
+每個主機一個 asyncio.Semaphore 限制同時進行中的請求數，
+冪等的 GET 遇到連線錯誤或 429/5xx 時依指數退避加隨機抖動重試（與 http_session 相同）。
+傳入 reserve（例如 HostRateLimiter.reserve）時，每次嘗試送出前先取得許可，等待時不阻塞事件迴圈；
+傳入 report 時，每次嘗試的結果（含之後重試的失敗）都會回報。
+asyncio 與 httpx 在第一次使用時才 import。
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse
+
+from http_session import RETRY_STATUS_CODES, retry_delay
+from lazy_module import LazyModule
+
+asyncio = LazyModule("asyncio")
+
+
+class AsyncSingleFlight:
+    """事件迴圈內的請求合併：同一個 key 同時只執行一次，其餘呼叫等待同一個結果"""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # shield：其中一個等待者被取消時不影響其他等待者
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+
+class AsyncHttpSession:
+    """同一事件迴圈內共用的非同步 HTTP 用戶端（async with 或 aclose() 釋放連線）"""
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        host_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = 4,
+        timeout: Tuple[float, float] = (5, 15),
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        backoff_jitter: float = 0.5,
+        reserve: Optional[Callable[[str], float]] = None,
+        report: Optional[Callable[[str, Any, float], None]] = None
+    ):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("非同步查詢需要 httpx，請先執行 pip install httpx") from e
+
+        self._httpx = httpx
+        connect_timeout, read_timeout = timeout
+        self.host_concurrency = dict(host_concurrency or {})
+        self.default_concurrency = max(1, default_concurrency)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.reserve = reserve
+        self.report = report   # report(host, 回應或 None（連線錯誤）, 耗時秒數)
+        self.inflight = AsyncSingleFlight()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            headers=dict(headers or {}),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            follow_redirects=True,
+        )
+
+    def semaphore(self, host: str) -> asyncio.Semaphore:
+        """取得 host 的並行上限 semaphore"""
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, self.host_concurrency.get(host, self.default_concurrency)))
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = retry_delay(attempt, self.backoff_factor, self.backoff_jitter)
+        # 有限速器時 Retry-After 由 report 後的冷卻處理，不重複等待
+        return delay if self.reserve is not None else max(delay, retry_after or 0.0)
+
+    async def get(self, url: str, **kwargs: Any):
+        """送出 GET；重試用盡時回傳最後的回應，連線錯誤則丟出最後的例外"""
+        kwargs.pop("timeout", None)   # 逾時以用戶端設定為準
+        host = urlparse(url).hostname or ""
+        async with self.semaphore(host):
+            for attempt in range(self.retries + 1):
+                wait = self.reserve(host) if self.reserve is not None else 0.0
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                start = time.monotonic()
+                try:
+                    resp = await self._client.get(url, **kwargs)
+                except self._httpx.TransportError:
+                    if self.report is not None:
+                        self.report(host, None, time.monotonic() - start)
+                    if attempt >= self.retries:
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                if self.report is not None:
+                    self.report(host, resp, time.monotonic() - start)
+                if resp.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return resp
+                header = str(resp.headers.get("Retry-After", "")).strip()
+                await asyncio.sleep(self._backoff(attempt, float(header) if header.isdigit() else None))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def __aenter__(self) -> AsyncHttpSession:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
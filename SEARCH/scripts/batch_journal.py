@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+批次查詢的檢查點日誌
+
+每完成一筆查詢就在 JSON Lines 檔尾端追加一行，中斷後重新執行時
+讀回已完成的項目並跳過，不必重新爬取。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Set
+
+# 視為已完成、續跑時不再重查的狀態（error 會重試）
+FINISHED_STATUSES = ("done", "not_found")
+
+
+def serialize_result(result: Any) -> Any:
+    """把 run_query 的回傳值轉成可寫入 JSON 的結構（DataFrame 轉為 records）"""
+    if hasattr(result, "to_json") and hasattr(result, "columns"):
+        return {"__dataframe__": json.loads(result.to_json(orient="records", force_ascii=False))}
+    if isinstance(result, dict):
+        return {k: serialize_result(v) for k, v in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [serialize_result(v) for v in result]
+    return result
+
+
+class BatchJournal:
+    """只追加（append-only）的查詢日誌，可安全地由多個執行緒寫入"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> Dict[str, Dict]:
+        """讀取日誌，回傳 key → 最後一筆紀錄；忽略中斷時寫壞的最後一行"""
+        entries: Dict[str, Dict] = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry.get("key")] = entry
+        return entries
+
+    def finished_keys(self) -> Set[str]:
+        return {k for k, e in self.load().items() if e.get("status") in FINISHED_STATUSES}
+
+    def append(self, key: str, status: str, **fields: Any) -> None:
+        """追加一筆紀錄並立即寫入磁碟"""
+        entry = {"key": key, "status": status, "finished_at": datetime.now().isoformat(timespec="seconds")}
+        entry.update({k: serialize_result(v) for k, v in fields.items()})
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+查詢結果快照（增量重查用）
+
+每次查詢完成後保存董監事鏈的逐公司明細、子公司清單與董監事資料指紋，
+下次以增量模式重查同一客戶時，只重新展開董監事資料有變動的公司，
+並與上次的實質受益人結果比對出差異。
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def director_fingerprint(records: Optional[List[Dict]]) -> Optional[str]:
+    """董監事資料的指紋（與列順序無關）；查無資料時回傳 None"""
+    if not records:
+        return None
+    canonical = sorted(json.dumps(r, ensure_ascii=False, sort_keys=True, default=str) for r in records)
+    return hashlib.sha1("\n".join(canonical).encode("utf-8")).hexdigest()
+
+
+def diff_beneficial_owners(old: Dict[str, float], new: Dict[str, float], tol: float = 1e-6) -> List[Dict]:
+    """比對前後兩次的自然人最終持股，回傳新增、移除與持股變動"""
+    changes = []
+    for name in sorted(set(old) | set(new)):
+        before, after = old.get(name), new.get(name)
+        if before is None:
+            kind = "受益人新增"
+        elif after is None:
+            kind = "受益人移除"
+        elif abs(before - after) > tol:
+            kind = "持股變動"
+        else:
+            continue
+        changes.append({
+            "類型": kind,
+            "名稱": name,
+            "原值": f"{before:.2%}" if before is not None else "",
+            "新值": f"{after:.2%}" if after is not None else "",
+        })
+    return changes
+
+
+class CrawlSnapshotStore:
+    """SQLite 快照庫：每個查詢對象（統編）保留最新一份快照"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots (
+                seed        TEXT PRIMARY KEY,
+                payload     TEXT NOT NULL,
+                created_at  REAL NOT NULL
+            )
+            """
+        )
+
+    def get(self, seed: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM snapshots WHERE seed = ?", (seed,)
+            ).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        payload["created_at"] = row[1]
+        return payload
+
+    def put(self, seed: str, payload: Dict) -> None:
+        text = json.dumps(payload, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (seed, payload, created_at) VALUES (?, ?, ?)",
+                (seed, text, time.time()),
+            )
+
+    def delete(self, seed: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM snapshots WHERE seed = ?", (seed,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+FindBiz 公司詳細頁解析
+
+欄位擷取以 FINDBIZ_FIELDS 宣告（表格標題 → 輸出欄位 → 轉換函數）。
+預設以 lxml 解析，只取基本資料表格中用得到的列；lxml 無法使用或解析失敗時
+退回原本的 BeautifulSoup（html.parser）版本。兩者都在第一次解析時才載入。兩者輸出相同，
+可用 benchmarks/bench_findbiz_parser.py 以實際頁面比對並量測速度。
+"""
+
+import importlib.util
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from lazy_module import LazyModule
+
+# 未安裝 lxml 時只能使用 BeautifulSoup 版本
+LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None
+etree = LazyModule("lxml.etree")
+lxml_html = LazyModule("lxml.html")
+
+_BUSINESS_ITEM_PATTERN = re.compile(r"([A-Z]\d{6})\s*([^\dA-Z]+)")
+_MAP_COUNT_PATTERN = re.compile(r"電子地圖同地址公司家數[:：]?\s*\d+")
+# BeautifulSoup 的 get_text 不含這些標籤內的文字
+_SKIP_TEXT_TAGS = frozenset({"script", "style", "template"})
+
+
+def parse_business_items(text: str) -> List[Dict[str, str]]:
+    matches = _BUSINESS_ITEM_PATTERN.findall(text)
+    return [{"業別代碼": c, "業別名稱": n.strip()} for c, n in matches]
+
+
+class FieldSpec(NamedTuple):
+    label: str                          # 表格第一欄的標題
+    key: str                            # 輸出欄位名稱
+    transform: Callable[[str], object]  # 由第二欄文字轉為輸出值
+
+
+FINDBIZ_FIELDS = (
+    FieldSpec("統一編號", "統一編號", lambda v: v.split()[0].split("訂閱")[0]),
+    FieldSpec("公司名稱", "公司名稱", lambda v: v.split("Google搜尋")[0].split("國際貿易署")[0].strip()),
+    FieldSpec("登記現況", "登記現況", lambda v: v.split("「")[0].strip()),
+    FieldSpec("代表人姓名", "代表人", lambda v: v),
+    FieldSpec("公司所在地", "公司所在地", lambda v: _MAP_COUNT_PATTERN.sub("", v).strip()),
+    FieldSpec("資本總額(元)", "資本總額", lambda v: v),
+    FieldSpec("實收資本額(元)", "實收資本額", lambda v: v),
+    FieldSpec("每股金額(元)", "每股金額", lambda v: v),
+    FieldSpec("已發行股份總數(股)", "已發行股份總數", lambda v: v),
+    FieldSpec("所營事業資料", "所營事業資料", parse_business_items),
+)
+_FIELDS_BY_LABEL = {spec.label: spec for spec in FINDBIZ_FIELDS}
+
+
+def _empty_result(ban_no: str) -> Dict:
+    data = {spec.key: None for spec in FINDBIZ_FIELDS}
+    data["統一編號"] = ban_no
+    data["所營事業資料"] = []
+    return data
+
+
+def _clean_value(text: str) -> str:
+    return " ".join(text.split())
+
+
+# ========== lxml 版本 ==========
+def _stripped_text(element) -> str:
+    """等同 BeautifulSoup get_text(strip=True)：各段文字去空白後直接相接"""
+    parts: List[str] = []
+
+    def walk(el):
+        if el.tag in _SKIP_TEXT_TAGS:
+            return
+        if el.text:
+            parts.append(el.text.strip())
+        for child in el:
+            # 註解與處理指令本身的文字不算，但其後的 tail 文字仍要計入
+            if isinstance(child.tag, str):
+                walk(child)
+            if child.tail:
+                parts.append(child.tail.strip())
+
+    walk(element)
+    return "".join(parts)
+
+
+def _has_class(element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+def parse_with_lxml(html: str, ban_no: str) -> Optional[Dict]:
+    """以 lxml 解析；只對 FINDBIZ_FIELDS 中的列取值"""
+    doc = lxml_html.document_fromstring(html)
+    tables = list(doc.iter("table"))
+    table = next((t for t in tables if _has_class(t, "table-striped")), None)
+    if table is None:
+        table = next((t for t in tables if _has_class(t, "table")), None)
+    if table is None:
+        return None
+
+    data = _empty_result(ban_no)
+    for row in table.iter("tr"):
+        cells = list(row.iter("td"))
+        if len(cells) < 2:
+            continue
+        spec = _FIELDS_BY_LABEL.get(_stripped_text(cells[0]))
+        if spec is None:
+            continue
+        data[spec.key] = spec.transform(_clean_value(_stripped_text(cells[1])))
+    return data
+
+
+# ========== BeautifulSoup 版本（原解析器，作為對照與備援） ==========
+def parse_with_bs4(html: str, ban_no: str) -> Optional[Dict]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", class_="table-striped") or soup.find("table", class_="table")
+    if not table:
+        return None
+
+    data = _empty_result(ban_no)
+    for row in table.find_all("tr"):
+        cells = row.find_all("td")
+        if len(cells) < 2:
+            continue
+        spec = _FIELDS_BY_LABEL.get(cells[0].get_text(strip=True))
+        if spec is None:
+            continue
+        data[spec.key] = spec.transform(_clean_value(cells[1].get_text(strip=True)))
+    return data
+
+
+def parse_findbiz_page(html: str, ban_no: str) -> Optional[Dict]:
+    """解析 FindBiz 公司詳細頁 HTML（Selenium 與 HTTP 兩種抓取方式共用）"""
+    if LXML_AVAILABLE:
+        try:
+            return parse_with_lxml(html, ban_no)
+        except (etree.ParserError, ValueError):
+            # 空白頁或含編碼宣告的字串等 lxml 不接受的輸入，交給 BeautifulSoup
+            pass
+    return parse_with_bs4(html, ban_no)
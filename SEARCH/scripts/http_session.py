@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+共用 HTTP 連線層
+
+所有執行緒共用同一個 HTTPAdapter（urllib3 連線池，keep-alive 重用 TCP/TLS 連線），
+每個執行緒各自持有 requests.Session 物件，避免跨執行緒共用 Session 狀態。
+連線層本身不重試：重試由呼叫端以 RETRY_STATUS_CODES 與 retry_delay() 處理，
+讓每次重試都重新經過限速器並回報結果。
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+from typing import Dict, Optional
+
+from lazy_module import LazyModule
+
+requests = LazyModule("requests")
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset({"get", "head"})   # 只重試冪等方法
+
+
+def retry_delay(attempt: int, backoff_factor: float, backoff_jitter: float) -> float:
+    """第 attempt 次（從 0 起算）重試前的等待秒數：指數退避加隨機抖動"""
+    return backoff_factor * (2 ** attempt) + random.uniform(0, backoff_jitter)
+
+
+class SharedHttpSession:
+    """執行緒安全的共用 HTTP 連線層"""
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        pool_connections: int = 4,
+        pool_maxsize: int = 16
+    ):
+        from requests.adapters import HTTPAdapter
+
+        self.headers = dict(headers or {})
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0,
+        )
+        self._local = threading.local()
+
+    def new_session(self, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+        """建立掛在共用連線池上的新 Session（需要獨立 cookie 時使用）"""
+        session = requests.Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        session.headers.update(self.headers if headers is None else headers)
+        return session
+
+    def session(self) -> requests.Session:
+        """取得目前執行緒專用的 Session"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self.new_session()
+            self._local.session = session
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session().get(url, **kwargs)
+
+    def close(self) -> None:
+        self._adapter.close()
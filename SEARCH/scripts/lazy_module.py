@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+延遲載入的模組代理
+
+pandas、numpy、requests 等載入較慢的套件以 LazyModule 取代模組層級的 import，
+第一次存取屬性時才真正 import；之後取過的屬性直接存在代理物件上，
+不再經過 __getattr__。用於縮短 Streamlit 冷啟動與只需上市櫃名單的 CLI 啟動時間。
+"""
+
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """第一次存取屬性時才 import 的模組代理"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        value = getattr(self._load(), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+上市櫃公司名單
+
+concat_all.csv 只在第一次使用時正規化一次（統編補滿 8 碼、公司名稱正規化），
+結果存成同目錄下的二進位檔（pickle）；CSV 大小或修改時間改變時才重建。
+Streamlit 介面與後端 is_listed_company 共用同一份查表結構。
+"""
+
+import csv
+import os
+import pickle
+import threading
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CSV_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'concat_all.csv'
+)
+SIDECAR_SUFFIX = ".registry.pkl"
+_FORMAT_VERSION = 1
+
+
+def normalize_ban(value) -> Optional[str]:
+    """統編正規化：去空白、去掉 Excel 造成的 .0，補滿 8 碼；非數字回傳 None"""
+    text = str(value or "").strip()
+    if text.endswith(".0"):
+        text = text[:-2]
+    if not text.isdigit() or len(text) > 8:
+        return None
+    return text.zfill(8)
+
+
+def normalize_company_name(name) -> str:
+    """公司名稱正規化：全形轉半形、去除空白、「臺」統一為「台」"""
+    text = unicodedata.normalize("NFKC", str(name or ""))
+    return "".join(text.split()).replace("臺", "台")
+
+
+class ListedRegistry:
+    """上市櫃公司查表：統編 → 公司名稱、正規化名稱 → 統編，皆為 O(1) 查詢"""
+
+    def __init__(self, ban_to_name: Dict[str, str], name_to_ban: Dict[str, str]):
+        self.ban_to_name = ban_to_name
+        self.name_to_ban = name_to_ban
+
+    def __len__(self) -> int:
+        return len(self.ban_to_name)
+
+    def name_of(self, business_no) -> Optional[str]:
+        ban = normalize_ban(business_no)
+        return self.ban_to_name.get(ban) if ban else None
+
+    def ban_of(self, company_name) -> Optional[str]:
+        return self.name_to_ban.get(normalize_company_name(company_name))
+
+    def is_listed(self, business_no=None, company_name=None) -> bool:
+        if business_no and self.name_of(business_no) is not None:
+            return True
+        return bool(company_name) and self.ban_of(company_name) is not None
+
+
+def _build_from_csv(csv_path: str) -> ListedRegistry:
+    ban_to_name: Dict[str, str] = {}
+    name_to_ban: Dict[str, str] = {}
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            ban = normalize_ban(row.get("統編"))
+            name = str(row.get("公司名稱") or "").strip()
+            if ban:
+                ban_to_name.setdefault(ban, name)
+            if name:
+                name_to_ban.setdefault(normalize_company_name(name), ban or "")
+    return ListedRegistry(ban_to_name, name_to_ban)
+
+
+def _signature(csv_path: str) -> Tuple[int, int]:
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_listed_registry(csv_path: str = DEFAULT_CSV_PATH) -> ListedRegistry:
+    """載入名單；二進位檔與 CSV 相符時直接讀取，否則重建並寫回"""
+    signature = _signature(csv_path)
+    sidecar = csv_path + SIDECAR_SUFFIX
+    try:
+        with open(sidecar, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("version") == _FORMAT_VERSION and tuple(cached.get("signature", ())) == signature:
+            return ListedRegistry(cached["ban_to_name"], cached["name_to_ban"])
+    except Exception:
+        pass
+
+    registry = _build_from_csv(csv_path)
+    payload = {
+        "version": _FORMAT_VERSION,
+        "signature": signature,
+        "ban_to_name": registry.ban_to_name,
+        "name_to_ban": registry.name_to_ban,
+    }
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, sidecar)
+    except OSError:
+        # 唯讀環境無法寫入快取檔時，仍可使用記憶體中的結果
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return registry
+
+
+_registries: Dict[str, Tuple[Tuple[int, int], ListedRegistry]] = {}
+_registries_lock = threading.Lock()
+
+
+def get_listed_registry(csv_path: str = DEFAULT_CSV_PATH) -> ListedRegistry:
+    """取得行程內共用的名單（CSV 變動後下次呼叫會自動重載）"""
+    signature = _signature(csv_path)
+    with _registries_lock:
+        entry = _registries.get(csv_path)
+        if entry is None or entry[0] != signature:
+            entry = (signature, load_listed_registry(csv_path))
+            _registries[csv_path] = entry
+        return entry[1]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+每筆查詢各自的日誌頻道
+
+sys.stdout 換成依 contextvars 分流的代理：在 capture(channel) 範圍內（含以
+bind_context 包裝、交給執行緒池的工作）print 的內容只寫入該查詢的 LogChannel，
+其他輸出照常寫到原本的 stdout。取代行程全域的 contextlib.redirect_stdout，
+多個 Streamlit 使用者同時查詢時日誌不會互相混入。
+"""
+
+import contextlib
+import contextvars
+import sys
+import threading
+from typing import Callable, Optional
+
+_current_channel: contextvars.ContextVar = contextvars.ContextVar("log_channel", default=None)
+_install_lock = threading.Lock()
+
+
+class LogChannel:
+    """執行緒安全的日誌緩衝區，背景查詢寫入、前端輪詢讀取"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = []
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._parts.append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        with self._lock:
+            return "".join(self._parts)
+
+
+class _RoutingStream:
+    """stdout 代理：目前 context 有日誌頻道時寫入頻道，否則寫入原本的串流"""
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def write(self, text: str) -> int:
+        channel = _current_channel.get()
+        if channel is not None:
+            return channel.write(text)
+        return self._fallback.write(text)
+
+    def flush(self) -> None:
+        channel = _current_channel.get()
+        if channel is None:
+            self._fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._fallback, name)
+
+
+def install() -> None:
+    """把 sys.stdout 換成分流代理（重複呼叫無副作用）"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _RoutingStream):
+            sys.stdout = _RoutingStream(sys.stdout)
+
+
+@contextlib.contextmanager
+def capture(channel: LogChannel):
+    """在此範圍內（目前執行緒與以 bind_context 傳遞的工作）的 print 寫入 channel"""
+    install()
+    token = _current_channel.set(channel)
+    try:
+        yield channel
+    finally:
+        _current_channel.reset(token)
+
+
+def current_channel() -> Optional[LogChannel]:
+    return _current_channel.get()
+
+
+def bind_context(fn: Callable) -> Callable:
+    """包裝 fn，讓它在執行緒池中也沿用呼叫當下的 context（含日誌頻道）"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # 每次呼叫各自複製一份，同一個 Context 不能在多個執行緒同時進入
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
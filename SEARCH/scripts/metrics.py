@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+查詢各階段的耗時量測與指標匯出
+
+以 span 包住各查詢階段，記錄耗時、快取命中/未命中、下載位元組與外部呼叫次數：
+- 全行程累計值匯出為 Prometheus 文字格式（寫檔供 node_exporter textfile collector
+  讀取，或以 start_metrics_server 開一個 /metrics 端點）
+- 每次查詢另以 query_trace() 收集本次的彙總，附在 run_query 的結果中
+
+span 與 trace 以 contextvars 傳遞，交給執行緒池的工作需以
+log_channel.bind_context 包裝才會算進同一筆查詢。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 耗時直方圖的區間上限（秒）
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("metrics_span", default=None)
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class Span:
+    """單次階段量測；執行期間可用 note_* 函數補記快取與流量資訊"""
+
+    __slots__ = ("name", "cache_hits", "cache_misses", "bytes", "calls", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+        self.calls = 0
+        self.start = time.perf_counter()
+
+
+class _Stats:
+    """同一階段名稱的累計值"""
+
+    __slots__ = ("count", "seconds", "max_seconds", "cache_hits", "cache_misses", "bytes", "calls", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+        self.calls = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+    def add(self, span: Span, elapsed: float) -> None:
+        self.count += 1
+        self.seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        self.cache_hits += span.cache_hits
+        self.cache_misses += span.cache_misses
+        self.bytes += span.bytes
+        self.calls += span.calls
+        for i, upper in enumerate(DURATION_BUCKETS):
+            if elapsed <= upper:
+                self.buckets[i] += 1
+
+
+class MetricsRegistry:
+    """執行緒安全的指標彙總：各階段 span 與各外部主機的 HTTP 請求"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: Dict[str, _Stats] = {}
+        self._http: Dict[Tuple[str, str], List[float]] = {}  # (host, status) -> [次數, 秒數, 位元組]
+
+    def record_span(self, span: Span, elapsed: float) -> None:
+        with self._lock:
+            stats = self._spans.get(span.name)
+            if stats is None:
+                stats = self._spans[span.name] = _Stats()
+            stats.add(span, elapsed)
+
+    def record_http(self, host: str, status: str, elapsed: float, nbytes: int) -> None:
+        with self._lock:
+            entry = self._http.setdefault((host, status), [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += nbytes
+
+    def span_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: _stats_dict(stats) for name, stats in self._spans.items()}
+
+    def render_prometheus(self) -> str:
+        """輸出 Prometheus 文字格式"""
+        with self._lock:
+            spans = sorted(self._spans.items())
+            http = sorted(self._http.items())
+        lines = [
+            "# HELP beneficiary_stage_duration_seconds Duration of query stages.",
+            "# TYPE beneficiary_stage_duration_seconds histogram",
+        ]
+        for name, stats in spans:
+            # buckets 已是累計值（每個區間都包含所有較小的觀測）
+            for upper, count in zip(DURATION_BUCKETS, stats.buckets):
+                lines.append(f'beneficiary_stage_duration_seconds_bucket{{stage="{name}",le="{upper}"}} {count}')
+            lines.append(f'beneficiary_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+            lines.append(f'beneficiary_stage_duration_seconds_sum{{stage="{name}"}} {stats.seconds:.6f}')
+            lines.append(f'beneficiary_stage_duration_seconds_count{{stage="{name}"}} {stats.count}')
+        lines += [
+            "# HELP beneficiary_stage_cache_total Cache lookups per stage.",
+            "# TYPE beneficiary_stage_cache_total counter",
+        ]
+        for name, stats in spans:
+            lines.append(f'beneficiary_stage_cache_total{{stage="{name}",result="hit"}} {stats.cache_hits}')
+            lines.append(f'beneficiary_stage_cache_total{{stage="{name}",result="miss"}} {stats.cache_misses}')
+        lines += [
+            "# HELP beneficiary_stage_external_calls_total External requests issued within each stage.",
+            "# TYPE beneficiary_stage_external_calls_total counter",
+        ]
+        for name, stats in spans:
+            lines.append(f'beneficiary_stage_external_calls_total{{stage="{name}"}} {stats.calls}')
+        lines += [
+            "# HELP beneficiary_stage_bytes_total Response bytes downloaded within each stage.",
+            "# TYPE beneficiary_stage_bytes_total counter",
+        ]
+        for name, stats in spans:
+            lines.append(f'beneficiary_stage_bytes_total{{stage="{name}"}} {stats.bytes}')
+        lines += [
+            "# HELP beneficiary_http_requests_total HTTP requests per external host and status.",
+            "# TYPE beneficiary_http_requests_total counter",
+        ]
+        for (host, status), (count, _, _) in http:
+            lines.append(f'beneficiary_http_requests_total{{host="{host}",status="{status}"}} {count}')
+        lines += [
+            "# HELP beneficiary_http_duration_seconds_total Time spent waiting on each external host.",
+            "# TYPE beneficiary_http_duration_seconds_total counter",
+        ]
+        for (host, status), (_, seconds, _) in http:
+            lines.append(f'beneficiary_http_duration_seconds_total{{host="{host}",status="{status}"}} {seconds:.6f}')
+        lines += [
+            "# HELP beneficiary_http_response_bytes_total Response bytes per external host.",
+            "# TYPE beneficiary_http_response_bytes_total counter",
+        ]
+        for (host, status), (_, _, nbytes) in http:
+            lines.append(f'beneficiary_http_response_bytes_total{{host="{host}",status="{status}"}} {int(nbytes)}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """原子地寫出指標檔（textfile collector 不會讀到寫一半的檔案）"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _stats_dict(stats: _Stats) -> Dict:
+    return {
+        "count": stats.count,
+        "seconds": stats.seconds,
+        "max_seconds": stats.max_seconds,
+        "cache_hits": stats.cache_hits,
+        "cache_misses": stats.cache_misses,
+        "bytes": stats.bytes,
+        "calls": stats.calls,
+    }
+
+
+REGISTRY = MetricsRegistry()
+
+
+class QueryTrace:
+    """單次查詢內各階段的彙總（與全域 REGISTRY 同時記錄）"""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.start = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+    def summary(self) -> List[Dict]:
+        """依總耗時由大到小排列的各階段彙總"""
+        rows = []
+        for name, stats in self.registry.span_stats().items():
+            rows.append({
+                "階段": name,
+                "次數": stats["count"],
+                "總耗時(秒)": round(stats["seconds"], 3),
+                "最長(秒)": round(stats["max_seconds"], 3),
+                "快取命中": stats["cache_hits"],
+                "快取未命中": stats["cache_misses"],
+                "外部呼叫": stats["calls"],
+                "下載位元組": stats["bytes"],
+            })
+        return sorted(rows, key=lambda r: r["總耗時(秒)"], reverse=True)
+
+
+@contextlib.contextmanager
+def query_trace():
+    """收集此範圍內（含以 bind_context 傳遞的工作）所有 span 的彙總"""
+    trace = QueryTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.elapsed = time.perf_counter() - trace.start
+        _current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """量測一個階段；巢狀 span 的耗時各自獨立計算（外層包含內層）"""
+    current = Span(name)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        elapsed = time.perf_counter() - current.start
+        REGISTRY.record_span(current, elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.registry.record_span(current, elapsed)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """裝飾器：以 span 包住整個函數（coroutine 函數則包住整個 await 過程）"""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def note_cache(hit: bool, count: int = 1) -> None:
+    """在目前的 span 記一次快取命中或未命中"""
+    current = _current_span.get()
+    if current is not None:
+        if hit:
+            current.cache_hits += count
+        else:
+            current.cache_misses += count
+
+
+def note_external_call(host: str, status, elapsed: float, nbytes: int) -> None:
+    """記錄一次外部請求：計入目前的 span，並依主機與狀態累計"""
+    current = _current_span.get()
+    if current is not None:
+        current.calls += 1
+        current.bytes += nbytes
+    REGISTRY.record_http(host, str(status), elapsed, nbytes)
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """在背景執行緒開啟 Prometheus 抓取端點（/metrics）"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = REGISTRY.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+本機公司名稱 → 統編索引
+
+由整批公司登記資料（例如 GCIS 開放資料的公司清單 CSV）建立 SQLite 索引，
+查詢時先比對完整名稱，再比對正規化名稱（全形/半形、空白、臺/台），
+只有本機查不到或名稱對應到多家公司時，才交給遠端 API。
+
+建立索引：
+    python name_index.py 公司登記資料.csv [--db ../data/company_names.sqlite3]
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional, Tuple
+
+from listed_registry import normalize_ban, normalize_company_name
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'company_names.sqlite3'
+)
+# 常見開放資料欄位名稱
+BAN_COLUMNS = ("統一編號", "統編", "Business_Accounting_NO")
+NAME_COLUMNS = ("公司名稱", "Company_Name")
+
+
+class CompanyNameIndex:
+    """唯讀的公司名稱索引，可由多個執行緒共用"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def lookup(self, company_name: str) -> Optional[str]:
+        """完整名稱或正規化名稱唯一對應時回傳統編，否則回傳 None"""
+        name = (company_name or "").strip()
+        if not name:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT ban FROM companies WHERE name = ? LIMIT 2", (name,)
+            ).fetchall()
+            if not rows:
+                rows = self._conn.execute(
+                    "SELECT DISTINCT ban FROM companies WHERE norm_name = ? LIMIT 2",
+                    (normalize_company_name(name),),
+                ).fetchall()
+        # 同名多家公司時無法判斷，交給遠端查詢
+        return rows[0][0] if len(rows) == 1 else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _pick_column(fieldnames: Iterable[str], candidates: Tuple[str, ...]) -> str:
+    for col in candidates:
+        if col in fieldnames:
+            return col
+    raise ValueError(f"找不到欄位，需要其中之一: {', '.join(candidates)}")
+
+
+def build_name_index(csv_path: str, index_path: str = DEFAULT_INDEX_PATH) -> int:
+    """由公司清單 CSV 重建索引，回傳寫入筆數"""
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    count = 0
+    try:
+        conn.execute("CREATE TABLE companies (ban TEXT NOT NULL, name TEXT NOT NULL, norm_name TEXT NOT NULL)")
+        with open(csv_path, encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            ban_col = _pick_column(reader.fieldnames or [], BAN_COLUMNS)
+            name_col = _pick_column(reader.fieldnames or [], NAME_COLUMNS)
+
+            def rows():
+                for row in reader:
+                    ban = normalize_ban(row.get(ban_col))
+                    name = str(row.get(name_col) or "").strip()
+                    if ban and name:
+                        yield ban, name, normalize_company_name(name)
+
+            for batch in _chunks(rows(), 10000):
+                conn.executemany("INSERT INTO companies VALUES (?, ?, ?)", batch)
+                count += len(batch)
+        conn.execute("CREATE INDEX idx_companies_name ON companies(name)")
+        conn.execute("CREATE INDEX idx_companies_norm ON companies(norm_name)")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+    return count
+
+
+def _chunks(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由公司登記資料 CSV 建立本機名稱索引")
+    parser.add_argument("csv_path", help="公司清單 CSV（需含統一編號與公司名稱欄位）")
+    parser.add_argument("--db", default=DEFAULT_INDEX_PATH, help="索引檔輸出路徑")
+    args = parser.parse_args()
+    count = build_name_index(args.csv_path, args.db)
+    print(f"✓ 已寫入 {count} 筆公司資料至 {args.db}")
+
+
+if __name__ == "__main__":
+    main()
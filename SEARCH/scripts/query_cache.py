@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+查詢結果本機快取
+
+以 SQLite 檔案保存公司名稱→統編、公司基本資料、董監事資料，
+讓重新啟動 Streamlit 或 CLI 後仍可沿用先前查過的結果。
+MemoryCache 是放在它前面的行程內快取，有筆數 / 大小上限與 TTL，多執行緒共用；
+SingleFlight 讓多個執行緒同時查同一筆時只送出一次請求。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+# 快取未命中時回傳的標記（與「快取了 None」區分）
+MISSING = object()
+
+
+class PersistentCache:
+    """SQLite 快取：各資料來源各自 TTL，總筆數超過上限時以 LRU 淘汰"""
+
+    _EVICT_EVERY = 64  # 每寫入幾筆檢查一次筆數上限
+
+    def __init__(self, path: str, ttls: Dict[str, float], max_entries: int = 50000):
+        self.path = path
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                source      TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                value       TEXT,
+                ban         TEXT,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (source, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_ban ON cache(ban)")
+        self._evict()
+
+    def get(self, source: str, key: str, default: Any = MISSING) -> Any:
+        """讀取快取；過期或不存在時回傳 default"""
+        now = time.time()
+        ttl = self.ttls.get(source)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE source = ? AND key = ?",
+                (source, key),
+            ).fetchone()
+            if row is None:
+                return default
+            value, created_at = row
+            if ttl is not None and now - created_at > ttl:
+                self._conn.execute("DELETE FROM cache WHERE source = ? AND key = ?", (source, key))
+                return default
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE source = ? AND key = ?",
+                (now, source, key),
+            )
+        return json.loads(value)
+
+    def set(self, source: str, key: str, value: Any, ban: Optional[str] = None) -> None:
+        """寫入快取；ban 用於之後依統編整批失效"""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (source, key, value, ban, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (source, key, payload, ban, now, now),
+            )
+            self._writes += 1
+            if self._writes % self._EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def invalidate_ban(self, ban: str) -> int:
+        """刪除與某統編相關的所有快取（含解析到該統編的名稱），回傳刪除筆數"""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM cache WHERE ban = ?", (ban,))
+            return cur.rowcount
+
+    def clear(self, source: Optional[str] = None) -> None:
+        """清除全部或單一來源的快取"""
+        with self._lock:
+            if source is None:
+                self._conn.execute("DELETE FROM cache")
+            else:
+                self._conn.execute("DELETE FROM cache WHERE source = ?", (source,))
+
+    def _evict(self) -> None:
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        now = time.time()
+        for source, ttl in self.ttls.items():
+            self._conn.execute(
+                "DELETE FROM cache WHERE source = ? AND created_at < ?", (source, now - ttl)
+            )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE rowid IN "
+                "(SELECT rowid FROM cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _MemoryEntry(NamedTuple):
+    value: Any
+    expires_at: Optional[float]   # time.monotonic() 時間；None 表示不過期
+    ban: Optional[str]
+    size: int
+
+
+def _estimate_size(value: Any) -> int:
+    """估計快取值大小（JSON 字元數），只用於大小上限"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MemoryCache:
+    """行程內快取：各來源各自 TTL，筆數或估計大小超過上限時以 LRU 淘汰
+
+    所有操作都在同一把鎖內完成，可由多個查詢執行緒、多個 Streamlit 工作階段共用。
+    另記錄命中、未命中、淘汰與過期次數（stats()）。
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 20000, max_bytes: Optional[int] = None):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _MemoryEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, source: str, key: str, default: Any = MISSING) -> Any:
+        """讀取快取；過期或不存在時回傳 default"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((source, key))
+            if entry is not None and entry.expires_at is not None and now >= entry.expires_at:
+                self._remove_locked((source, key))
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end((source, key))
+            self.hits += 1
+            return entry.value
+
+    def set(self, source: str, key: str, value: Any, ban: Optional[str] = None) -> None:
+        """寫入快取；ban 用於之後依統編整批失效"""
+        ttl = self.ttls.get(source)
+        size = _estimate_size(value) if self.max_bytes else 0
+        with self._lock:
+            self._remove_locked((source, key))
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # 單筆就超過上限，不快取
+            expires_at = None if ttl is None else time.monotonic() + ttl
+            self._entries[(source, key)] = _MemoryEntry(value, expires_at, ban, size)
+            self._bytes += size
+            self._evict_locked()
+
+    def pop(self, source: str, key: str) -> None:
+        with self._lock:
+            self._remove_locked((source, key))
+
+    def invalidate_ban(self, ban: str) -> int:
+        """刪除與某統編相關的所有快取（含解析到該統編的名稱），回傳刪除筆數"""
+        with self._lock:
+            keys = [k for k, entry in self._entries.items() if entry.ban == ban]
+            for k in keys:
+                self._remove_locked(k)
+            return len(keys)
+
+    def clear(self, source: Optional[str] = None) -> None:
+        """清除全部或單一來源的快取（計數不歸零）"""
+        with self._lock:
+            if source is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for k in [k for k in self._entries if k[0] == source]:
+                self._remove_locked(k)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove_locked(self, k: Tuple[str, str]) -> None:
+        entry = self._entries.pop(k, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict_locked(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+
+class SingleFlight:
+    """同一鍵同時只執行一次：第一個呼叫者執行，其餘等待並取得相同結果（或例外）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
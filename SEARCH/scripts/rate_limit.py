@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+依主機分開的請求限速器
+
+每個外部來源（FindBiz、GCIS、opendata.vip）各自一個 token bucket，
+遇到 HTTP 429 / 5xx、連線錯誤或回應過慢時自動降速並退避，恢復正常後逐步回升。
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """標準 token bucket：每秒補充 rate 個 token，最多累積 burst 個"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def reserve(self, rate: float) -> float:
+        """預約一個 token，回傳需要等待的秒數（呼叫端需持有鎖）"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+        self._tokens -= 1.0
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / rate
+
+
+class _HostState:
+    def __init__(self, rate: float, burst: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.factor = 1.0          # 目前速率倍數（退避時 < 1）
+        self.penalty = 0.0         # 下次錯誤時的冷卻秒數
+        self.cooldown_until = 0.0  # 冷卻結束時間（monotonic）
+        self.lock = threading.Lock()
+
+
+class HostRateLimiter:
+    """多主機限速器：acquire() 取得發送許可（非同步呼叫端用 reserve()），report() 回報結果以調整速率"""
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, int]],
+        default: Tuple[float, int] = (2.0, 2),
+        slow_threshold: float = 5.0,
+        base_penalty: float = 1.0,
+        max_penalty: float = 60.0,
+        min_factor: float = 0.1
+    ):
+        self.limits = dict(limits)
+        self.default = default
+        self.slow_threshold = slow_threshold
+        self.base_penalty = base_penalty
+        self.max_penalty = max_penalty
+        self.min_factor = min_factor
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                rate, burst = self.limits.get(host, self.default)
+                state = _HostState(rate, burst)
+                self._hosts[host] = state
+            return state
+
+    def reserve(self, host: str) -> float:
+        """預約一次對 host 的發送許可，回傳需要等待的秒數（不阻塞，供非同步呼叫端自行等待）"""
+        state = self._state(host)
+        with state.lock:
+            wait = max(0.0, state.cooldown_until - time.monotonic())
+            rate = state.bucket.rate * state.factor
+            return wait + state.bucket.reserve(rate)
+
+    def acquire(self, host: str) -> float:
+        """等待直到可以對 host 發送請求，回傳實際等待秒數"""
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def report(
+        self,
+        host: str,
+        status_code: Optional[int] = None,
+        elapsed: Optional[float] = None,
+        error: bool = False,
+        retry_after: Optional[float] = None
+    ) -> None:
+        """回報一次請求的結果：錯誤時降速並冷卻，成功時逐步恢復"""
+        state = self._state(host)
+        with state.lock:
+            throttled = error or status_code == 429 or (status_code is not None and status_code >= 500)
+            if throttled:
+                state.penalty = min(self.max_penalty, max(self.base_penalty, state.penalty * 2))
+                cooldown = max(state.penalty, retry_after or 0.0)
+                state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown)
+                state.factor = max(self.min_factor, state.factor * 0.5)
+            elif elapsed is not None and elapsed > self.slow_threshold:
+                state.factor = max(self.min_factor, state.factor * 0.8)
+            else:
+                state.factor = min(1.0, state.factor * 1.25)
+                state.penalty = state.penalty / 2 if state.penalty > self.base_penalty else 0.0
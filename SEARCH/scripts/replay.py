@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+外部回應的錄製與回放
+
+錄製模式把查詢期間所有 HTTP 回應（FindBiz、GCIS、opendata.vip）與 Selenium 取得的
+FindBiz 詳細頁原始碼寫入一個 JSON 檔（cassette）；回放模式直接由檔案回應，
+不連網路也不啟動 Chromium，可重現正式環境的查詢做效能分析或解析器回歸測試。
+
+同一請求出現多次時依錄製順序回放，用完後重複最後一筆。
+錄放狀態為行程全域設定，僅供 CLI 與開發工具使用。
+"""
+
+import base64
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+from lazy_module import LazyModule
+
+requests = LazyModule("requests")
+
+CASSETTE_VERSION = 1
+RECORD = "record"
+REPLAY = "replay"
+
+
+class ReplayMiss(LookupError):
+    """回放檔中沒有對應的請求"""
+
+
+class ReplayedResponse:
+    """回放用的最小回應物件，提供後端會用到的 requests.Response 介面"""
+
+    def __init__(self, entry: Dict):
+        self.status_code = entry["status"]
+        self.url = entry["url"]
+        self.headers = requests.structures.CaseInsensitiveDict(entry.get("headers") or {})
+        self.encoding = entry.get("encoding") or "utf-8"
+        if "body_b64" in entry:
+            self.content = base64.b64decode(entry["body_b64"])
+        else:
+            self.content = entry.get("text", "").encode(self.encoding)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} (replayed) for url: {self.url}", response=self)
+
+
+def request_key(method: str, url: str, params: Any = None, data: Any = None) -> str:
+    """請求的識別鍵：方法 + 網址 + 排序後的 query 參數與表單內容"""
+    key = f"{method.upper()} {url}"
+    if params:
+        key += "?" + urlencode(sorted(dict(params).items()))
+    if data:
+        key += " | " + urlencode(sorted(dict(data).items()))
+    return key
+
+
+def page_key(ban_no: str, company_name: Optional[str]) -> str:
+    return f"BROWSER {ban_no} {(company_name or '').strip()}"
+
+
+class ResponseRecorder:
+    """錄製或回放外部回應（mode 為 "record" 或 "replay"）"""
+
+    def __init__(self, path: str, mode: str):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"mode 必須為 {RECORD} 或 {REPLAY}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        if mode == REPLAY:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+            self._entries = payload.get("entries", {})
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._entries.values())
+
+    def _append(self, key: str, entry: Dict) -> None:
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+
+    def _next(self, key: str) -> Dict:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise ReplayMiss(key)
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    # --- HTTP ---
+    def record_http(self, method: str, url: str, kwargs: Dict, resp) -> None:
+        entry = {
+            "status": resp.status_code,
+            "url": resp.url,
+            "headers": {k: v for k, v in resp.headers.items()
+                        if k.lower() in ("content-type", "retry-after")},
+            "encoding": resp.encoding or "utf-8",
+        }
+        try:
+            entry["text"] = resp.content.decode(entry["encoding"])
+        except (UnicodeDecodeError, LookupError):
+            entry["body_b64"] = base64.b64encode(resp.content).decode("ascii")
+        self._append(request_key(method, url, kwargs.get("params"), kwargs.get("data")), entry)
+
+    def replay_http(self, method: str, url: str, kwargs: Dict) -> ReplayedResponse:
+        return ReplayedResponse(self._next(request_key(method, url, kwargs.get("params"), kwargs.get("data"))))
+
+    # --- Selenium 取得的頁面 ---
+    def record_page(self, ban_no: str, company_name: Optional[str], html: str) -> None:
+        self._append(page_key(ban_no, company_name), {"html": html})
+
+    def replay_page(self, ban_no: str, company_name: Optional[str]) -> Optional[str]:
+        try:
+            return self._next(page_key(ban_no, company_name))["html"]
+        except ReplayMiss:
+            return None
+
+    def save(self) -> None:
+        """寫出錄製檔（先寫暫存檔再取代）"""
+        with self._lock:
+            payload = {"version": CASSETTE_VERSION, "entries": self._entries}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+_active: Optional[ResponseRecorder] = None
+_active_lock = threading.Lock()
+
+
+def activate(recorder: Optional[ResponseRecorder]) -> None:
+    """設定（或以 None 取消）目前的錄放器"""
+    global _active
+    with _active_lock:
+        _active = recorder
+
+
+def active_recorder() -> Optional[ResponseRecorder]:
+    return _active
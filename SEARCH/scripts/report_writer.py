@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+查詢結果報表輸出
+
+XLSX 以 openpyxl write-only 模式逐列寫出，CSV 逐表串流寫入 ZIP，
+不需先把整份活頁簿建在記憶體中；每張表可由多個 DataFrame 片段組成
+（批次查詢時每筆查詢一段），欄位取各片段的聯集。
+Parquet 需安裝 pyarrow（或 fastparquet），每張表一個檔案，一併打包成 ZIP。
+pandas 與 numpy 在第一次產生報表時才載入，不拖慢 app_final 的啟動。
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import zipfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from lazy_module import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+# run_query 結果中各表的工作表名稱；diff / timing 只在結果中有時才輸出
+RESULT_SHEETS = (
+    ("完整查詢結果", "full_result"),
+    ("實質受益人", "beneficial_owners"),
+    ("公司基本資料", "company_info"),
+    ("持股計算過程", "holding_process"),
+    ("警示報告", "warnings"),
+)
+OPTIONAL_SHEETS = (
+    ("與上次差異", "diff"),
+    ("查詢耗時", "timing"),
+)
+
+Sheet = Tuple[str, List["pd.DataFrame"]]
+
+
+class ReportFormat(NamedTuple):
+    label: str
+    extension: str
+    mime: str
+
+
+REPORT_FORMATS: Dict[str, ReportFormat] = {
+    "xlsx": ReportFormat("Excel", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ReportFormat("CSV（ZIP，每表一檔）", ".zip", "application/zip"),
+    "parquet": ReportFormat("Parquet（ZIP，每表一檔）", ".zip", "application/zip"),
+}
+
+
+def parquet_available() -> bool:
+    for module in ("pyarrow", "fastparquet"):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in REPORT_FORMATS if fmt != "parquet" or parquet_available()]
+
+
+def _as_frame(value: Any) -> pd.DataFrame:
+    if isinstance(value, pd.DataFrame):
+        return value
+    if value is None:
+        return pd.DataFrame()
+    return pd.DataFrame(value)
+
+
+def result_sheets(result: Dict) -> List[Sheet]:
+    """單筆 run_query 結果 → 工作表清單"""
+    sheets = [(sheet, [_as_frame(result.get(key))]) for sheet, key in RESULT_SHEETS]
+    sheets += [(sheet, [_as_frame(result[key])]) for sheet, key in OPTIONAL_SHEETS if key in result]
+    return sheets
+
+
+def batch_sheets(summary_df: pd.DataFrame, results: Dict[str, Any]) -> List[Sheet]:
+    """批次結果 → 工作表清單：批次摘要，加上各表依查詢統編分段（第一欄標示統編）"""
+    parts: Dict[str, List[pd.DataFrame]] = {sheet: [] for sheet, _ in RESULT_SHEETS}
+    for tax_id, result in results.items():
+        if not isinstance(result, dict):
+            continue
+        for sheet, key in RESULT_SHEETS:
+            part = _as_frame(result.get(key))
+            if not part.empty:
+                parts[sheet].append(part.assign(查詢統編=tax_id)[["查詢統編"] + list(part.columns)])
+    order = ["實質受益人", "完整查詢結果", "公司基本資料", "持股計算過程", "警示報告"]
+    return [("批次摘要", [summary_df])] + [(sheet, parts[sheet]) for sheet in order]
+
+
+def _columns(frames: Iterable[pd.DataFrame]) -> List[str]:
+    columns: Dict[Any, None] = {}
+    for frame in frames:
+        columns.update(dict.fromkeys(frame.columns))
+    return list(columns)
+
+
+def _cell(value: Any) -> Any:
+    """轉成 openpyxl 可寫入的值（與 pandas to_excel 相同：無法直接寫入的物件轉為字串）"""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) or math.isinf(value) else float(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, (datetime, date)):
+        return value
+    return str(value)
+
+
+def write_xlsx(sheets: Iterable[Sheet], target) -> None:
+    """以 write-only 模式逐列寫出 XLSX；target 為路徑或二進位檔案物件"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for sheet, frames in sheets:
+        worksheet = workbook.create_sheet(title=sheet)
+        columns = _columns(frames)
+        if not columns:
+            continue
+        worksheet.append([str(c) for c in columns])
+        for frame in frames:
+            for row in frame.reindex(columns=columns).itertuples(index=False, name=None):
+                worksheet.append([_cell(v) for v in row])
+    workbook.save(target)
+
+
+def write_csv_zip(sheets: Iterable[Sheet], target) -> None:
+    """每張表一個 UTF-8（含 BOM）CSV，逐段寫入 ZIP"""
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet, frames in sheets:
+            columns = _columns(frames)
+            with archive.open(f"{sheet}.csv", "w") as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as text:
+                    if not columns:
+                        continue
+                    pd.DataFrame(columns=columns).to_csv(text, index=False)
+                    for frame in frames:
+                        frame.reindex(columns=columns).to_csv(text, index=False, header=False)
+
+
+def write_parquet_zip(sheets: Iterable[Sheet], target) -> None:
+    """每張表一個 Parquet 檔打包成 ZIP；混合型別的欄位轉為字串"""
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED) as archive:
+        for sheet, frames in sheets:
+            columns = _columns(frames)
+            combined = pd.concat([f.reindex(columns=columns) for f in frames], ignore_index=True) \
+                if frames else pd.DataFrame(columns=columns)
+            combined.columns = [str(c) for c in combined.columns]
+            for col in combined.columns:
+                if combined[col].dtype == object:
+                    combined[col] = combined[col].map(lambda v: None if v is None or v is pd.NA
+                                                      or (isinstance(v, float) and math.isnan(v)) else str(v))
+            buffer = io.BytesIO()
+            combined.to_parquet(buffer, index=False)
+            archive.writestr(f"{sheet}.parquet", buffer.getvalue())
+
+
+_WRITERS = {"xlsx": write_xlsx, "csv": write_csv_zip, "parquet": write_parquet_zip}
+
+
+def write_report(sheets: Iterable[Sheet], fmt: str, target) -> None:
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支援的報表格式: {fmt}")
+    _WRITERS[fmt](list(sheets), target)
+
+
+def report_bytes(sheets: Iterable[Sheet], fmt: str) -> bytes:
+    """產生報表並回傳檔案內容（供 Streamlit 下載按鈕使用）"""
+    output = io.BytesIO()
+    write_report(sheets, fmt, output)
+    return output.getvalue()
@@ -5,55 +5,151 @@ Created on Thu Nov 27 11:28:11 2025
 @author: user
 """
 
-import requests
-import pandas as pd
+from __future__ import annotations
+
+from urllib.parse import urljoin, urlparse
 import xml.etree.ElementTree as ET
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import re
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
+import threading
+import contextlib
+import atexit
+import argparse
 import os
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.os_manager import ChromeType
+from lazy_module import LazyModule
+from query_cache import MemoryCache, PersistentCache, SingleFlight, MISSING
+from rate_limit import HostRateLimiter
+from http_session import SharedHttpSession, RETRY_STATUS_CODES, RETRY_METHODS, retry_delay
+from async_http import AsyncHttpSession
+from batch_journal import BatchJournal
+from listed_registry import ListedRegistry, get_listed_registry
+from name_index import CompanyNameIndex
+from crawl_snapshot import CrawlSnapshotStore, director_fingerprint, diff_beneficial_owners
+from log_channel import bind_context
+import metrics
+from metrics import traced, note_cache, note_external_call
+import replay
+from replay import ResponseRecorder
+from findbiz_parser import parse_findbiz_page
+
+# 載入較慢的套件在第一次使用時才 import（selenium、bs4 在用到的函數內 import）
+requests = LazyModule("requests")
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+asyncio = LazyModule("asyncio")
 
 # ========== 全域設定 ==========
 COMPANY_SEARCH_URL = "https://opendata.vip/data/company?keyword={keyword}"
+FINDBIZ_QUERY_INIT_URL = "https://findbiz.nat.gov.tw/fts/query/QueryBar/queryInit.do"
+FINDBIZ_QUERY_LIST_URL = "https://findbiz.nat.gov.tw/fts/query/QueryList/queryList.do"
+FINDBIZ_DETAIL_URL = "https://findbiz.nat.gov.tw/fts/query/QueryCmpyDetail/queryCmpyDetail.do"
+FINDBIZ_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+FINDBIZ_HTTP_ENABLED = True      # 先以純 HTTP 查 FindBiz，失敗才啟動瀏覽器
 GCIS_DIRECTOR_API = "https://data.gcis.nat.gov.tw/od/data/api/4E5F7653-1B91-4DDC-99D5-468530FAE396"
-REQ_TIMEOUT = 15
-SLEEP_BETWEEN_CALLS = 0.4
+REQ_CONNECT_TIMEOUT = 5          # 建立連線逾時（秒）
+REQ_READ_TIMEOUT = 15            # 等待回應逾時（秒）
+REQ_TIMEOUT = (REQ_CONNECT_TIMEOUT, REQ_READ_TIMEOUT)
+HTTP_POOL_CONNECTIONS = 4        # 連線池數（約等於主機數）
+HTTP_POOL_MAXSIZE = 16           # 每個主機保留的 keep-alive 連線數（應 >= 並行度）
+HTTP_RETRIES = 3                 # GET 遇連線錯誤或 429/5xx 的重試次數（每次重試都重新經過限速器）
+HTTP_BACKOFF_FACTOR = 0.5        # 重試指數退避基數（秒）
+HTTP_BACKOFF_JITTER = 0.5        # 重試隨機抖動上限（秒）
+GCIS_BATCH_SIZE = 20             # 批次查詢董監事時，每個 $filter 合併的統編數
+GCIS_PAGE_SIZE = 1000            # GCIS 分頁大小（$top）
+GCIS_DIRECTOR_FIELDS = [         # $select 只取計算需要的欄位
+    "Business_Accounting_NO",
+    "Person_Position_Name",
+    "Person_Name",
+    "Juristic_Person_Name",
+    "Person_Shareholding",
+    "Person_Investment_Amount",
+]
+# 各主機限速：(每秒請求數, 可瞬間突發的請求數)；遇 429/5xx 或回應過慢會自動退避
+RATE_LIMITS = {
+    "findbiz.nat.gov.tw": (1.0, 2),
+    "data.gcis.nat.gov.tw": (2.5, 3),
+    "opendata.vip": (2.5, 3),
+}
+SLOW_RESPONSE_SECONDS = 5.0
 HEADERS = {
     "User-Agent": "TW-Compliance-Recursive-Agent/1.0",
     "Accept": "application/json, text/xml;q=0.9"
 }
 DEFAULT_STOCK_PAR_VALUE = 10.0
 
-# 快取字典
-_cache_company_no: Dict[str, Optional[str]] = {}
-_cache_directors_by_no: Dict[str, List[Dict]] = {}
-_cache_company_info: Dict[str, Optional[Dict]] = {}
-
-# 載入上市櫃公司名單
-try:
-    #df_listed = pd.read_csv("D:/.spyder-py3備份/SEARCH/data/concat_all.csv")
-    # 取得目前程式檔案所在目錄
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # 往上一層找 data 資料夾
-    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
-    concat_file = os.path.join(data_dir, 'concat_all.csv')
-    df_listed = pd.read_csv(concat_file, encoding='utf-8-sig')
-    LISTED_BAN_SET = set(df_listed['統編'].astype(str).str.strip())
-    LISTED_NAME_SET = set(df_listed['公司名稱'].astype(str).str.strip())
-    print(f"[INFO] 已載入 {len(LISTED_BAN_SET)} 家上市櫃公司資料")
-except Exception as e:
-    print(f"[WARNING] 無法載入上市櫃公司名單: {e}")
-    LISTED_BAN_SET = set()
-    LISTED_NAME_SET = set()
+# 瀏覽器連線池設定
+SCRAPER_POOL_SIZE = 2            # 同時存在的 Chromium 上限
+SCRAPER_MAX_PAGES = 50           # 每個瀏覽器查詢幾頁後回收重建
+SCRAPER_CHECKOUT_TIMEOUT = 120   # 借用瀏覽器的等待上限（秒）
+
+# 董監事鏈查詢並行度（1 = 原本的單執行緒深度優先）
+CRAWL_CONCURRENCY = 4
+# 門檻剪枝：種子公司經各路徑對某法人的累計持股（路徑占比乘積）低於此值時不展開該分支
+# None 為關閉；設為受益人門檻 0.25 時，只經由被剪分支持股的自然人不可能達到門檻
+CRAWL_PRUNE_THRESHOLD: Optional[float] = None
+PRUNE_REMARK = "門檻剪枝"
+# 預取：董監事名單一取得就在背景查所代表法人的統編與公司資料（請求仍經過限速器）
+PREFETCH_ENABLED = True
+PREFETCH_WORKERS = 4
+# 批次 CLI 同時執行的 run_query 數量
+BATCH_WORKERS = 4
+# 非同步查詢（run_query_async、批次 --async）：GCIS 與 opendata.vip 在單一事件迴圈中並行送出
+ASYNC_HOST_CONCURRENCY = {             # 每個主機同時進行中的請求上限（請求仍經過限速器）
+    "data.gcis.nat.gov.tw": 4,
+    "opendata.vip": 4,
+}
+ASYNC_DEFAULT_CONCURRENCY = 4
+ASYNC_BATCH_CONCURRENCY = 16           # 批次 --async 時同時進行中的查詢數
+ASYNC_FINDBIZ_WORKERS = 8              # FindBiz 需要表單狀態或瀏覽器，仍以同步路徑在此數量的執行緒中查詢
+# 自然人持股計算方式："paths"（逐條路徑相乘，預設）或 "matrix"（矩陣求解，含交叉持股；
+# 無循環時結果與 paths 相同，交叉持股密集時不需列舉路徑）
+OWNERSHIP_METHOD = "paths"
+
+# 行程內記憶體快取（同一行程的所有查詢與 Streamlit 工作階段共用），超過上限時以 LRU 淘汰
+MEMORY_CACHE_TTLS = {                  # 各來源有效期限（秒）
+    "company_no": 1 * 86400,
+    "company_info": 1 * 86400,
+    "directors": 6 * 3600,
+}
+MEMORY_CACHE_MAX_ENTRIES = 20000
+MEMORY_CACHE_MAX_BYTES = 64 * 1024 * 1024   # 以 JSON 長度估計
+
+# 本機持久快取（SQLite），重啟程式後仍可沿用
+PERSISTENT_CACHE_ENABLED = True
+PERSISTENT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'query_cache.sqlite3'
+)
+PERSISTENT_CACHE_TTLS = {              # 各來源有效期限（秒）
+    "company_no": 30 * 86400,          # 公司名稱 → 統編
+    "company_info": 7 * 86400,         # FindBiz 公司基本資料
+    "directors": 1 * 86400,            # GCIS 董監事資料
+}
+PERSISTENT_CACHE_MAX_ENTRIES = 50000
+
+# 查詢快照（增量重查用），保存每次查詢的董監事鏈與董監事資料指紋
+SNAPSHOT_ENABLED = True
+SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'crawl_snapshots.sqlite3'
+)
+
+# 各階段耗時指標（Prometheus 文字格式），每次查詢完成後更新；設為 None 則不寫檔
+METRICS_TEXTFILE_PATH: Optional[str] = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'metrics.prom'
+)
+
+# 本機公司名稱索引（由 name_index.py 以公司登記資料建立），檔案不存在時直接查遠端
+NAME_INDEX_ENABLED = True
+NAME_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'company_names.sqlite3'
+)
+NAME_INDEX_RETRY_SECONDS = 30          # 索引不存在或開啟失敗後，隔多久再檢查檔案是否已建立 / 更新
+
+# 上市櫃公司名單（與 Streamlit 介面共用 listed_registry），第一次判斷時才載入
+LISTED_CSV_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'concat_all.csv'
+)
 
 
 # ========== 工具函數 ==========
@@ -68,12 +164,137 @@ def _to_float(val: Optional[str]) -> Optional[float]:
         return None
 
 
+# ========== 限速 ==========
+_rate_limiter: Optional[HostRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """取得全域共用的主機限速器"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = HostRateLimiter(RATE_LIMITS, slow_threshold=SLOW_RESPONSE_SECONDS)
+        return _rate_limiter
+
+
+# ========== 共用 HTTP 連線 ==========
+_http: Optional[SharedHttpSession] = None
+_http_lock = threading.Lock()
+
+
+def get_http() -> SharedHttpSession:
+    """取得全域共用、執行緒安全的 HTTP 連線層"""
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = SharedHttpSession(
+                headers=HEADERS,
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE
+            )
+        return _http
+
+
+def _http_get(url: str, **kwargs):
+    """經共用連線池與限速器送出 GET"""
+    kwargs.setdefault("timeout", REQ_TIMEOUT)
+    return _throttled(get_http().get, url, **kwargs)
+
+
+def _throttled(send, url: str, *args, **kwargs):
+    """經過限速器送出 HTTP 請求，並把狀態碼與耗時回報給限速器
+
+    冪等方法遇連線錯誤、逾時或 429/5xx 時重試最多 HTTP_RETRIES 次；每次重試都重新向限速器
+    取得許可並回報結果，限速器的冷卻（含 Retry-After）因此也套用在重試上。
+    """
+    host = urlparse(url).hostname or ""
+    method = getattr(send, "__name__", "get")
+    recorder = replay.active_recorder()
+    if recorder is not None and recorder.replaying:
+        # 回放模式：不連網路、不經限速器
+        resp = recorder.replay_http(method, url, kwargs)
+        note_external_call(host, "replay", 0.0, len(resp.content))
+        return resp
+    limiter = get_rate_limiter()
+    retries = HTTP_RETRIES if method.lower() in RETRY_METHODS else 0
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(retry_delay(attempt - 1, HTTP_BACKOFF_FACTOR, HTTP_BACKOFF_JITTER))
+        limiter.acquire(host)
+        start = time.monotonic()
+        try:
+            resp = send(url, *args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _report_response(host, None, time.monotonic() - start)
+            if attempt < retries:
+                continue
+            raise
+        except Exception:
+            _report_response(host, None, time.monotonic() - start)
+            raise
+        _report_response(host, resp, time.monotonic() - start)
+        if resp.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+            break
+    if recorder is not None and recorder.recording:
+        recorder.record_http(method, url, kwargs, resp)
+    return resp
+
+
+def _report_response(host: str, resp, elapsed: float) -> None:
+    """把一次請求的結果回報給限速器與指標；resp 為 None 表示連線錯誤"""
+    limiter = get_rate_limiter()
+    if resp is None:
+        limiter.report(host, error=True)
+        note_external_call(host, "error", elapsed, 0)
+        return
+    limiter.report(host, status_code=resp.status_code, elapsed=elapsed, retry_after=_retry_after(resp))
+    note_external_call(host, resp.status_code, elapsed, len(resp.content or b""))
+
+
+def _retry_after(resp) -> Optional[float]:
+    """429 回應的 Retry-After 秒數"""
+    if resp.status_code != 429:
+        return None
+    header = str(resp.headers.get("Retry-After", "")).strip()
+    return float(header) if header.isdigit() else None
+
+
+# ========== 非同步 HTTP ==========
+def new_async_http() -> AsyncHttpSession:
+    """建立非同步 HTTP 用戶端；同一個事件迴圈中的查詢應共用同一個（各主機並行上限與請求合併）"""
+    return AsyncHttpSession(
+        headers=HEADERS,
+        host_concurrency=ASYNC_HOST_CONCURRENCY,
+        default_concurrency=ASYNC_DEFAULT_CONCURRENCY,
+        timeout=REQ_TIMEOUT,
+        retries=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        reserve=get_rate_limiter().reserve,
+        report=_report_response
+    )
+
+
+async def _http_get_async(http: AsyncHttpSession, url: str, **kwargs):
+    """非同步版 _http_get：與同步路徑共用限速器（在 http 內等待，不阻塞事件迴圈），每次嘗試都回報結果"""
+    if replay.active_recorder() is not None:
+        # 錄製／回放沿用同步路徑，在執行緒中執行
+        return await asyncio.to_thread(_http_get, url, **kwargs)
+    return await http.get(url, **kwargs)
+
+
 # ========== Selenium 爬蟲類別 ==========
 class FindbizSeleniumScraper:
     """使用 Selenium 爬取商工登記資料"""
     
     def __init__(self, headless: bool = True, driver_path: Optional[str] = None):
-        self.base_url = "https://findbiz.nat.gov.tw/fts/query/QueryBar/queryInit.do"
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.base_url = FINDBIZ_QUERY_INIT_URL
         chrome_options = Options()
         if headless:
             chrome_options.add_argument('--headless')
@@ -83,17 +304,35 @@ class FindbizSeleniumScraper:
         chrome_options.add_argument('--window-size=1920,1080')
         chrome_options.add_argument('--lang=zh-TW')
         chrome_options.add_argument('--blink-settings=imagesEnabled=false')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
+        chrome_options.add_argument(f'user-agent={FINDBIZ_USER_AGENT}')
         
         #service = Service(driver_path) if driver_path else Service()
         chrome_options.binary_location="/usr/bin/chromium"
         service = Service("/usr/bin/chromedriver")
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
         self.wait = WebDriverWait(self.driver, 10)
+        self.pages_served = 0
+
+    def is_alive(self) -> bool:
+        """健康檢查：確認瀏覽器仍可回應"""
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
 
+    @traced("findbiz_selenium")
     def get_company_data(self, ban_no: str, company_name: Optional[str] = None) -> Optional[Dict]:
         """查詢公司資料並解析詳細頁"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+
+        self.pages_served += 1
+        start = time.monotonic()
+        limiter = get_rate_limiter()
+        host = urlparse(self.base_url).hostname
         try:
+            limiter.acquire(host)
             self.driver.get(self.base_url)
             self.wait.until(EC.presence_of_element_located((By.ID, "qryCond")))
             
@@ -102,6 +341,7 @@ class FindbizSeleniumScraper:
             search_input.send_keys(ban_no)
             
             search_button = self.wait.until(EC.element_to_be_clickable((By.ID, "qryBtn")))
+            limiter.acquire(host)
             search_button.click()
             
             self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "panel-heading")))
@@ -117,76 +357,29 @@ class FindbizSeleniumScraper:
                     target = links[0]
                 if not target:
                     return None
+                limiter.acquire(host)
                 target.click()
             else:
                 link = self.driver.find_element(By.CSS_SELECTOR, "a.hover")
+                limiter.acquire(host)
                 link.click()
             
             self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table-striped")))
             page_source = self.driver.page_source
+            note_external_call(host, "browser", time.monotonic() - start, len(page_source.encode("utf-8")))
+            recorder = replay.active_recorder()
+            if recorder is not None and recorder.recording:
+                recorder.record_page(ban_no, company_name, page_source)
             return self._parse_page(page_source, ban_no)
             
         except Exception as e:
             print(f"[ERROR] 查詢失敗 ({ban_no}): {e}")
+            limiter.report(host, error=True)
             return None
-        finally:
-            time.sleep(0.3)
 
     def _parse_page(self, html: str, ban_no: str) -> Optional[Dict]:
         """解析詳細頁 HTML"""
-        soup = BeautifulSoup(html, 'html.parser')
-        data = {
-            '統一編號': ban_no,
-            '公司名稱': None,
-            '登記現況': None,
-            '代表人': None,
-            '公司所在地': None,
-            '資本總額': None,
-            '實收資本額': None,
-            '每股金額': None,
-            '已發行股份總數': None,
-            '所營事業資料':[],
-            
-        }
-        
-        table = soup.find('table', class_='table-striped') or soup.find('table', class_='table')
-        if not table:
-            return None
-        def parse_business_items(text: str):
-            pattern = r"([A-Z]\d{6})\s*([^\dA-Z]+)"
-            matches = re.findall(pattern, text)
-            return [{"業別代碼": c, "業別名稱": n.strip()} for c, n in matches]
-        for row in table.find_all('tr'):
-            cells = row.find_all('td')
-            if len(cells) < 2:
-                continue
-            key = cells[0].get_text(strip=True)
-            value = ' '.join(cells[1].get_text(strip=True).split())
-            
-            if key == '統一編號':
-                data['統一編號'] = value.split()[0].split('訂閱')[0]
-            elif key == '公司名稱':
-                value = value.split('Google搜尋')[0].split('國際貿易署')[0]
-                data['公司名稱'] = value.strip()
-            elif key == '登記現況':
-                data['登記現況'] = value.split('「')[0].strip()
-            elif key == '代表人姓名':
-                data['代表人'] = value
-            elif key == '公司所在地':
-                clean_value = re.sub(r"電子地圖同地址公司家數[:：]?\s*\d+", "", value).strip()
-                data['公司所在地'] = clean_value    
-            elif key == '資本總額(元)':
-                data['資本總額'] = value
-            elif key == '實收資本額(元)':
-                data['實收資本額'] = value
-            elif key == '每股金額(元)':
-                data['每股金額'] = value
-            elif key == '已發行股份總數(股)':
-                data['已發行股份總數'] = value
-            elif key == '所營事業資料':
-                data['所營事業資料'] = parse_business_items(value)   
-        print(data)
-        return data
+        return parse_findbiz_page(html, ban_no)
 
     def close(self):
         try:
@@ -201,53 +394,505 @@ class FindbizSeleniumScraper:
         self.close()
 
 
+# ========== 純 HTTP 爬蟲類別 ==========
+FINDBIZ_NOT_FOUND = object()   # FindBiz 查詢結果為空（確定查無此公司，不必改用瀏覽器重查）
+
+
+class FindbizHttpClient:
+    """以 requests.Session 直接重送 FindBiz 查詢表單與詳細頁請求，不需啟動瀏覽器"""
+
+    def __init__(self, timeout: Tuple[float, float] = REQ_TIMEOUT):
+        self.timeout = timeout
+        # 獨立 Session 保存 FindBiz cookie，底層連線仍共用連線池
+        self.session = get_http().new_session(headers={
+            "User-Agent": FINDBIZ_USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "zh-TW,zh;q=0.9",
+        })
+        self._form: Optional[tuple] = None  # (action_url, fields)，取自 queryInit 頁
+
+    @traced("findbiz_http")
+    def get_company_data(self, ban_no: str, company_name: Optional[str] = None):
+        """查詢公司資料並解析詳細頁；查無此公司回傳 FINDBIZ_NOT_FOUND，任何步驟失敗回傳 None"""
+        for attempt in range(2):
+            try:
+                html = self._fetch_detail_html(ban_no, company_name)
+                if html is FINDBIZ_NOT_FOUND:
+                    return html
+                return parse_findbiz_page(html, ban_no)
+            except Exception as e:
+                # 表單 token / cookie 可能已失效，重新載入查詢頁再試一次
+                self._form = None
+                if attempt == 1:
+                    print(f"[WARNING] FindBiz HTTP 查詢失敗 ({ban_no}): {e}")
+        return None
+
+    def _load_form(self) -> tuple:
+        """載入查詢頁，取得表單 action 與所有隱藏欄位（含 token）"""
+        from bs4 import BeautifulSoup
+
+        if self._form is None:
+            resp = _throttled(self.session.get, FINDBIZ_QUERY_INIT_URL, timeout=self.timeout)
+            resp.raise_for_status()
+            soup = BeautifulSoup(resp.text, 'html.parser')
+            field = soup.find(id="qryCond")
+            form = field.find_parent("form") if field else None
+            if form is None:
+                raise ValueError("查詢頁找不到 qryCond 表單")
+            fields = {}
+            for inp in form.find_all("input"):
+                name = inp.get("name")
+                if not name:
+                    continue
+                if inp.get("type") in ("checkbox", "radio") and not inp.has_attr("checked"):
+                    continue
+                fields[name] = inp.get("value", "")
+            action = urljoin(resp.url, form.get("action") or FINDBIZ_QUERY_LIST_URL)
+            self._form = (action, fields)
+        return self._form
+
+    def _fetch_detail_html(self, ban_no: str, company_name: Optional[str]):
+        from bs4 import BeautifulSoup
+
+        action, fields = self._load_form()
+        data = dict(fields)
+        data["qryCond"] = ban_no
+        resp = _throttled(self.session.post, action, data=data, timeout=self.timeout,
+                          headers={"Referer": FINDBIZ_QUERY_INIT_URL})
+        resp.raise_for_status()
+        soup = BeautifulSoup(resp.text, 'html.parser')
+        if not soup.find(class_="panel-heading"):
+            raise ValueError("查詢結果頁格式不符")
+
+        # 與 Selenium 版相同：優先點公司名稱完全相符的連結，否則取第一筆
+        links = soup.select("a.hover")
+        if not links:
+            return FINDBIZ_NOT_FOUND
+        target = links[0]
+        if company_name:
+            for link in links:
+                if link.get_text(strip=True) == company_name.strip():
+                    target = link
+                    break
+
+        detail_url = self._detail_url(target, ban_no, resp.url)
+        detail = _throttled(self.session.get, detail_url, timeout=self.timeout,
+                            headers={"Referer": resp.url})
+        detail.raise_for_status()
+        if "table-striped" not in detail.text:
+            raise ValueError("詳細頁缺少基本資料表格")
+        return detail.text
+
+    @staticmethod
+    def _detail_url(link, ban_no: str, base_url: str) -> str:
+        """由結果連結推出詳細頁網址（href 或 onclick 內的 objectId）；都沒有時丟出 ValueError，改用瀏覽器查詢"""
+        href = (link.get("href") or "").strip()
+        if href and href != "#" and not href.lower().startswith("javascript"):
+            return urljoin(base_url, href)
+        args = re.findall(r"'([^']*)'", link.get("onclick") or "")
+        object_id = next((a for a in args if re.fullmatch(r"[A-Za-z0-9+/]{8,}={0,2}", a)), None)
+        if object_id is None:
+            raise ValueError("查詢結果連結中找不到詳細頁網址或 objectId")
+        return f"{FINDBIZ_DETAIL_URL}?objectId={object_id}&banNo={ban_no}"
+
+
+_findbiz_http_local = threading.local()
+
+
+def get_findbiz_http_client() -> FindbizHttpClient:
+    """每個執行緒各自一個 FindbizHttpClient（cookie 與表單狀態不共用）"""
+    client = getattr(_findbiz_http_local, "client", None)
+    if client is None:
+        client = FindbizHttpClient()
+        _findbiz_http_local.client = client
+    return client
+
+
+# ========== 瀏覽器連線池 ==========
+class FindbizScraperPool:
+    """可重複使用的 FindbizSeleniumScraper 連線池（借出 / 歸還）"""
+
+    def __init__(
+        self,
+        max_size: int = SCRAPER_POOL_SIZE,
+        max_pages: int = SCRAPER_MAX_PAGES,
+        checkout_timeout: float = SCRAPER_CHECKOUT_TIMEOUT,
+        headless: bool = True
+    ):
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        self.headless = headless
+        self._idle: List[FindbizSeleniumScraper] = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def checkout(self) -> FindbizSeleniumScraper:
+        """借出一個健康的瀏覽器；池滿時等待歸還"""
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            scraper = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("瀏覽器連線池已關閉")
+                    if self._idle:
+                        scraper = self._idle.pop()
+                        break
+                    if self._created < self.max_size:
+                        self._created += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待瀏覽器逾時（{self.checkout_timeout} 秒）")
+                    self._cond.wait(remaining)
+
+            if scraper is None:
+                try:
+                    return FindbizSeleniumScraper(headless=self.headless)
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if scraper.is_alive():
+                return scraper
+            print("[WARNING] 瀏覽器健康檢查失敗，重新建立")
+            self._discard(scraper)
+
+    def checkin(self, scraper: FindbizSeleniumScraper, healthy: bool = True) -> None:
+        """歸還瀏覽器；不健康或已達頁數上限者直接回收"""
+        with self._cond:
+            if healthy and not self._closed and scraper.pages_served < self.max_pages:
+                self._idle.append(scraper)
+                self._cond.notify()
+                return
+        self._discard(scraper)
+
+    @contextlib.contextmanager
+    def scraper(self):
+        """with 區塊內借用瀏覽器，離開時自動歸還"""
+        scraper = self.checkout()
+        healthy = True
+        try:
+            yield scraper
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.checkin(scraper, healthy=healthy)
+
+    def _discard(self, scraper: FindbizSeleniumScraper) -> None:
+        scraper.close()
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def close(self) -> None:
+        """關閉連線池與所有閒置瀏覽器"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for scraper in idle:
+            self._discard(scraper)
+
+
+_scraper_pool: Optional[FindbizScraperPool] = None
+_scraper_pool_lock = threading.Lock()
+
+
+def get_scraper_pool() -> FindbizScraperPool:
+    """取得全域共用的瀏覽器連線池"""
+    global _scraper_pool
+    with _scraper_pool_lock:
+        if _scraper_pool is None:
+            _scraper_pool = FindbizScraperPool()
+            atexit.register(_scraper_pool.close)
+        return _scraper_pool
+
+
+# ========== 記憶體快取 ==========
+_memory_cache: Optional[MemoryCache] = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache() -> MemoryCache:
+    """取得行程內共用的記憶體快取"""
+    global _memory_cache
+    with _memory_cache_lock:
+        if _memory_cache is None:
+            _memory_cache = MemoryCache(
+                MEMORY_CACHE_TTLS, max_entries=MEMORY_CACHE_MAX_ENTRIES, max_bytes=MEMORY_CACHE_MAX_BYTES
+            )
+        return _memory_cache
+
+
+# 同一筆資料同時被多個執行緒（爬蟲、預取）查詢時只送一次請求
+_single_flight = SingleFlight()
+
+
+# ========== 持久快取 ==========
+_persistent_cache: Optional[PersistentCache] = None
+_persistent_cache_lock = threading.Lock()
+_persistent_cache_failed = False
+
+
+def get_persistent_cache() -> Optional[PersistentCache]:
+    """取得本機持久快取；停用或無法開啟時回傳 None"""
+    global _persistent_cache, _persistent_cache_failed
+    if not PERSISTENT_CACHE_ENABLED or _persistent_cache_failed:
+        return None
+    with _persistent_cache_lock:
+        if _persistent_cache is None and not _persistent_cache_failed:
+            try:
+                _persistent_cache = PersistentCache(
+                    PERSISTENT_CACHE_PATH,
+                    ttls=PERSISTENT_CACHE_TTLS,
+                    max_entries=PERSISTENT_CACHE_MAX_ENTRIES
+                )
+            except Exception as e:
+                print(f"[WARNING] 無法開啟本機快取，改為僅使用記憶體快取: {e}")
+                _persistent_cache_failed = True
+        return _persistent_cache
+
+
+def _disk_cache_get(source: str, key: str):
+    cache = get_persistent_cache()
+    if cache is None:
+        return MISSING
+    try:
+        return cache.get(source, key)
+    except Exception as e:
+        print(f"[WARNING] 讀取本機快取失敗: {e}")
+        return MISSING
+
+
+def _disk_cache_set(source: str, key: str, value, ban: Optional[str] = None) -> None:
+    cache = get_persistent_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(source, key, value, ban=ban)
+    except Exception as e:
+        print(f"[WARNING] 寫入本機快取失敗: {e}")
+
+
+# ========== 本機名稱索引 ==========
+_name_index: Optional[CompanyNameIndex] = None
+_name_index_lock = threading.Lock()
+_name_index_failed: Optional[Tuple[Optional[Tuple[int, int]], float]] = None  # (失敗時的檔案簽章, 下次檢查時間)
+
+
+def _name_index_signature() -> Optional[Tuple[int, int]]:
+    """索引檔的 (大小, 修改時間)；檔案不存在時回傳 None"""
+    try:
+        stat = os.stat(NAME_INDEX_PATH)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get_name_index() -> Optional[CompanyNameIndex]:
+    """取得本機公司名稱索引；停用、尚未建立或無法開啟時回傳 None
+
+    失敗後每隔 NAME_INDEX_RETRY_SECONDS 檢查一次檔案，索引建立或更新後即可使用，不需重啟。
+    """
+    global _name_index, _name_index_failed
+    if not NAME_INDEX_ENABLED:
+        return None
+    failed = _name_index_failed
+    if _name_index is None and failed is not None and time.monotonic() < failed[1]:
+        return None
+    with _name_index_lock:
+        if _name_index is not None:
+            return _name_index
+        failed = _name_index_failed
+        if failed is not None and time.monotonic() < failed[1]:
+            return None
+        signature = _name_index_signature()
+        retry_at = time.monotonic() + NAME_INDEX_RETRY_SECONDS
+        if signature is None or (failed is not None and failed[0] == signature):
+            # 檔案不存在，或與上次開啟失敗時相同
+            _name_index_failed = (signature, retry_at)
+            return None
+        try:
+            _name_index = CompanyNameIndex(NAME_INDEX_PATH)
+            _name_index_failed = None
+        except Exception as e:
+            print(f"[WARNING] 無法開啟本機名稱索引，改為查詢遠端: {e}")
+            _name_index_failed = (signature, retry_at)
+        return _name_index
+
+
+def _name_index_lookup(company_name: str) -> Optional[str]:
+    index = get_name_index()
+    if index is None:
+        return None
+    try:
+        return index.lookup(company_name)
+    except Exception as e:
+        print(f"[WARNING] 查詢本機名稱索引失敗: {e}")
+        return None
+
+
+# ========== 查詢快照 ==========
+_snapshot_store: Optional[CrawlSnapshotStore] = None
+_snapshot_store_lock = threading.Lock()
+_snapshot_store_failed = False
+
+
+def get_snapshot_store() -> Optional[CrawlSnapshotStore]:
+    """取得查詢快照庫；停用或無法開啟時回傳 None"""
+    global _snapshot_store, _snapshot_store_failed
+    if not SNAPSHOT_ENABLED or _snapshot_store_failed:
+        return None
+    with _snapshot_store_lock:
+        if _snapshot_store is None and not _snapshot_store_failed:
+            try:
+                _snapshot_store = CrawlSnapshotStore(SNAPSHOT_PATH)
+            except Exception as e:
+                print(f"[WARNING] 無法開啟查詢快照，增量重查將改為完整查詢: {e}")
+                _snapshot_store_failed = True
+        return _snapshot_store
+
+
+def clear_memory_caches() -> None:
+    """清空行程內的記憶體快取（不影響本機持久快取）"""
+    get_memory_cache().clear()
+
+
+@contextlib.contextmanager
+def external_responses(mode: str, path: str):
+    """錄製（mode="record"）或回放（mode="replay"）期間所有外部回應
+
+    期間停用本機快取、名稱索引與查詢快照並清空記憶體快取，確保每個請求都經過錄放層；
+    錄製模式結束時寫出 path。
+    """
+    global PERSISTENT_CACHE_ENABLED, NAME_INDEX_ENABLED, SNAPSHOT_ENABLED, _findbiz_http_local
+    recorder = ResponseRecorder(path, mode)
+    saved = (PERSISTENT_CACHE_ENABLED, NAME_INDEX_ENABLED, SNAPSHOT_ENABLED)
+    PERSISTENT_CACHE_ENABLED = NAME_INDEX_ENABLED = SNAPSHOT_ENABLED = False
+    clear_memory_caches()
+    # FindBiz 表單狀態也重新取得，錄製檔才會包含查詢頁
+    _findbiz_http_local = threading.local()
+    replay.activate(recorder)
+    try:
+        yield recorder
+    finally:
+        replay.activate(None)
+        PERSISTENT_CACHE_ENABLED, NAME_INDEX_ENABLED, SNAPSHOT_ENABLED = saved
+        clear_memory_caches()
+        _findbiz_http_local = threading.local()
+        if recorder.recording:
+            recorder.save()
+            print(f"[INFO] 已錄製 {len(recorder)} 筆外部回應至 {path}")
+
+
+def invalidate_business_no(business_no: str) -> None:
+    """清除某統編的所有快取（記憶體與本機檔案），下次查詢會重新抓取"""
+    get_memory_cache().invalidate_ban(business_no)
+    cache = get_persistent_cache()
+    if cache is not None:
+        cache.invalidate_ban(business_no)
+
+
 # ========== 核心查詢函數 ==========
-def get_business_no_by_name(company_name_or_no: str) -> Optional[str]:
-    """依公司名稱或統編查詢統一編號"""
+class LookupFailed(Exception):
+    """外部來源查詢失敗（連線錯誤、逾時或非 200 回應）；與「查無此公司」不同，結果不寫入快取"""
+
+
+@traced()
+def get_business_no_by_name(company_name_or_no: str, strict: bool = False) -> Optional[str]:
+    """依公司名稱或統編查詢統一編號
+
+    查無此公司回傳 None；查詢失敗時 strict=True 丟出 LookupFailed，否則同樣回傳 None。
+    """
     input_key = company_name_or_no.strip()
     if not input_key:
         return None
+    try:
+        return _single_flight.do(("company_no", input_key), _get_business_no_by_name, input_key)
+    except LookupFailed as e:
+        if strict:
+            raise
+        print(f"[WARNING] 查詢失敗: {e}")
+        return None
+
+
+def _get_business_no_by_name(input_key: str) -> Optional[str]:
+    cached = _lookup_business_no(input_key)
+    if cached is not MISSING:
+        return cached
+    
+    # 以公司名稱查詢
+    try:
+        return _business_no_from_search(input_key, _http_get(_company_search_url(input_key)))
+    except LookupFailed:
+        raise
+    except Exception as e:
+        raise LookupFailed(f"{input_key}: {e}") from e
+
+
+def _lookup_business_no(input_key: str):
+    """統編輸入直接回傳，否則依序查記憶體、名稱索引與持久快取；都沒有時回傳 MISSING"""
+    memory = get_memory_cache()
     
     # 檢查是否為統編（純數字且長度 7-8 位）
     if input_key.isdigit() and 7 <= len(input_key) <= 8:
         business_no = input_key.zfill(8)
         print(f"[INFO] 輸入為統編: {business_no}")
-        _cache_company_no[input_key] = business_no
         return business_no
     
     # 檢查快取
-    if input_key in _cache_company_no:
-        return _cache_company_no[input_key]
-    
-    # 以公司名稱查詢
-    url = COMPANY_SEARCH_URL.format(keyword=requests.utils.quote(input_key))
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=REQ_TIMEOUT)
-        if resp.status_code != 200:
-            _cache_company_no[input_key] = None
-            return None
-        
-        data = resp.json()
-        if not data or "output" not in data or not data["output"]:
-            _cache_company_no[input_key] = None
-            return None
-        
-        df = pd.DataFrame(data["output"])
-        exact = df[df["Company_Name"].str.strip() == input_key]
-        target_row = exact.iloc[0] if len(exact) > 0 else df.iloc[0]
-        
-        raw_no = str(target_row["Business_Accounting_NO"]).strip()
-        business_no = raw_no.zfill(8) if raw_no.isdigit() else None
-        
-        _cache_company_no[input_key] = business_no
-        time.sleep(SLEEP_BETWEEN_CALLS)
+    cached = memory.get("company_no", input_key)
+    if cached is not MISSING:
+        note_cache(True)
+        return cached
+    business_no = _name_index_lookup(input_key)
+    if business_no:
+        note_cache(True)
+        memory.set("company_no", input_key, business_no, ban=business_no)
         return business_no
-        
-    except Exception as e:
-        print(f"[WARNING] 查詢失敗: {e}")
-        _cache_company_no[input_key] = None
+    cached = _disk_cache_get("company_no", input_key)
+    if cached is not MISSING:
+        note_cache(True)
+        memory.set("company_no", input_key, cached, ban=cached)
+        return cached
+    note_cache(False)
+    return MISSING
+
+
+def _company_search_url(input_key: str) -> str:
+    return COMPANY_SEARCH_URL.format(keyword=requests.utils.quote(input_key))
+
+
+def _business_no_from_search(input_key: str, resp) -> Optional[str]:
+    """由 opendata.vip 名稱查詢的回應取出統編（優先完全相符的公司名稱）並寫入快取"""
+    memory = get_memory_cache()
+    if resp.status_code != 200:
+        raise LookupFailed(f"{input_key}: HTTP {resp.status_code}")
+    
+    data = resp.json()
+    if not data or "output" not in data or not data["output"]:
+        memory.set("company_no", input_key, None)
+        _disk_cache_set("company_no", input_key, None)
         return None
     
+    df = pd.DataFrame(data["output"])
+    exact = df[df["Company_Name"].str.strip() == input_key]
+    target_row = exact.iloc[0] if len(exact) > 0 else df.iloc[0]
+    
+    raw_no = str(target_row["Business_Accounting_NO"]).strip()
+    business_no = raw_no.zfill(8) if raw_no.isdigit() else None
+    
+    memory.set("company_no", input_key, business_no, ban=business_no)
+    _disk_cache_set("company_no", input_key, business_no, ban=business_no)
+    return business_no
+    
 
 
 
@@ -293,108 +938,300 @@ def classify_company_by_business_items(business_items):
 
 
 
+@traced()
 def fetch_company_info_findbiz(
     business_no: str,
     company_name: Optional[str] = None,
     scraper: Optional[FindbizSeleniumScraper] = None,
-    use_cache: bool = True
+    use_cache: bool = True,
+    pool: Optional[FindbizScraperPool] = None
 ) -> Optional[Dict]:
-    """以 FindBiz 抓公司資訊並回傳統一結構"""
-    global _cache_company_info
-    
-    if use_cache and business_no in _cache_company_info:
-        return _cache_company_info[business_no]
+    """以 FindBiz 抓公司資訊並回傳統一結構
+
+    未指定 scraper 時先走純 HTTP 路徑，失敗才向瀏覽器連線池借用 Chromium。
+    """
+    if use_cache and scraper is None:
+        return _single_flight.do(
+            ("company_info", business_no), _fetch_company_info, business_no, company_name, None, True, pool
+        )
+    return _fetch_company_info(business_no, company_name, scraper, use_cache, pool)
+
+
+def _fetch_company_info(
+    business_no: str,
+    company_name: Optional[str],
+    scraper: Optional[FindbizSeleniumScraper],
+    use_cache: bool,
+    pool: Optional[FindbizScraperPool]
+) -> Optional[Dict]:
+    memory = get_memory_cache()
+    if use_cache:
+        cached = memory.get("company_info", business_no)
+        if cached is not MISSING:
+            note_cache(True)
+            return cached
+        cached = _disk_cache_get("company_info", business_no)
+        if cached is not MISSING:
+            note_cache(True)
+            memory.set("company_info", business_no, cached, ban=business_no)
+            return cached
+    note_cache(False)
     
-    owns_scraper = False
     if scraper is None:
-        scraper = FindbizSeleniumScraper(headless=True)
-        owns_scraper = True
-    
-    try:
+        raw = None
+        if FINDBIZ_HTTP_ENABLED:
+            raw = get_findbiz_http_client().get_company_data(business_no, company_name)
+        recorder = replay.active_recorder()
+        if raw is FINDBIZ_NOT_FOUND:
+            # 查詢成功但查無此公司：只有 HTTP 查詢失敗時才改用瀏覽器
+            raw = None
+        elif not raw and recorder is not None and recorder.replaying:
+            # 回放模式不啟動瀏覽器，改用錄製時 Selenium 取得的頁面
+            html = recorder.replay_page(business_no, company_name)
+            raw = parse_findbiz_page(html, business_no) if html else None
+        elif not raw:
+            with (pool or get_scraper_pool()).scraper() as pooled:
+                raw = pooled.get_company_data(business_no, company_name)
+    else:
         raw = scraper.get_company_data(business_no, company_name)
-        if not raw:
-            result = None
-        else:
-            capital_total = _to_float(raw.get('資本總額'))
-            paid_in = _to_float(raw.get('實收資本額'))
-            par_val = _to_float(raw.get('每股金額')) or DEFAULT_STOCK_PAR_VALUE
-            issued_cnt = _to_float(raw.get('已發行股份總數'))
-            
-            if issued_cnt is None and paid_in and par_val and par_val > 0:
-                issued_cnt = paid_in / par_val
-            items = raw.get("所營事業資料")
-            if not isinstance(items, list):
-                items = []
-            result = {
-                #"統一編號": raw.get('統一編號') or business_no,
-                "統一編號": business_no,
-                "公司名稱": raw.get('公司名稱'),
-                "登記現況": raw.get('登記現況'),
-                "代表人": raw.get('代表人'),
-                "公司所在地": raw.get('公司所在地'),
-                "資本總額": capital_total,
-                "實收資本額": paid_in,
-                "每股金額": par_val,
-                "已發行股數": issued_cnt,
-                "所營事業資料": raw.get("所營事業資料"),
-                "CRS分類":classify_company_by_business_items(items)
-                
-            }
-        
-        if use_cache:
-            _cache_company_info[business_no] = result
-        return result
+    result = _normalize_company_info(raw, business_no)
+    
+    if use_cache:
+        memory.set("company_info", business_no, result, ban=business_no)
+        if result is not None:
+            _disk_cache_set("company_info", business_no, result, ban=business_no)
+    return result
+
+
+def _normalize_company_info(raw: Optional[Dict], business_no: str) -> Optional[Dict]:
+    """將 FindBiz 解析結果轉為統一結構"""
+    if not raw:
+        return None
+    capital_total = _to_float(raw.get('資本總額'))
+    paid_in = _to_float(raw.get('實收資本額'))
+    par_val = _to_float(raw.get('每股金額')) or DEFAULT_STOCK_PAR_VALUE
+    issued_cnt = _to_float(raw.get('已發行股份總數'))
+    
+    if issued_cnt is None and paid_in and par_val and par_val > 0:
+        issued_cnt = paid_in / par_val
+    items = raw.get("所營事業資料")
+    if not isinstance(items, list):
+        items = []
+    return {
+        #"統一編號": raw.get('統一編號') or business_no,
+        "統一編號": business_no,
+        "公司名稱": raw.get('公司名稱'),
+        "登記現況": raw.get('登記現況'),
+        "代表人": raw.get('代表人'),
+        "公司所在地": raw.get('公司所在地'),
+        "資本總額": capital_total,
+        "實收資本額": paid_in,
+        "每股金額": par_val,
+        "已發行股數": issued_cnt,
+        "所營事業資料": raw.get("所營事業資料"),
+        "CRS分類":classify_company_by_business_items(items)
         
-    finally:
-        if owns_scraper:
-            scraper.close()
-        time.sleep(SLEEP_BETWEEN_CALLS)
+    }
 
 
-def fetch_directors_by_business_no(business_no: str) -> List[Dict]:
-    """查詢董監事資料（含股數與出資額）"""
-    if business_no in _cache_directors_by_no:
-        return _cache_directors_by_no[business_no]
+@traced()
+def fetch_directors_by_business_no(business_no: str, refresh: bool = False) -> List[Dict]:
+    """查詢董監事資料（含股數與出資額）；refresh=True 時略過記憶體與持久快取直接重查"""
+    cached = _lookup_directors(business_no) if not refresh else MISSING
+    if cached is not MISSING:
+        return cached
     
     records: List[Dict] = []
-    business_no_formats = [business_no, business_no.lstrip('0')]
-    
-    # 先試 JSON
-    for bn_format in business_no_formats:
-        params_json = {"$format": "json", "$filter": f"Business_Accounting_NO eq {bn_format}"}
+    for params in _director_queries(business_no):
         try:
-            rj = requests.get(GCIS_DIRECTOR_API, params=params_json, headers=HEADERS, timeout=REQ_TIMEOUT)
-            if rj and rj.status_code == 200:
-                payload = rj.json()
-                if isinstance(payload, list) and len(payload) > 0:
-                    for row in payload:
-                        share_raw = str(row.get("Person_Shareholding", "")).strip()
-                        invest_raw = str(row.get("Person_Investment_Amount", "")).strip()
-                        
-                        records.append({
-                            "職稱": str(row.get("Person_Position_Name", "")).strip(),
-                            "姓名": str(row.get("Person_Name", "")).strip(),
-                            "所代表法人": str(row.get("Juristic_Person_Name", "")).strip(),
-                            "所持有股數": _to_float(share_raw),
-                            "出資額": _to_float(invest_raw),
-                            "統一編號": str(row.get("Business_Accounting_NO", "")).strip()
-                        })
-                if records:
-                    break
+            records = _director_records(_http_get(GCIS_DIRECTOR_API, params=params))
+            if records:
+                break
         except Exception:
             pass
     
-    time.sleep(SLEEP_BETWEEN_CALLS)
-    _cache_directors_by_no[business_no] = records
+    _store_directors(business_no, records)
     return records
 
 
+def _lookup_directors(business_no: str):
+    """依序查記憶體與持久快取；都沒有時回傳 MISSING"""
+    memory = get_memory_cache()
+    cached = memory.get("directors", business_no)
+    if cached is not MISSING:
+        note_cache(True)
+        return cached
+    cached = _disk_cache_get("directors", business_no)
+    if cached is not MISSING:
+        note_cache(True)
+        memory.set("directors", business_no, cached, ban=business_no)
+        return cached
+    note_cache(False)
+    return MISSING
+
+
+def _director_queries(business_no: str) -> List[Dict]:
+    """單筆董監事查詢的參數，依序試補零與去零兩種統編格式"""
+    return [{"$format": "json", "$filter": f"Business_Accounting_NO eq {bn_format}"}
+            for bn_format in (business_no, business_no.lstrip('0'))]
+
+
+def _director_records(resp) -> List[Dict]:
+    if resp is None or resp.status_code != 200:
+        return []
+    payload = resp.json()
+    if not isinstance(payload, list):
+        return []
+    return [_director_record(row) for row in payload]
+
+
+def _store_directors(business_no: str, records: List[Dict]) -> None:
+    get_memory_cache().set("directors", business_no, records, ban=business_no)
+    if records:
+        # 查無資料可能是暫時性錯誤，只持久保存有內容的結果
+        _disk_cache_set("directors", business_no, records, ban=business_no)
+
+
+def _director_record(row: Dict) -> Dict:
+    """將 GCIS 董監事 API 的一列轉為內部結構"""
+    share_raw = str(row.get("Person_Shareholding", "")).strip()
+    invest_raw = str(row.get("Person_Investment_Amount", "")).strip()
+    return {
+        "職稱": str(row.get("Person_Position_Name", "")).strip(),
+        "姓名": str(row.get("Person_Name", "")).strip(),
+        "所代表法人": str(row.get("Juristic_Person_Name", "")).strip(),
+        "所持有股數": _to_float(share_raw),
+        "出資額": _to_float(invest_raw),
+        "統一編號": str(row.get("Business_Accounting_NO", "")).strip()
+    }
+
+
+@traced()
+def fetch_directors_by_business_nos(business_nos: List[str], refresh: bool = False) -> Dict[str, List[Dict]]:
+    """批次查詢多家公司的董監事資料
+
+    以 OData $filter 的 or 條件一次查多個統編（搭配 $select 與分頁），
+    結果拆回各統編寫入快取；批次請求失敗時退回逐筆查詢。
+    refresh=True 時略過快取直接向 GCIS 重查（增量重查用）。
+    """
+    results, pending = _split_cached_directors(business_nos, refresh)
+    for i in range(0, len(pending), GCIS_BATCH_SIZE):
+        chunk = pending[i:i + GCIS_BATCH_SIZE]
+        grouped = _fetch_directors_batch(chunk)
+        if grouped is None:
+            print(f"[WARNING] 董監事批次查詢失敗，改為逐筆查詢 {len(chunk)} 家")
+            for bn in chunk:
+                results[bn] = fetch_directors_by_business_no(bn, refresh=refresh)
+            continue
+        _store_director_batch(grouped, results)
+    return results
+
+
+def _split_cached_directors(business_nos: List[str], refresh: bool = False) -> Tuple[Dict[str, List[Dict]], List[str]]:
+    """回傳 (已在快取中的 統編 → 董監事列表, 需要向 GCIS 查詢的統編)"""
+    memory = get_memory_cache()
+    results: Dict[str, List[Dict]] = {}
+    pending: List[str] = []
+    for bn in dict.fromkeys(b for b in business_nos if b):
+        if refresh:
+            memory.pop("directors", bn)
+            pending.append(bn)
+            continue
+        cached = memory.get("directors", bn)
+        if cached is not MISSING:
+            results[bn] = cached
+            continue
+        cached = _disk_cache_get("directors", bn)
+        if cached is not MISSING:
+            memory.set("directors", bn, cached, ban=bn)
+            results[bn] = cached
+            continue
+        pending.append(bn)
+    note_cache(True, len(results))
+    note_cache(False, len(pending))
+    return results, pending
+
+
+def _store_director_batch(grouped: Dict[str, List[Dict]], results: Dict[str, List[Dict]]) -> None:
+    for bn, records in grouped.items():
+        _store_directors(bn, records)
+        results[bn] = records
+
+
+def _fetch_directors_batch(business_nos: List[str]) -> Optional[Dict[str, List[Dict]]]:
+    """送出一組合併的 GCIS 請求（含分頁），回傳 統編 → 董監事列表；失敗回傳 None"""
+    grouped: Dict[str, List[Dict]] = {bn: [] for bn in business_nos}
+    skip = 0
+    while True:
+        try:
+            payload = _director_batch_payload(
+                _http_get(GCIS_DIRECTOR_API, params=_director_batch_params(business_nos, skip))
+            )
+        except Exception:
+            return None
+        if payload is None:
+            return None
+        _group_director_rows(grouped, payload)
+        if len(payload) < GCIS_PAGE_SIZE:
+            return grouped
+        skip += len(payload)
+
+
+def _director_batch_params(business_nos: List[str], skip: int) -> Dict:
+    clauses = []
+    for bn in business_nos:
+        # 與單筆查詢相同，同時比對補零與去零兩種格式
+        for bn_format in dict.fromkeys([bn, bn.lstrip('0')]):
+            clauses.append(f"Business_Accounting_NO eq {bn_format}")
+    return {
+        "$format": "json",
+        "$filter": " or ".join(clauses),
+        "$select": ",".join(GCIS_DIRECTOR_FIELDS),
+        "$skip": skip,
+        "$top": GCIS_PAGE_SIZE,
+    }
+
+
+def _director_batch_payload(resp) -> Optional[List[Dict]]:
+    """合併查詢一頁的回應內容；失敗回傳 None"""
+    if resp.status_code != 200:
+        return None
+    payload = resp.json() if resp.text.strip() else []
+    return payload if isinstance(payload, list) else None
+
+
+def _group_director_rows(grouped: Dict[str, List[Dict]], payload: List[Dict]) -> None:
+    for row in payload:
+        raw_no = str(row.get("Business_Accounting_NO", "")).strip()
+        bn = raw_no.zfill(8) if raw_no.isdigit() else raw_no
+        if bn in grouped:
+            grouped[bn].append(_director_record(row))
+
+
+_listed_companies: Optional[ListedRegistry] = None
+_listed_companies_lock = threading.Lock()
+
+
+def get_listed_companies() -> ListedRegistry:
+    """取得上市櫃公司名單，第一次呼叫時才載入（CSV 未變動時直接讀二進位快取）"""
+    global _listed_companies
+    with _listed_companies_lock:
+        if _listed_companies is None:
+            try:
+                _listed_companies = get_listed_registry(LISTED_CSV_PATH)
+                print(f"[INFO] 已載入 {len(_listed_companies)} 家上市櫃公司資料")
+            except Exception as e:
+                print(f"[WARNING] 無法載入上市櫃公司名單: {e}")
+                _listed_companies = ListedRegistry({}, {})
+        return _listed_companies
+
+
 def is_listed_company(business_no: str, company_name: str) -> bool:
     """判斷是否為上市櫃公司"""
 
     
     #return result
-    return (business_no in LISTED_BAN_SET) or (company_name in LISTED_NAME_SET)
+    return get_listed_companies().is_listed(business_no, company_name)
 
 
 def find_chairman_or_representative(company_name: str) -> Optional[str]:
@@ -431,256 +1268,896 @@ def is_natural_person(name: str) -> bool:
     return not any(kw in name for kw in exclude_keywords)
 
 
+# ========== 預取 ==========
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """取得全域共用的預取執行緒池"""
+    global _prefetch_executor
+    with _prefetch_executor_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _prefetch_executor
+
+
+def _prefetch_juristic(company_name: str) -> None:
+    """預取單一法人：查統編，非上市櫃時再查 FindBiz 公司資料（結果寫入快取）"""
+    try:
+        business_no = get_business_no_by_name(company_name)
+        if business_no and not is_listed_company(business_no, company_name):
+            fetch_company_info_findbiz(business_no)
+    except Exception as e:
+        print(f"[WARNING] 預取失敗 ({company_name}): {e}")
+
+
+class _JuristicPrefetcher:
+    """單次爬蟲的預取排程
+
+    展開公司時一取得董監事名單，就把所代表法人排入預取執行緒池；
+    爬到該法人時資料已在快取中，與預取同時查詢時由 _single_flight 合併。
+    超過最大層級或會被門檻剪枝的分支不預取。
+    董監事資料不預取：深度優先模式由 _walk_depth_first 在每家公司展開後批次查其子法人，
+    逐層模式在展開前整層批次查詢；深度優先的 GCIS 請求數因此是「展開的母公司數」而非「層數」。
+    爬蟲結束時呼叫 close() 取消尚未開始的預取。
+    """
+
+    def __init__(
+        self,
+        max_depth: int,
+        pruner: Optional[_BranchPruner] = None,
+        accept: Optional[Callable[[str], bool]] = None
+    ):
+        self.max_depth = max_depth
+        self.pruner = pruner
+        self.accept = accept   # accept(法人名稱) 為 False 時不預取（增量重查略過未變動的公司）
+        self._lock = threading.Lock()
+        self._submitted = set()
+        self._futures = []
+
+    def submit(self, company_name: str, child_depth: int, ratios: Dict[str, Optional[float]]) -> None:
+        if child_depth > self.max_depth or not ratios:
+            return
+        product = self.pruner.reach.get(company_name, 1.0) if self.pruner is not None else 1.0
+        executor = get_prefetch_executor()
+        with self._lock:
+            for name, ratio in ratios.items():
+                if name in self._submitted or (self.accept is not None and not self.accept(name)):
+                    continue
+                if self.pruner is not None and ratio is not None \
+                        and not self.pruner.reaches(name, product * min(ratio, 1.0)):
+                    continue
+                self._submitted.add(name)
+                self._futures.append(executor.submit(bind_context(_prefetch_juristic), name))
+
+    def close(self) -> None:
+        with self._lock:
+            for future in self._futures:
+                future.cancel()
+            self._futures.clear()
+
+
+def _new_prefetcher(
+    max_depth: int,
+    pruner: Optional[_BranchPruner],
+    accept: Optional[Callable[[str], bool]] = None
+) -> Optional[_JuristicPrefetcher]:
+    if not PREFETCH_ENABLED or replay.active_recorder() is not None:
+        # 錄放時維持與爬蟲相同的請求順序
+        return None
+    return _JuristicPrefetcher(max_depth, pruner, accept)
+
+
 # ========== 遞迴查詢主函數 ==========
-def crawl_director_chain(seed_company_name: str, max_depth: int = 5) -> pd.DataFrame:
-    """遞迴查詢董監事鏈"""
+@traced()
+def crawl_director_chain(
+    seed_company_name: str,
+    max_depth: int = 5,
+    concurrency: int = 1,
+    collect: Optional[Dict[str, Dict]] = None,
+    prune_threshold: Optional[float] = None
+) -> pd.DataFrame:
+    """遞迴查詢董監事鏈
+
+    concurrency > 1 時改用逐層並行模式（見 _crawl_director_chain_levelwise），
+    輸出欄位與排序方式相同。
+    傳入 collect 時，會把每家公司的快照內容（見 _snapshot_entry）寫入其中。
+    傳入 prune_threshold 時啟用門檻剪枝（見 _BranchPruner）。
+    """
+    if concurrency > 1:
+        return _crawl_director_chain_levelwise(seed_company_name, max_depth, concurrency, collect, prune_threshold)
+    
+    def expand(company_name: str, depth: int, prefetcher: Optional[_JuristicPrefetcher] = None):
+        company_rows, children = _expand_company(company_name, depth, prefetcher)
+        if collect is not None:
+            collect[company_name] = _snapshot_entry(company_rows, children)
+        return company_rows, children
+    
+    return _crawl_depth_first(seed_company_name, max_depth, expand, prune_threshold)
+
+
+class _BranchPruner:
+    """門檻剪枝
+
+    累計種子公司經各條已走過的路徑對每家法人的持股（路徑上各層占比的乘積），
+    未達門檻的法人先延後；之後經其他路徑累計達到門檻時仍會展開。
+    已展開的公司再經其他路徑到達時，以 spread() 把新路徑的持股沿其子法人往下累計，
+    被延後的子孫因此達到門檻時一併展開。
+    查詢結束時仍未展開的分支，在其上層明細列的備註記錄累計持股與門檻，
+    並以 DataFrame.attrs["pruned"]（名稱 → 累計持股）提供給警示報告。
+    占比不明的分支視為 100%，不會被剪掉。
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.reach: Dict[str, float] = {}
+        self.deferred: Dict[str, float] = {}
+        self.ratios: Dict[str, List[Tuple[str, float]]] = {}   # 已展開公司 → [(子法人, 占比)]
+
+    def reaches(self, company_name: str, product: float) -> bool:
+        return self.reach.get(company_name, 0.0) + product >= self.threshold
+
+    def admit(self, company_name: str, product: float) -> bool:
+        """累計一條路徑；達門檻回傳 True（應展開），否則記為延後"""
+        total = self.reach.get(company_name, 0.0) + product
+        self.reach[company_name] = total
+        if total >= self.threshold:
+            self.deferred.pop(company_name, None)
+            return True
+        self.deferred[company_name] = total
+        return False
+
+    def expanded(self, company_name: str, rows: List[Dict],
+                 children: List[Tuple[str, int, str]]) -> List[Tuple[str, int, str, float]]:
+        """記下已展開公司的子法人占比，回傳子法人加上目前累計持股的路徑乘積"""
+        paths = self.child_paths(rows, children, 1.0)
+        self.ratios[company_name] = [(name, ratio) for name, _, _, ratio in paths]
+        reach = self.reach.get(company_name, 0.0)
+        return [(name, depth, business_no, reach * ratio) for name, depth, business_no, ratio in paths]
+
+    def spread(self, company_name: str, product: float, depth: int, max_depth: int) -> List[Tuple[str, int]]:
+        """已展開（或已排入本層）的公司又經一條新路徑到達：累計這條路徑並沿已展開的子法人往下傳
+
+        回傳因此達到門檻、尚未展開的法人 [(名稱, 層級)]；只沿不重複經過同一家公司的路徑累計。
+        """
+        self.reach[company_name] = self.reach.get(company_name, 0.0) + product
+        revived: List[Tuple[str, int]] = []
+        self._spread(company_name, product, depth, max_depth, {company_name}, revived)
+        return revived
+
+    def _spread(self, company_name: str, product: float, depth: int, max_depth: int,
+                on_path: set, revived: List[Tuple[str, int]]) -> None:
+        for child, ratio in self.ratios.get(company_name, ()):
+            child_product = product * ratio
+            if child in on_path or depth + 1 > max_depth or child_product <= 0:
+                continue
+            if child in self.ratios:
+                self.reach[child] = self.reach.get(child, 0.0) + child_product
+                self._spread(child, child_product, depth + 1, max_depth, on_path | {child}, revived)
+            else:
+                # 只重新排入先前被延後的法人；尚在待展開佇列中的法人出佇列時會一併計入這次累計
+                was_deferred = child in self.deferred
+                if self.admit(child, child_product) and was_deferred:
+                    revived.append((child, depth + 1))
+
+    @staticmethod
+    def child_paths(rows: List[Dict], children: List[Tuple[str, int, str]],
+                    product: float) -> List[Tuple[str, int, str, float]]:
+        """子法人加上路徑乘積；同一法人有多位代表人時只算一次"""
+        ratios = {row["所代表法人"]: row.get("占比") for row in rows if row.get("所代表法人")}
+        paths = []
+        seen = set()
+        for name, depth, business_no in children:
+            if name in seen:
+                continue
+            seen.add(name)
+            ratio = ratios.get(name)
+            ratio = 1.0 if ratio is None or ratio != ratio else min(float(ratio), 1.0)
+            paths.append((name, depth, business_no, product * ratio))
+        return paths
+
+    def annotate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """在被剪分支的上層明細列記錄原因（不改動快照中的明細列）"""
+        df.attrs["pruned"] = dict(self.deferred)
+        if not self.deferred or df.empty:
+            return df
+        mask = df["所代表法人"].isin(list(self.deferred)) & (df["備註"].fillna("") == "")
+        df.loc[mask, "備註"] = df.loc[mask, "所代表法人"].map(
+            lambda name: f"{PRUNE_REMARK}：累計持股 {self.deferred[name]:.2%} 未達 {self.threshold:.0%}，未展開"
+        )
+        return df
+
+
+def _crawl_depth_first(
+    seed_company_name: str,
+    max_depth: int,
+    expand,
+    prune_threshold: Optional[float] = None,
+    prefetch_accept: Optional[Callable[[str], bool]] = None
+) -> pd.DataFrame:
+    """深度優先走訪董監事鏈；expand(名稱, 層級, 預取排程) 回傳 (明細列, 子法人)
+
+    傳入 prefetch_accept 時只預取它回傳 True 的法人。
+    """
+    pruner = _BranchPruner(prune_threshold) if prune_threshold else None
+    prefetcher = _new_prefetcher(max_depth, pruner, prefetch_accept)
+    try:
+        df = _walk_depth_first(seed_company_name, max_depth, expand, pruner, prefetcher)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+    return pruner.annotate(df) if pruner is not None else df
+
+
+def _walk_depth_first(
+    seed_company_name: str,
+    max_depth: int,
+    expand,
+    pruner: Optional[_BranchPruner],
+    prefetcher: Optional[_JuristicPrefetcher]
+) -> pd.DataFrame:
     visited_names = set()
-    stack = [(seed_company_name.strip(), 0)]
+    stack = [(seed_company_name.strip(), 0, 1.0)]
     rows = []
     
     while stack:
-        company_name, depth = stack.pop()
+        company_name, depth, product = stack.pop()
         
         if depth > max_depth:
             continue
-        if not company_name or company_name in visited_names:
+        if not company_name:
             continue
-        
-        visited_names.add(company_name)
-        
-        business_no = get_business_no_by_name(company_name)
-        print(f"[Level {depth}] 查詢: {company_name} -> 統編: {business_no}")
-        
-        if not business_no:
-            rows.append({
-                "level": depth,
-                "from_company": company_name,
-                "from_business_no": None,
-                "職稱": "",
-                "姓名": "",
-                "所代表法人": "",
-                "to_business_no": None,
-                "所持有股數": None,
-                "出資額": None,
-                "是法人代表": False,
-                "占比": None,
-                "計算基準": None,
-                "備註": "非台灣公司或查無統編"
-            })
+        if company_name in visited_names:
+            if pruner is not None:
+                # 同一家公司的另一條路徑：累計持股並重新評估其下被延後的分支
+                stack.extend((name, child_depth, 0.0)
+                             for name, child_depth in pruner.spread(company_name, product, depth, max_depth))
             continue
-        
-        company_info = fetch_company_info_findbiz(business_no)
-        if not company_info:
-            rows.append({
-                "level": depth,
-                "from_company": company_name,
-                "from_business_no": business_no,
-                "職稱": "",
-                "姓名": "",
-                "所代表法人": "",
-                "to_business_no": None,
-                "所持有股數": None,
-                "出資額": None,
-                "是法人代表": False,
-                "占比": None,
-                "計算基準": None,
-                "備註": "查無公司資料"
-            })
+        if pruner is not None and not pruner.admit(company_name, product):
             continue
         
-        total_shares = company_info.get("已發行股數")
-        total_capital = company_info.get("資本總額")
-        par_value = company_info.get("每股金額", DEFAULT_STOCK_PAR_VALUE)
-        
-        # 決定計算模式
-        mode = None
-        denominator = None
-        if total_shares and total_shares > 0:
-            mode = "shares"
-            denominator = total_shares
-        elif total_capital and total_capital > 0:
-            mode = "capital"
-            denominator = total_capital
-        
-        directors = fetch_directors_by_business_no(business_no)
-        if not directors:
-            rows.append({
-                "level": depth,
-                "from_company": company_name,
-                "from_business_no": business_no,
-                "職稱": "",
-                "姓名": "",
-                "所代表法人": "",
-                "to_business_no": None,
-                "所持有股數": None,
-                "出資額": None,
-                "是法人代表": False,
-                "占比": None,
-                "計算基準": mode,
-                "備註": "查無董監事資料"
-            })
-            continue
+        visited_names.add(company_name)
         
-        # 整併法人持股（避免重複計算）
-        juristic_holdings_shares: Dict[str, float] = {}
-        juristic_holdings_amount: Dict[str, float] = {}
+        company_rows, children = expand(company_name, depth, prefetcher)
+        rows.extend(company_rows)
+        if pruner is not None:
+            paths = pruner.expanded(company_name, company_rows, children)
+        else:
+            paths = [(name, child_depth, bn, 1.0) for name, child_depth, bn in children]
+        stack.extend((name, child_depth, child_product) for name, child_depth, _, child_product in paths)
         
-        for d in directors:
-            repco = (d.get("所代表法人") or "").strip()
-            shares_num = d.get("所持有股數")
-            invest_num = d.get("出資額")
-            
-            if not repco:
-                continue
-            
-            if mode == "shares" and shares_num:
-                juristic_holdings_shares[repco] = max(juristic_holdings_shares.get(repco, 0.0), shares_num)
-            elif mode == "capital":
-                amt = invest_num if invest_num else (shares_num * par_value if shares_num and par_value else None)
-                if amt:
-                    juristic_holdings_amount[repco] = max(juristic_holdings_amount.get(repco, 0.0), amt)
+        # 下一層法人的董監事一次批次查好，之後出堆疊時直接命中快取（會被剪掉的分支不查）
+        child_business_nos = [
+            bn for name, child_depth, bn, child_product in paths
+            if child_depth <= max_depth and (pruner is None or pruner.reaches(name, child_product))
+        ]
+        if child_business_nos:
+            fetch_directors_by_business_nos(child_business_nos)
+    
+    return _crawl_rows_to_frame(rows)
+
+
+def _snapshot_entry(rows: List[Dict], children: List[Tuple[str, int, str]]) -> Dict:
+    """單一公司的快照內容：明細列、子法人與董監事資料指紋"""
+    business_no = rows[0].get("from_business_no") if rows else None
+    return {
+        "business_no": business_no,
+        "fingerprint": director_fingerprint(fetch_directors_by_business_no(business_no)) if business_no else None,
+        "rows": rows,
+        "children": [[name, bn] for name, _, bn in children],
+    }
+
+
+@traced()
+def refresh_director_chain(
+    seed_company_name: str,
+    previous: Dict[str, Dict],
+    max_depth: int = 5,
+    prune_threshold: Optional[float] = None
+) -> Tuple[pd.DataFrame, Dict[str, Dict], List[str]]:
+    """增量重查董監事鏈
+
+    先以批次 API 重抓快照中所有公司的董監事資料，指紋相同的公司直接沿用
+    上次的明細列與子法人，只有指紋不同或新出現的公司才重新查詢公司資料並展開。
+    回傳 (明細 DataFrame, 新快照內容, 重新展開的公司名稱)。
+    """
+    known_business_nos = [e["business_no"] for e in previous.values() if e.get("business_no")]
+    fresh = fetch_directors_by_business_nos(known_business_nos, refresh=True)
+    collect: Dict[str, Dict] = {}
+    changed: List[str] = []
+    
+    def unchanged(company_name: str) -> bool:
+        entry = previous.get(company_name)
+        business_no = entry.get("business_no") if entry else None
+        return bool(business_no) and entry.get("fingerprint") == director_fingerprint(fresh.get(business_no))
+    
+    def expand(company_name: str, depth: int, prefetcher: Optional[_JuristicPrefetcher] = None):
+        entry = previous.get(company_name)
+        business_no = entry.get("business_no") if entry else None
+        if unchanged(company_name):
+            rows = [dict(row, level=depth) for row in entry["rows"]]
+            children = [(name, depth + 1, bn) for name, bn in entry["children"]]
+            collect[company_name] = dict(entry, rows=rows)
+            return rows, children
         
-        # 處理每位董監事
-        for d in directors:
-            title = d.get("職稱", "")
-            person = d.get("姓名", "")
-            repco = (d.get("所代表法人") or "").strip()
-            shares_num = d.get("所持有股數")
-            invest_num = d.get("出資額")
-            is_juristic_rep = bool(repco)
-            
-            # 計算占比
-            ratio = None
-            if mode == "shares" and denominator:
-                numerator = juristic_holdings_shares.get(repco) if is_juristic_rep else shares_num
-                if numerator:
-                    ratio = numerator / denominator
-            elif mode == "capital" and denominator:
-                if is_juristic_rep:
-                    numerator = juristic_holdings_amount.get(repco)
-                else:
-                    numerator = invest_num if invest_num else (shares_num  if shares_num and par_value else None)
-                if numerator:
-                    ratio = numerator / denominator
-            
-            to_business_no = None
-            remark = ""
-            should_recurse = False
+        print(f"[INFO] 董監事資料有變動或為新公司，重新查詢: {company_name}")
+        changed.append(company_name)
+        if business_no:
+            # 董監事異動時股本也可能變動，公司資料一併重抓
+            info = fetch_company_info_findbiz(business_no, use_cache=False)
+            get_memory_cache().set("company_info", business_no, info, ban=business_no)
+            if info is not None:
+                _disk_cache_set("company_info", business_no, info, ban=business_no)
+        rows, children = _expand_company(company_name, depth, prefetcher)
+        collect[company_name] = _snapshot_entry(rows, children)
+        return rows, children
+    
+    # 未變動的公司沿用快照，不必預取其公司資料
+    df = _crawl_depth_first(seed_company_name, max_depth, expand, prune_threshold,
+                            prefetch_accept=lambda name: not unchanged(name))
+    return df, collect, changed
+
+
+def _crawl_director_chain_levelwise(
+    seed_company_name: str,
+    max_depth: int,
+    concurrency: int,
+    collect: Optional[Dict[str, Dict]] = None,
+    prune_threshold: Optional[float] = None
+) -> pd.DataFrame:
+    """逐層並行查詢董監事鏈
+
+    每一層的公司以執行緒池並行展開，展開前先批次查好整層的董監事資料，
+    結果依該層公司順序合併，因此輸出順序固定。
+    與深度優先模式不同之處：同一家公司出現在多個層級時，一律記在最淺的層級。
+    """
+    pruner = _BranchPruner(prune_threshold) if prune_threshold else None
+    prefetcher = _new_prefetcher(max_depth, pruner)
+    visited_names = set()
+    rows = []
+    frontier = [(seed_company_name.strip(), 1.0)]
+    depth = 0
+    
+    with contextlib.ExitStack() as cleanup, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if prefetcher is not None:
+            cleanup.callback(prefetcher.close)
+        while frontier and depth <= max_depth:
+            level_companies, revived = _admit_level(frontier, visited_names, pruner, depth, max_depth)
+            business_nos = list(executor.map(bind_context(get_business_no_by_name), level_companies))
+            fetch_directors_by_business_nos([bn for bn in business_nos if bn])
             
-            if repco:
-                to_business_no = get_business_no_by_name(repco)
-                
-                # 檢查是否為上市櫃公司且持股>50%
-                if to_business_no and is_listed_company(to_business_no, repco):
-                    if ratio and ratio > 0.5:
-                        remark = "上市櫃公司持股>50%，免辨識"
-                    else:
-                        remark = "上市櫃公司"
-                        should_recurse = False
+            current_depth = depth
+            expanded = list(executor.map(
+                bind_context(lambda name: _expand_company(name, current_depth, prefetcher)), level_companies
+            ))
+            frontier = revived + _merge_level(level_companies, expanded, rows, collect, pruner)
+            depth += 1
+    
+    df = _crawl_rows_to_frame(rows)
+    return pruner.annotate(df) if pruner is not None else df
+
+
+def _admit_level(
+    frontier: List[Tuple[str, float]],
+    visited_names: set,
+    pruner: Optional[_BranchPruner],
+    depth: int,
+    max_depth: int
+) -> Tuple[List[str], List[Tuple[str, float]]]:
+    """由上一層的 frontier 取出本層要展開的公司（略過已查過與被剪枝的）
+
+    剪枝時，已查過的公司經新路徑累計後可能讓其下被延後的分支達到門檻，
+    這些分支另外回傳，排入下一層的 frontier。
+    """
+    level_companies = []
+    revived: List[Tuple[str, float]] = []
+    for company_name, product in frontier:
+        if not company_name:
+            continue
+        if company_name in visited_names:
+            if pruner is not None:
+                revived.extend((name, 0.0) for name, _ in pruner.spread(company_name, product, depth, max_depth))
+            continue
+        if pruner is not None and not pruner.admit(company_name, product):
+            continue
+        visited_names.add(company_name)
+        level_companies.append(company_name)
+    return level_companies, revived
+
+
+def _merge_level(
+    level_companies: List[str],
+    expanded: List[Tuple[List[Dict], List[Tuple[str, int, str]]]],
+    rows: List[Dict],
+    collect: Optional[Dict[str, Dict]],
+    pruner: Optional[_BranchPruner]
+) -> List[Tuple[str, float]]:
+    """依本層公司順序合併展開結果，回傳下一層的 frontier [(名稱, 路徑占比乘積), ...]"""
+    frontier = []
+    for company_name, (company_rows, children) in zip(level_companies, expanded):
+        if collect is not None:
+            collect[company_name] = _snapshot_entry(company_rows, children)
+        rows.extend(company_rows)
+        if pruner is not None:
+            paths = pruner.expanded(company_name, company_rows, children)
+            frontier.extend((name, child_product) for name, _, _, child_product in paths)
+        else:
+            frontier.extend((name, 1.0) for name, _, _ in children)
+    return frontier
+
+
+def _expand_company(
+    company_name: str,
+    depth: int,
+    prefetcher: Optional[_JuristicPrefetcher] = None
+) -> Tuple[List[Dict], List[Tuple[str, int, str]]]:
+    """查詢單一公司並展開其董監事
+
+    回傳 (該公司的明細列, 需往下遞迴的法人 [(名稱, 層級, 統編), ...])
+    傳入 prefetcher 時，取得董監事名單後立即在背景預取各所代表法人。
+    """
+    rows = []
+    children: List[Tuple[str, int, str]] = []
+    
+    business_no = get_business_no_by_name(company_name)
+    print(f"[Level {depth}] 查詢: {company_name} -> 統編: {business_no}")
+
+    if not business_no:
+        rows.append({
+            "level": depth,
+            "from_company": company_name,
+            "from_business_no": None,
+            "職稱": "",
+            "姓名": "",
+            "所代表法人": "",
+            "to_business_no": None,
+            "所持有股數": None,
+            "出資額": None,
+            "是法人代表": False,
+            "占比": None,
+            "計算基準": None,
+            "備註": "非台灣公司或查無統編"
+        })
+        return rows, children
+
+    company_info = fetch_company_info_findbiz(business_no)
+    if not company_info:
+        rows.append({
+            "level": depth,
+            "from_company": company_name,
+            "from_business_no": business_no,
+            "職稱": "",
+            "姓名": "",
+            "所代表法人": "",
+            "to_business_no": None,
+            "所持有股數": None,
+            "出資額": None,
+            "是法人代表": False,
+            "占比": None,
+            "計算基準": None,
+            "備註": "查無公司資料"
+        })
+        return rows, children
+
+    total_shares = company_info.get("已發行股數")
+    total_capital = company_info.get("資本總額")
+    par_value = company_info.get("每股金額", DEFAULT_STOCK_PAR_VALUE)
+
+    # 決定計算模式
+    mode = None
+    denominator = None
+    if total_shares and total_shares > 0:
+        mode = "shares"
+        denominator = total_shares
+    elif total_capital and total_capital > 0:
+        mode = "capital"
+        denominator = total_capital
+
+    directors = fetch_directors_by_business_no(business_no)
+    if not directors:
+        rows.append({
+            "level": depth,
+            "from_company": company_name,
+            "from_business_no": business_no,
+            "職稱": "",
+            "姓名": "",
+            "所代表法人": "",
+            "to_business_no": None,
+            "所持有股數": None,
+            "出資額": None,
+            "是法人代表": False,
+            "占比": None,
+            "計算基準": mode,
+            "備註": "查無董監事資料"
+        })
+        return rows, children
+
+    # 整併法人持股（避免重複計算）
+    juristic_holdings_shares: Dict[str, float] = {}
+    juristic_holdings_amount: Dict[str, float] = {}
+
+    for d in directors:
+        repco = (d.get("所代表法人") or "").strip()
+        shares_num = d.get("所持有股數")
+        invest_num = d.get("出資額")
+
+        if not repco:
+            continue
+
+        if mode == "shares" and shares_num:
+            juristic_holdings_shares[repco] = max(juristic_holdings_shares.get(repco, 0.0), shares_num)
+        elif mode == "capital":
+            amt = invest_num if invest_num else (shares_num * par_value if shares_num and par_value else None)
+            if amt:
+                juristic_holdings_amount[repco] = max(juristic_holdings_amount.get(repco, 0.0), amt)
+
+    if prefetcher is not None:
+        holdings = juristic_holdings_shares if mode == "shares" else juristic_holdings_amount
+        repcos = dict.fromkeys((d.get("所代表法人") or "").strip() for d in directors)
+        repcos.pop("", None)
+        prefetcher.submit(company_name, depth + 1, {
+            repco: holdings[repco] / denominator if denominator and repco in holdings else None
+            for repco in repcos
+        })
+
+    # 處理每位董監事
+    for d in directors:
+        title = d.get("職稱", "")
+        person = d.get("姓名", "")
+        repco = (d.get("所代表法人") or "").strip()
+        shares_num = d.get("所持有股數")
+        invest_num = d.get("出資額")
+        is_juristic_rep = bool(repco)
+
+        # 計算占比
+        ratio = None
+        if mode == "shares" and denominator:
+            numerator = juristic_holdings_shares.get(repco) if is_juristic_rep else shares_num
+            if numerator:
+                ratio = numerator / denominator
+        elif mode == "capital" and denominator:
+            if is_juristic_rep:
+                numerator = juristic_holdings_amount.get(repco)
+            else:
+                numerator = invest_num if invest_num else (shares_num  if shares_num and par_value else None)
+            if numerator:
+                ratio = numerator / denominator
+
+        to_business_no = None
+        remark = ""
+        should_recurse = False
+
+        if repco:
+            to_business_no = get_business_no_by_name(repco)
+
+            # 檢查是否為上市櫃公司且持股>50%
+            if to_business_no and is_listed_company(to_business_no, repco):
+                if ratio and ratio > 0.5:
+                    remark = "上市櫃公司持股>50%，免辨識"
                 else:
-                    should_recurse = True
-            
-            rows.append({
-                "level": depth,
-                "from_company": company_name,
-                "from_business_no": business_no,
-                "職稱": title,
-                "姓名": person,
-                "所代表法人": repco,
-                "to_business_no": to_business_no,
-                "所持有股數": shares_num,
-                "出資額": invest_num,
-                "是法人代表": is_juristic_rep,
-                "占比": ratio,
-                "計算基準": mode,
-                "備註": remark
-            })
-            
-            # 決定是否遞迴
-            if should_recurse and repco and to_business_no:
-                stack.append((repco, depth + 1))
-        
-        time.sleep(SLEEP_BETWEEN_CALLS)
+                    remark = "上市櫃公司"
+                    should_recurse = False
+            else:
+                should_recurse = True
+
+        rows.append({
+            "level": depth,
+            "from_company": company_name,
+            "from_business_no": business_no,
+            "職稱": title,
+            "姓名": person,
+            "所代表法人": repco,
+            "to_business_no": to_business_no,
+            "所持有股數": shares_num,
+            "出資額": invest_num,
+            "是法人代表": is_juristic_rep,
+            "占比": ratio,
+            "計算基準": mode,
+            "備註": remark
+        })
+
+        # 決定是否遞迴
+        if should_recurse and repco and to_business_no:
+            children.append((repco, depth + 1, to_business_no))
     
+    return rows, children
+
+
+def _crawl_rows_to_frame(rows: List[Dict]) -> pd.DataFrame:
     df = pd.DataFrame(rows)
     df = df.sort_values(by=["level", "from_company", "職稱", "姓名"], kind="stable").reset_index(drop=True)
     return df
 
 
-# ========== 持股分析函數 ==========
-def build_ownership_paths(df: pd.DataFrame) -> List[Dict]:
-    """建立完整持股路徑"""
-    paths = []
-    df_sorted = df.sort_values(by=["level", "from_company"]).reset_index(drop=True)
+# ========== 非同步查詢 ==========
+_findbiz_executor: Optional[ThreadPoolExecutor] = None
+_findbiz_executor_lock = threading.Lock()
+
+
+def get_findbiz_executor() -> ThreadPoolExecutor:
+    """取得非同步查詢共用、執行 FindBiz 同步路徑的執行緒池"""
+    global _findbiz_executor
+    with _findbiz_executor_lock:
+        if _findbiz_executor is None:
+            _findbiz_executor = ThreadPoolExecutor(max_workers=ASYNC_FINDBIZ_WORKERS, thread_name_prefix="findbiz")
+        return _findbiz_executor
+
+
+async def fetch_company_info_findbiz_async(business_no: str) -> Optional[Dict]:
+    """以同步的 fetch_company_info_findbiz 在 FindBiz 執行緒池中查詢，不阻塞事件迴圈"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_findbiz_executor(), bind_context(fetch_company_info_findbiz), business_no)
+
+
+@traced()
+async def get_business_no_by_name_async(
+    company_name_or_no: str,
+    http: AsyncHttpSession,
+    strict: bool = False
+) -> Optional[str]:
+    """非同步版 get_business_no_by_name；同一個 http 上相同名稱的查詢只送一次"""
+    input_key = company_name_or_no.strip()
+    if not input_key:
+        return None
+    try:
+        return await http.inflight.do(("company_no", input_key), _get_business_no_by_name_async, input_key, http)
+    except LookupFailed as e:
+        if strict:
+            raise
+        print(f"[WARNING] 查詢失敗: {e}")
+        return None
+
+
+async def _get_business_no_by_name_async(input_key: str, http: AsyncHttpSession) -> Optional[str]:
+    # 名稱索引、持久快取（SQLite）與 pandas 解析都是同步工作，在執行緒中執行，不阻塞事件迴圈
+    cached = await asyncio.to_thread(_lookup_business_no, input_key)
+    if cached is not MISSING:
+        return cached
+    try:
+        resp = await _http_get_async(http, _company_search_url(input_key))
+        return await asyncio.to_thread(_business_no_from_search, input_key, resp)
+    except LookupFailed:
+        raise
+    except Exception as e:
+        raise LookupFailed(f"{input_key}: {e}") from e
+
+
+@traced()
+async def fetch_directors_by_business_no_async(business_no: str, http: AsyncHttpSession) -> List[Dict]:
+    """非同步版 fetch_directors_by_business_no；同一個 http 上相同統編的查詢只送一次"""
+    return await http.inflight.do(("directors", business_no), _fetch_directors_async, business_no, http)
+
+
+async def _fetch_directors_async(business_no: str, http: AsyncHttpSession) -> List[Dict]:
+    cached = await asyncio.to_thread(_lookup_directors, business_no)
+    if cached is not MISSING:
+        return cached
     
-    for idx, row in df_sorted.iterrows():
-        name = row["姓名"]
-        ratio = row["占比"]
-        current_level = row["level"]
-        repco = row["所代表法人"]
-        
-        # 只處理自然人葉節點
-        if not is_natural_person(name):
-            continue
-        if pd.isna(ratio):
-            continue
-        if repco:  # 有代表法人表示不是葉節點
+    records: List[Dict] = []
+    for params in _director_queries(business_no):
+        try:
+            records = _director_records(await _http_get_async(http, GCIS_DIRECTOR_API, params=params))
+            if records:
+                break
+        except Exception:
+            pass
+    
+    await asyncio.to_thread(_store_directors, business_no, records)
+    return records
+
+
+@traced()
+async def fetch_directors_by_business_nos_async(business_nos: List[str], http: AsyncHttpSession) -> Dict[str, List[Dict]]:
+    """非同步版 fetch_directors_by_business_nos：各批次同時送出，失敗的批次退回逐筆查詢"""
+    results, pending = await asyncio.to_thread(_split_cached_directors, business_nos)
+    chunks = [pending[i:i + GCIS_BATCH_SIZE] for i in range(0, len(pending), GCIS_BATCH_SIZE)]
+    batches = await asyncio.gather(*(_fetch_directors_batch_async(chunk, http) for chunk in chunks))
+    for chunk, grouped in zip(chunks, batches):
+        if grouped is None:
+            print(f"[WARNING] 董監事批次查詢失敗，改為逐筆查詢 {len(chunk)} 家")
+            records = await asyncio.gather(*(fetch_directors_by_business_no_async(bn, http) for bn in chunk))
+            results.update(zip(chunk, records))
             continue
-        
-        # 往上回溯
-        path_ratios = [ratio]
-        path_companies = [row["from_company"]]
-        current_company = row["from_company"]
-        
-        for level in range(current_level - 1, -1, -1):
-            prev_rows = df_sorted[
-                (df_sorted["level"] == level) &
-                (df_sorted["所代表法人"].str.strip() == current_company)
-            ]
-            if not prev_rows.empty:
-                prev_row = prev_rows.iloc[0]
-                prev_ratio = prev_row["占比"]
-                if not pd.isna(prev_ratio):
-                    path_ratios.append(prev_ratio)
-                    path_companies.append(prev_row["from_company"])
-                    current_company = prev_row["from_company"]
+        await asyncio.to_thread(_store_director_batch, grouped, results)
+    return results
+
+
+async def _fetch_directors_batch_async(business_nos: List[str], http: AsyncHttpSession) -> Optional[Dict[str, List[Dict]]]:
+    grouped: Dict[str, List[Dict]] = {bn: [] for bn in business_nos}
+    skip = 0
+    while True:
+        try:
+            payload = _director_batch_payload(await _http_get_async(
+                http, GCIS_DIRECTOR_API, params=_director_batch_params(business_nos, skip)
+            ))
+        except Exception:
+            return None
+        if payload is None:
+            return None
+        _group_director_rows(grouped, payload)
+        if len(payload) < GCIS_PAGE_SIZE:
+            return grouped
+        skip += len(payload)
+
+
+async def _warm_level_async(level_companies: List[str], http: AsyncHttpSession) -> None:
+    """把 _expand_company 展開整層需要的統編、公司資料、董監事與所代表法人統編先查進快取
+
+    預熱失敗不中斷查詢：例外在這裡收下，_expand_company 會再查一次並照同步路徑處理錯誤。
+    """
+    business_nos = await asyncio.gather(
+        *(get_business_no_by_name_async(name, http) for name in level_companies), return_exceptions=True
+    )
+    business_nos = [bn for bn in business_nos if isinstance(bn, str) and bn]
+    results = await asyncio.gather(
+        fetch_directors_by_business_nos_async(business_nos, http),
+        *(fetch_company_info_findbiz_async(bn) for bn in business_nos),
+        return_exceptions=True
+    )
+    directors = results[0] if isinstance(results[0], dict) else {}
+    repcos = dict.fromkeys((d.get("所代表法人") or "").strip() for records in directors.values() for d in records)
+    repcos.pop("", None)
+    await asyncio.gather(*(get_business_no_by_name_async(repco, http) for repco in repcos), return_exceptions=True)
+
+
+def _expand_level(level_companies: List[str], depth: int) -> List[Tuple[List[Dict], List[Tuple[str, int, str]]]]:
+    """依序展開同一層的公司（非同步爬取在執行緒中呼叫，輸出順序與同步路徑相同）"""
+    return [_expand_company(name, depth) for name in level_companies]
+
+
+@traced()
+async def crawl_director_chain_async(
+    seed_company_name: str,
+    http: AsyncHttpSession,
+    max_depth: int = 5,
+    collect: Optional[Dict[str, Dict]] = None,
+    prune_threshold: Optional[float] = None
+) -> pd.DataFrame:
+    """非同步逐層查詢董監事鏈，輸出與 _crawl_director_chain_levelwise 相同
+
+    每一層先在事件迴圈中同時把整層公司需要的資料查進快取（見 _warm_level_async），
+    再於執行緒中依序以 _expand_company 展開；預熱沒查到的資料（例如失敗後的重試）
+    由同步路徑補查，不會阻塞事件迴圈。
+    """
+    pruner = _BranchPruner(prune_threshold) if prune_threshold else None
+    visited_names = set()
+    rows = []
+    frontier = [(seed_company_name.strip(), 1.0)]
+    depth = 0
+    
+    while frontier and depth <= max_depth:
+        level_companies, revived = _admit_level(frontier, visited_names, pruner, depth, max_depth)
+        await _warm_level_async(level_companies, http)
+        expanded = await asyncio.to_thread(_expand_level, level_companies, depth)
+        frontier = revived + _merge_level(level_companies, expanded, rows, collect, pruner)
+        depth += 1
+    
+    df = _crawl_rows_to_frame(rows)
+    return pruner.annotate(df) if pruner is not None else df
+
+
+# ========== 持股分析函數 ==========
+class OwnershipGraph:
+    """由 crawl_director_chain 明細列建立的持股圖
+
+    - roots：查詢起點（level 0 的公司），路徑一律在此結束
+    - holders_of[公司]：該公司持有哪些上層公司的股份 [(上層公司, 占比), ...]
+    - person_leaves：自然人直接持股 [(姓名, 公司, 占比), ...]，順序與舊版逐列處理相同
+    以公司名稱為鍵（與「所代表法人」欄位一致），同一 (上層公司, 法人) 只記一次，
+    避免同一法人指派多位代表人時重複計算。
+    """
+
+    def __init__(self):
+        self.roots: set = set()
+        self.holders_of: Dict[str, List[Tuple[str, float]]] = {}
+        self.unknown_ratio: set = set()  # 有持股關係但占比不明的公司
+        self.person_leaves: List[Tuple[str, str, float]] = []
+        self._memo: Dict[str, List[Tuple[List[str], List[float]]]] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "OwnershipGraph":
+        graph = cls()
+        if df.empty:
+            return graph
+        df_sorted = df.sort_values(by=["level", "from_company"]).reset_index(drop=True)
+        graph.roots = set(df_sorted.loc[df_sorted["level"] == df_sorted["level"].min(), "from_company"])
+        seen_edges = set()
+        for company, name, repco, ratio in zip(
+            df_sorted["from_company"], df_sorted["姓名"], df_sorted["所代表法人"], df_sorted["占比"]
+        ):
+            repco = str(repco).strip() if isinstance(repco, str) else ""
+            if repco:
+                if (company, repco) in seen_edges:
+                    continue
+                seen_edges.add((company, repco))
+                if pd.isna(ratio):
+                    graph.unknown_ratio.add(repco)
                 else:
-                    break
-            else:
-                break
+                    graph.holders_of.setdefault(repco, []).append((company, ratio))
+            elif is_natural_person(name) and not pd.isna(ratio):
+                graph.person_leaves.append((name, company, ratio))
+        return graph
+
+    def upward_paths(self, company: str) -> List[Tuple[List[str], List[float]]]:
+        """列出從 company 往上到最上層公司的所有路徑 [(公司鏈, 各段占比), ...]
+
+        公司鏈由上而下排列（最後一個是 company）。循環持股的路徑只走到回到已經過的公司為止，
+        若因此到不了最上層則捨棄該路徑。
+        """
+        paths, _ = self._paths_up(company, set())
+        return paths
+
+    def _paths_up(self, company: str, on_path: set) -> Tuple[List[Tuple[List[str], List[float]]], bool]:
+        if company in self._memo:
+            return self._memo[company], False
+        if company in self.roots:
+            return [([company], [])], False
+        on_path.add(company)
+        holders = self.holders_of.get(company, [])
+        followable = [(parent, ratio) for parent, ratio in holders if parent not in on_path]
+        cut = len(followable) < len(holders)
         
-        path_ratios.reverse()
-        path_companies.reverse()
-        paths.append({
-            "name": name,
-            "ratios": path_ratios,
-            "path": path_companies
-        })
-    
-    return paths
+        paths: List[Tuple[List[str], List[float]]] = []
+        if not holders:
+            # 沒有上層（或上層占比不明），與舊版相同：路徑停在這裡
+            paths.append(([company], []))
+        for parent, ratio in followable:
+            sub_paths, sub_cut = self._paths_up(parent, on_path)
+            cut = cut or sub_cut
+            for companies, ratios in sub_paths:
+                paths.append((companies + [company], ratios + [ratio]))
+        on_path.discard(company)
+        
+        # 探索途中被循環截斷的結果與走法有關，不能快取
+        if not cut:
+            self._memo[company] = paths
+        return paths, cut
+
+    def natural_person_paths(self) -> List[Dict]:
+        """每個自然人持股的每條往上路徑"""
+        paths = []
+        for name, company, ratio in self.person_leaves:
+            for companies, ratios in self.upward_paths(company):
+                paths.append({
+                    "name": name,
+                    "ratios": ratios + [ratio],
+                    "path": companies
+                })
+        return paths
+
 
+def build_ownership_paths(df: pd.DataFrame) -> List[Dict]:
+    """建立完整持股路徑
+
+    以 OwnershipGraph 一次建立索引後列舉所有往上路徑；
+    一家公司被多個上層公司持有時，每條路徑都會列出。
+    """
+    return OwnershipGraph.from_frame(df).natural_person_paths()
 
-def calc_final_natural_person_shares(df: pd.DataFrame, threshold: float = 0.25) -> Dict[str, float]:
-    """計算最終自然人持股占比"""
+
+@traced("ownership")
+def calc_final_natural_person_shares(
+    df: pd.DataFrame,
+    threshold: float = 0.25,
+    method: str = "paths"
+) -> Dict[str, float]:
+    """計算最終自然人持股占比
+
+    method="paths" 逐條路徑相乘加總；method="matrix" 以 solve_ownership_matrix 一次求解，
+    可計入被循環截斷的交叉持股。兩者都回傳 (超過門檻的 {姓名: 占比}, 計算過程紀錄)。
+    """
+    if method == "matrix":
+        return _calc_shares_by_matrix(df, threshold)
+    
     paths = build_ownership_paths(df)
     person_shares: Dict[str, float] = {}
     holding_process_log = []  # 新增紀錄清單
     print("\n=== 持股計算過程 ===")
     for path_info in paths:
         name = path_info["name"]
-        ratios = path_info["ratios"]
-        companies = path_info["path"]
-        
-        final_ratio = 1.0
-        for ratio in ratios:
-            final_ratio *= ratio
-        
+        final_ratio, log_text = _explain_path(path_info)
         person_shares[name] = person_shares.get(name, 0) + final_ratio
-        
-        path_str = " → ".join(companies)
-        calc_str = " × ".join([f"{r:.2%}" for r in ratios])
-        
-        log_text = f"{name}: {path_str}\n  計算: {calc_str} = {final_ratio:.2%}"
         print(log_text)
       
         holding_process_log.append(log_text)  # 加入紀錄
@@ -688,6 +2165,132 @@ def calc_final_natural_person_shares(df: pd.DataFrame, threshold: float = 0.25)
     return result, holding_process_log 
 
 
+def _explain_path(path_info: Dict) -> Tuple[float, str]:
+    """計算單一路徑的持股乘積並產生說明文字"""
+    name = path_info["name"]
+    ratios = path_info["ratios"]
+    companies = path_info["path"]
+    
+    final_ratio = 1.0
+    for ratio in ratios:
+        final_ratio *= ratio
+    
+    path_str = " → ".join(companies)
+    calc_str = " × ".join([f"{r:.2%}" for r in ratios])
+    return final_ratio, f"{name}: {path_str}\n  計算: {calc_str} = {final_ratio:.2%}"
+
+
+def solve_ownership_matrix(
+    graph: OwnershipGraph,
+    tol: float = 1e-12,
+    max_iter: int = 1000
+) -> Tuple[Dict[str, float], Dict]:
+    """以矩陣一次計算所有自然人對最上層公司的實質持股（含交叉持股）
+
+    H[i, j] 為公司 i 持有公司 j 的比例、P[p, j] 為自然人 p 直接持有公司 j 的比例，
+    對最上層公司 r 的持股為 P · (I - H)^-1 · e_r。以 Neumann 級數 y = e_r + H·y 迭代求解，
+    未收斂時改用直接解線性方程組。回傳 ({姓名: 占比}, 求解資訊)；
+    求解資訊中的 stakes 為各公司對 r 的實質持股 y（說明紀錄用）。
+    只支援單一查詢起點，graph.roots 有多家公司時丟出 ValueError。
+    """
+    info = {"converged": True, "iterations": 0, "residual": 0.0, "solver": "none", "companies": 0,
+            "root": None, "stakes": {}}
+    if len(graph.roots) > 1:
+        raise ValueError(f"矩陣法只支援單一查詢起點，目前有 {len(graph.roots)} 家：{'、'.join(sorted(graph.roots))}")
+    if not graph.roots or not graph.person_leaves:
+        return {}, info
+    
+    companies = set(graph.roots) | set(graph.holders_of)
+    for targets in graph.holders_of.values():
+        companies.update(target for target, _ in targets)
+    companies.update(company for _, company, _ in graph.person_leaves)
+    index = {company: i for i, company in enumerate(sorted(companies))}
+    n = len(index)
+    
+    holding = np.zeros((n, n))
+    for holder, targets in graph.holders_of.items():
+        for target, ratio in targets:
+            holding[index[holder], index[target]] += ratio
+    
+    names = list(dict.fromkeys(name for name, _, _ in graph.person_leaves))
+    name_index = {name: i for i, name in enumerate(names)}
+    direct = np.zeros((len(names), n))
+    for name, company, ratio in graph.person_leaves:
+        direct[name_index[name], index[company]] += ratio
+    
+    root = next(iter(graph.roots))
+    e_root = np.zeros(n)
+    e_root[index[root]] = 1.0
+    
+    y = e_root.copy()
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        y_next = e_root + holding @ y
+        delta = np.max(np.abs(y_next - y))
+        y = y_next
+        if delta < tol:
+            converged = True
+            break
+    solver = "neumann"
+    if not converged:
+        try:
+            y = np.linalg.solve(np.eye(n) - holding, e_root)
+            solver = "direct"
+        except np.linalg.LinAlgError:
+            solver = "neumann (未收斂)"
+    residual = float(np.max(np.abs((np.eye(n) - holding) @ y - e_root)))
+    
+    shares = direct @ y
+    info.update({
+        "converged": bool(converged or residual < 1e-9),
+        "iterations": iterations,
+        "residual": residual,
+        "solver": solver,
+        "companies": n,
+        "root": root,
+        "stakes": {company: float(y[i]) for company, i in index.items()},
+    })
+    return {name: float(shares[i]) for name, i in name_index.items()}, info
+
+
+def _calc_shares_by_matrix(df: pd.DataFrame, threshold: float) -> Tuple[Dict[str, float], List[str]]:
+    """矩陣法計算自然人持股
+
+    說明紀錄由求解結果產生，不列舉路徑：每筆自然人直接持股一列（直接持股 × 該公司對
+    最上層公司的實質持股），持有多家公司的自然人另列合計，因此紀錄長度與明細列數成正比。
+    """
+    graph = OwnershipGraph.from_frame(df)
+    person_shares, info = solve_ownership_matrix(graph)
+    stakes = info["stakes"]
+    
+    holding_process_log = []
+    leaf_counts: Dict[str, int] = {}
+    print("\n=== 持股計算過程 ===")
+    for name, company, ratio in graph.person_leaves:
+        stake = stakes.get(company, 0.0)
+        leaf_counts[name] = leaf_counts.get(name, 0) + 1
+        log_text = (f"{name}: 直接持有 {company} {ratio:.2%}\n"
+                    f"  計算: {ratio:.2%} × {company} 對 {info['root']} 的實質持股 {stake:.2%} = {ratio * stake:.2%}")
+        print(log_text)
+        holding_process_log.append(log_text)
+    
+    for name, total in person_shares.items():
+        if leaf_counts.get(name, 0) > 1:
+            log_text = f"{name}: 合計 {total:.2%}"
+            print(log_text)
+            holding_process_log.append(log_text)
+    
+    status = "已收斂" if info["converged"] else "未收斂，結果僅供參考"
+    log_text = (f"矩陣求解{status}：{info['companies']} 家公司，{info['solver']}，"
+                f"迭代 {info['iterations']} 次，殘差 {info['residual']:.1e}")
+    print(log_text)
+    holding_process_log.append(log_text)
+    
+    result = {k: v for k, v in person_shares.items() if v > threshold}
+    return result, holding_process_log
+
+
 def find_senior_management(df: pd.DataFrame) -> List[Dict]:
     """找出高階管理人"""
     senior_titles = ["董事長", "總經理", "監察人"]
@@ -951,16 +2554,112 @@ def check_total_ratio(df):
 #     main()
 # =============================================================================
 
-def run_query(tax_id: str):
+def run_query(tax_id: str, refresh: bool = False):
     """
     根據統編查詢實質受益人，回傳結構化資料給 Streamlit
+
+    refresh=True 時若有上次的查詢快照，只重查董監事資料有變動的公司，
+    並在結果中附上與上次的差異（"diff"）。
+    結果 dict 另附本次查詢各階段的耗時彙總（"timing"）。
+    """
+    with metrics.query_trace() as trace:
+        with metrics.span("run_query"):
+            result = _run_query(tax_id, refresh)
+    return _attach_timing(trace, result)
+
+
+async def run_query_async(tax_id: str, refresh: bool = False, http: Optional[AsyncHttpSession] = None):
+    """
+    非同步版 run_query，回傳結構相同
+
+    GCIS 董監事與 opendata.vip 統編查詢在事件迴圈中並行送出（見 crawl_director_chain_async）；
+    多筆查詢傳入同一個 http 時，共用各主機的並行上限與請求合併。
+    refresh=True（增量重查）沿用同步流程，在執行緒中執行。
     """
+    if refresh:
+        return await asyncio.to_thread(run_query, tax_id, refresh)
+    if http is None:
+        async with new_async_http() as own_http:
+            return await run_query_async(tax_id, http=own_http)
+    with metrics.query_trace() as trace:
+        with metrics.span("run_query"):
+            result = await _run_query_async(tax_id, http)
+    return _attach_timing(trace, result)
+
+
+def _attach_timing(trace: metrics.QueryTrace, result):
+    """把本次查詢的耗時彙總附在結果中，並寫出指標檔"""
+    timing = trace.summary()
+    print(f"[INFO] 查詢耗時 {trace.elapsed:.2f} 秒；"
+          + "、".join(f"{row['階段']} {row['總耗時(秒)']:.2f}s×{row['次數']}" for row in timing[:5]))
+    if isinstance(result, dict):
+        result["timing"] = pd.DataFrame(timing)
+    if METRICS_TEXTFILE_PATH:
+        try:
+            metrics.REGISTRY.write_prometheus(METRICS_TEXTFILE_PATH)
+        except OSError as e:
+            print(f"[WARNING] 無法寫出指標檔: {e}")
+    return result
+
+
+def _run_query(tax_id: str, refresh: bool):
+    """run_query 的查詢流程本體"""
+    _print_query_banner(tax_id)
+
+    # Step 1: 查詢公司基本資料
+    company_info = fetch_company_info_findbiz(tax_id)
+    early_result = _screen_company(tax_id, company_info)
+    if early_result is not None:
+        return early_result
+    company_name = company_info.get("公司名稱", "")
+
+    # Step 3: 遞迴查詢董監事
+    store = get_snapshot_store()
+    previous = store.get(tax_id.strip()) if (refresh and store is not None) else None
+    crawl_graph: Dict[str, Dict] = {}
+    changed_companies: List[str] = []
+    if previous:
+        result_df, crawl_graph, changed_companies = refresh_director_chain(
+            company_name, previous["companies"], max_depth=5, prune_threshold=CRAWL_PRUNE_THRESHOLD
+        )
+        print(f"[INFO] 增量重查：{len(crawl_graph)} 家公司中重新展開 {len(changed_companies)} 家")
+    else:
+        if refresh:
+            print("[INFO] 查無上次的查詢快照，改為完整查詢")
+        result_df = crawl_director_chain(
+            company_name, max_depth=5, concurrency=CRAWL_CONCURRENCY, collect=crawl_graph,
+            prune_threshold=CRAWL_PRUNE_THRESHOLD
+        )
+    return _finish_query(tax_id, company_info, result_df, crawl_graph, store, previous, changed_companies)
+
+
+async def _run_query_async(tax_id: str, http: AsyncHttpSession):
+    """run_query_async 的查詢流程本體（步驟與 _run_query 相同）"""
+    _print_query_banner(tax_id)
+
+    # Step 1: 查詢公司基本資料
+    company_info = await fetch_company_info_findbiz_async(tax_id)
+    early_result = _screen_company(tax_id, company_info)
+    if early_result is not None:
+        return early_result
+    company_name = company_info.get("公司名稱", "")
+
+    # Step 3: 遞迴查詢董監事
+    crawl_graph: Dict[str, Dict] = {}
+    result_df = await crawl_director_chain_async(
+        company_name, http, max_depth=5, collect=crawl_graph, prune_threshold=CRAWL_PRUNE_THRESHOLD
+    )
+    return _finish_query(tax_id, company_info, result_df, crawl_graph, get_snapshot_store())
+
+
+def _print_query_banner(tax_id: str) -> None:
     print("="*60)
     print(f"開始查詢統編：{tax_id}")
     print("="*60)
 
-    # Step 1: 查詢公司基本資料
-    company_info = fetch_company_info_findbiz(tax_id)
+
+def _screen_company(tax_id: str, company_info: Optional[Dict]):
+    """Step 1-2：檢查公司資料、登記現況與上市櫃；需要提早結束時回傳結果，否則回傳 None"""
     if not company_info:
         print("❌ 查無公司基本資料")
         return []
@@ -1012,15 +2711,30 @@ def run_query(tax_id: str):
             "holding_process": pd.DataFrame({'持股計算過程': []}),
             "warnings": warnings_df
         }
+    return None
 
-    # Step 3: 遞迴查詢董監事
-    result_df = crawl_director_chain(company_name, max_depth=5)
+
+def _finish_query(
+    tax_id: str,
+    company_info: Dict,
+    result_df: pd.DataFrame,
+    crawl_graph: Dict[str, Dict],
+    store: Optional[CrawlSnapshotStore],
+    previous: Optional[Dict] = None,
+    changed_companies: Optional[List[str]] = None
+):
+    """Step 4-6：計算自然人持股、整理結果並保存快照（同步與非同步查詢共用）"""
+    company_name = company_info.get("公司名稱", "")
+    snapshot_key = tax_id.strip()
+    changed_companies = changed_companies or []
     if result_df.empty:
         print("❌ 無法取得董監事資料")
         return [{"統編": tax_id, "公司名稱": company_name, "狀態": "查無董監事"}]
 
     # Step 4: 計算自然人持股
-    final_shares, holding_process_log = calc_final_natural_person_shares(result_df, threshold=0.25)
+    final_shares, holding_process_log = calc_final_natural_person_shares(
+        result_df, threshold=0.25, method=OWNERSHIP_METHOD
+    )
 
     # Step 5: 整理結果
     output = []
@@ -1045,24 +2759,229 @@ def run_query(tax_id: str):
     if ratio_warning:
         warnings.append(ratio_warning)
         warnings.append("持股揭露比例不足，請與客戶徵提對應的文件")
+    pruned = result_df.attrs.get("pruned") or {}
+    if pruned:
+        warnings.append(
+            f"{PRUNE_REMARK}：{len(pruned)} 個法人分支累計持股未達 {CRAWL_PRUNE_THRESHOLD:.0%} 未展開"
+            f"（合計 {sum(pruned.values()):.2%}），經由這些分支的間接持股未計入"
+        )
     warnings_df = pd.DataFrame({'警示': warnings}) if warnings else pd.DataFrame()
+    
+    # Step 6: 保存快照，增量重查時附上與上次的差異
+    diff_df = None
+    if previous:
+        diff_rows = [{"類型": "董監事變動", "名稱": name, "原值": "", "新值": ""}
+                     for name in changed_companies if name in previous["companies"]]
+        diff_rows += [{"類型": "新增公司", "名稱": name, "原值": "", "新值": ""}
+                      for name in crawl_graph if name not in previous["companies"]]
+        diff_rows += [{"類型": "移除公司", "名稱": name, "原值": "", "新值": ""}
+                      for name in previous["companies"] if name not in crawl_graph]
+        diff_rows += diff_beneficial_owners(previous.get("final_shares", {}), final_shares)
+        diff_df = pd.DataFrame(diff_rows, columns=["類型", "名稱", "原值", "新值"])
+    if store is not None:
+        try:
+            store.put(snapshot_key, {
+                "company_name": company_name,
+                "companies": crawl_graph,
+                "final_shares": final_shares,
+            })
+        except Exception as e:
+            print(f"[WARNING] 無法保存查詢快照: {e}")
+    
     print("查詢完成")
-    return {
+    result = {
         "full_result": result_df,
         "beneficial_owners": beneficial_owners,
         "company_info": company_info_df,
         "holding_process": holding_process_df,
         "warnings": warnings_df
     }
+    if diff_df is not None:
+        result["diff"] = diff_df
+    return result
+
+
+
+
+def read_batch_input(path: str, column: Optional[str] = None) -> List[str]:
+    """讀取批次輸入檔（CSV / Excel / 純文字），回傳去重後的統編或公司名稱清單"""
+    lower = path.lower()
+    if lower.endswith((".csv", ".xlsx", ".xls")):
+        if lower.endswith(".csv"):
+            df = pd.read_csv(path, dtype=str, encoding="utf-8-sig")
+        else:
+            df = pd.read_excel(path, dtype=str)
+        if df.empty:
+            return []
+        col = column or ("統編" if "統編" in df.columns else df.columns[0])
+        values = df[col].dropna().astype(str).tolist()
+    else:
+        with open(path, encoding="utf-8-sig") as f:
+            values = f.read().splitlines()
+    keys = [v.strip() for v in values if v and v.strip()]
+    return list(dict.fromkeys(keys))
+
+
+def _run_batch_item(key: str, journal: BatchJournal, refresh: bool = False) -> str:
+    """查詢一筆並寫入日誌，回傳狀態"""
+    try:
+        business_no = get_business_no_by_name(key, strict=True)
+        if not business_no:
+            journal.append(key, "not_found", business_no=None)
+            return "not_found"
+        return _journal_result(key, business_no, run_query(business_no, refresh=refresh), journal)
+    except Exception as e:
+        print(f"[ERROR] 批次查詢失敗 ({key}): {e}")
+        journal.append(key, "error", error=str(e))
+        return "error"
+
+
+def _journal_result(key: str, business_no: str, result, journal: BatchJournal) -> str:
+    """寫入一筆查詢結果；查無公司資料或董監事可能是暫時性錯誤，記為 error 讓續跑時重試"""
+    if not isinstance(result, dict):
+        reason = result[0].get("狀態", "查無結果") if result else "查無公司基本資料"
+        print(f"[ERROR] 批次查詢失敗 ({key}): {reason}")
+        journal.append(key, "error", business_no=business_no, error=reason)
+        return "error"
+    journal.append(key, "done", business_no=business_no, result=result)
+    return "done"
+
+
+async def _run_batch_item_async(
+    key: str,
+    journal: BatchJournal,
+    http: AsyncHttpSession,
+    limit: asyncio.Semaphore,
+    refresh: bool = False
+) -> str:
+    """非同步版 _run_batch_item；limit 限制同時進行中的查詢數"""
+    async with limit:
+        try:
+            business_no = await get_business_no_by_name_async(key, http, strict=True)
+            if not business_no:
+                journal.append(key, "not_found", business_no=None)
+                return "not_found"
+            return _journal_result(key, business_no, await run_query_async(business_no, refresh=refresh, http=http),
+                                   journal)
+        except Exception as e:
+            print(f"[ERROR] 批次查詢失敗 ({key}): {e}")
+            journal.append(key, "error", error=str(e))
+            return "error"
+
+
+async def _run_batch_async(pending: List[str], journal: BatchJournal, workers: int, refresh: bool) -> Dict[str, int]:
+    """在單一事件迴圈中同時進行最多 workers 筆查詢，共用同一個非同步用戶端"""
+    counts = {"done": 0, "not_found": 0, "error": 0}
+    limit = asyncio.Semaphore(max(1, workers))
+    async with new_async_http() as http:
+        tasks = [_run_batch_item_async(key, journal, http, limit, refresh) for key in pending]
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            counts[await task] += 1
+            print(f"[INFO] 進度 {done}/{len(pending)}")
+    return counts
+
+
+def run_batch(
+    input_path: str,
+    journal_path: Optional[str] = None,
+    workers: int = BATCH_WORKERS,
+    column: Optional[str] = None,
+    refresh: bool = False,
+    use_async: bool = False
+) -> Dict[str, int]:
+    """批次查詢；已寫入日誌的項目會跳過，可中斷後續跑
+
+    use_async=True 時改在單一事件迴圈中以 run_query_async 查詢，workers 為同時進行中的查詢數。
+    """
+    journal_path = journal_path or f"{os.path.splitext(input_path)[0]}.journal.jsonl"
+    keys = read_batch_input(input_path, column)
+    
+    with BatchJournal(journal_path) as journal:
+        finished = journal.finished_keys()
+        pending = [k for k in keys if k not in finished]
+        print(f"[INFO] 共 {len(keys)} 筆，已完成 {len(keys) - len(pending)} 筆，本次查詢 {len(pending)} 筆")
+        print(f"[INFO] 檢查點日誌: {journal_path}")
+        
+        if use_async:
+            counts = asyncio.run(_run_batch_async(pending, journal, workers, refresh))
+        else:
+            counts = {"done": 0, "not_found": 0, "error": 0}
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                futures = [executor.submit(bind_context(_run_batch_item), key, journal, refresh) for key in pending]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    counts[future.result()] += 1
+                    print(f"[INFO] 進度 {done}/{len(pending)}")
+    
+    print(f"✓ 批次完成：成功 {counts['done']}、查無統編 {counts['not_found']}、失敗 {counts['error']}")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    global CRAWL_PRUNE_THRESHOLD
+    parser = argparse.ArgumentParser(description="商工登記實質受益人查詢")
+    parser.add_argument("input", nargs="?",
+                        help="批次輸入檔（CSV / Excel / 每行一筆的文字檔，內容為統編或公司名稱）；省略時互動輸入單筆")
+    parser.add_argument("--journal", help="檢查點日誌路徑（預設為 <輸入檔名>.journal.jsonl）")
+    parser.add_argument("--workers", type=int,
+                        help=f"同時查詢的公司數（預設 {BATCH_WORKERS}，--async 時 {ASYNC_BATCH_CONCURRENCY}）")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="在單一事件迴圈中非同步查詢 GCIS 與 opendata.vip（需安裝 httpx）")
+    parser.add_argument("--column", help="CSV / Excel 中統編或公司名稱所在欄位（預設「統編」或第一欄）")
+    parser.add_argument("--refresh", action="store_true",
+                        help="增量重查：只重新展開董監事資料有變動的公司，並列出與上次結果的差異")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--record", metavar="PATH", help="錄製本次所有外部回應至 PATH（JSON）")
+    mode_group.add_argument("--replay", metavar="PATH", help="由 PATH 回放外部回應，不連網路也不啟動瀏覽器")
+    parser.add_argument("--metrics-port", type=int,
+                        help="在此埠開啟 Prometheus 指標端點（http://127.0.0.1:<port>/metrics）")
+    parser.add_argument("--prune-threshold", type=float, default=CRAWL_PRUNE_THRESHOLD,
+                        help="門檻剪枝：累計持股低於此值（例如 0.25）的法人分支不展開")
+    parser.add_argument("--listed", nargs="+", metavar="KEY",
+                        help="只判斷統編或公司名稱是否為上市櫃公司，不查詢董監事")
+    args = parser.parse_args(argv)
+    
+    CRAWL_PRUNE_THRESHOLD = args.prune_threshold
+    
+    if args.listed:
+        check_listed(args.listed)
+        return
+    
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+        print(f"[INFO] 指標端點: http://127.0.0.1:{args.metrics_port}/metrics")
+    
+    if args.record or args.replay:
+        mode = "record" if args.record else "replay"
+        with external_responses(mode, args.record or args.replay):
+            _run_cli(args)
+    else:
+        _run_cli(args)
 
 
+def check_listed(keys: List[str]) -> None:
+    """CLI：逐筆列出是否為上市櫃公司"""
+    registry = get_listed_companies()
+    for key in keys:
+        name = registry.name_of(key) or (key if registry.ban_of(key) is not None else None)
+        print(f"{key}: {'上市櫃（' + name + '）' if name else '非上市櫃'}")
 
 
-def main():
+def _run_cli(args: argparse.Namespace) -> None:
+    if args.input:
+        workers = args.workers or (ASYNC_BATCH_CONCURRENCY if args.use_async else BATCH_WORKERS)
+        run_batch(args.input, journal_path=args.journal, workers=workers, column=args.column,
+                  refresh=args.refresh, use_async=args.use_async)
+        return
+    
     # CLI 測試用
     seed = input("請輸入公司名稱或統編：").strip()
     if seed:
-        run_query(seed)
+        if args.use_async:
+            result = asyncio.run(run_query_async(seed, refresh=args.refresh))
+        else:
+            result = run_query(seed, refresh=args.refresh)
+        if isinstance(result, dict) and "diff" in result:
+            print(result["diff"].to_string(index=False) if not result["diff"].empty else "與上次查詢結果相同")
     else:
         print("輸入不可為空")
 
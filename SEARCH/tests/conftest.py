@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+測試共用設定
+
+後端與基準測試工具都放在 scripts/ 與 benchmarks/ 下，直接加入 sys.path；
+需要外部來源的測試使用 fake_sites.py 的本機假伺服器，不連到真正的政府網站。
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(ROOT_DIR, "scripts"), os.path.join(ROOT_DIR, "benchmarks")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+
+@pytest.fixture(scope="session")
+def backend():
+    from run_benchmark import load_backend
+    return load_backend()
+
+
+@pytest.fixture(scope="session")
+def fake_sites(backend):
+    """指向假伺服器的後端；各測試以 sites.world 換成自己的合成資料"""
+    from fake_sites import FakeSites
+    from run_benchmark import point_backend_at
+    from synthetic_graph import generate_world
+
+    with FakeSites(generate_world(1, 1)) as sites:
+        point_backend_at(backend, sites, (1e6, 1000))
+        yield sites
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Streamlit 介面：批次查詢在自己的執行緒池執行，進行中時單筆查詢的執行緒池仍有空閒"""
+
+import io
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_final.py")
+BACKEND_MODULE = "商工登記實質受益人查詢"
+BATCH_IDS = ["90000001", "90000002", "90000003", "90000004", "90000005", "90000006"]
+SINGLE_ID = "90000009"
+
+
+class _Upload(io.BytesIO):
+    name = "ids.csv"
+
+
+class _Cache:
+    def stats(self):
+        return {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def clear(self):
+        pass
+
+
+def _fake_backend(release: threading.Event, started: list):
+    """批次中的統編在 release 之前一直查詢中；單筆查詢立即完成"""
+    def run_query(tax_id, refresh=False):
+        started.append((tax_id, threading.current_thread().name))
+        print(f"查詢 {tax_id}")
+        if tax_id in BATCH_IDS:
+            release.wait(30)
+        return [{"狀態": "測試", "公司名稱": f"測試公司{tax_id}"}]
+
+    return types.SimpleNamespace(run_query=run_query, get_memory_cache=_Cache)
+
+
+def test_single_query_runs_while_batch_is_busy(monkeypatch):
+    import concurrent.futures
+    import streamlit as st
+
+    executors = {}
+
+    class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *args, thread_name_prefix="", **kwargs):
+            super().__init__(*args, thread_name_prefix=thread_name_prefix, **kwargs)
+            executors[thread_name_prefix] = self
+
+    release = threading.Event()
+    started = []
+    monkeypatch.setitem(sys.modules, BACKEND_MODULE, _fake_backend(release, started))
+    monkeypatch.setattr(concurrent.futures, "ThreadPoolExecutor", RecordingExecutor)
+    data = ("統編\n" + "\n".join(BATCH_IDS) + "\n").encode("utf-8-sig")
+    monkeypatch.setattr(st, "file_uploader", lambda *args, **kwargs: _Upload(data))
+    st.cache_resource.clear()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    app.text_input[0].input(SINGLE_ID)
+    next(b for b in app.button if b.label == "開始查詢").click().run()
+    assert [s.value for s in app.success if "查詢完成" in s.value]
+    started.clear()
+
+    app.sidebar.radio[0].set_value("批次查詢").run()
+    next(b for b in app.button if b.label == "開始批次查詢").click()
+    # 批次頁面會持續 rerun 輪詢直到完成，放在另一個執行緒跑
+    batch_thread = threading.Thread(target=app.run)
+    batch_thread.start()
+    try:
+        deadline = time.monotonic() + 20
+        while "batch" not in executors or len(started) < executors["batch"]._max_workers:
+            assert time.monotonic() < deadline, "批次沒有開始"
+            time.sleep(0.05)
+        # 批次把自己的執行緒占滿時，單筆查詢的執行緒池仍有空閒，也沒有多送進池中
+        time.sleep(0.2)
+        assert len(started) == executors["batch"]._max_workers
+        single = executors["query"].submit(threading.current_thread)
+        assert single.result(timeout=5).name.startswith("query")
+    finally:
+        release.set()
+        batch_thread.join(60)
+
+    assert all(name.startswith("batch") for _, name in started)
+    assert sorted(tax_id for tax_id, _ in started) == BATCH_IDS
+    summary = app.session_state["batch_summary"]
+    assert list(summary["狀態"]) == ["測試"] * len(BATCH_IDS)
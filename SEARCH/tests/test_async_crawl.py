@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""非同步爬取：展開與快取 / 名稱索引查詢不可在事件迴圈中執行，預熱失敗時結果須與同步路徑相同"""
+
+import asyncio
+import contextlib
+import io
+import threading
+
+from synthetic_graph import generate_world
+
+
+def _crawl_async(backend, seed: str):
+    backend.clear_memory_caches()
+
+    async def run():
+        async with backend.new_async_http() as http:
+            return await backend.crawl_director_chain_async(seed, http)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(run())
+
+
+def _crawl_sync(backend, seed: str):
+    backend.clear_memory_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.crawl_director_chain(seed, concurrency=4)
+
+
+def test_expand_runs_off_the_event_loop(backend, fake_sites, monkeypatch):
+    fake_sites.world = generate_world(2, 2, seed=1)
+    expand = backend._expand_company
+    threads = set()
+
+    def recording_expand(*args, **kwargs):
+        threads.add(threading.current_thread())
+        return expand(*args, **kwargs)
+
+    monkeypatch.setattr(backend, "_expand_company", recording_expand)
+    df = _crawl_async(backend, fake_sites.world.root.名稱)
+    assert not df.empty
+    assert threads and threading.main_thread() not in threads
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def test_cache_and_index_lookups_run_off_the_event_loop(backend, fake_sites, monkeypatch):
+    fake_sites.world = generate_world(2, 2, seed=1)
+    blocking = []
+
+    for name in ("_name_index_lookup", "_disk_cache_get", "_disk_cache_set", "_business_no_from_search"):
+        def recording(*args, _name=name, _fn=getattr(backend, name), **kwargs):
+            if _on_event_loop():
+                blocking.append(_name)
+            return _fn(*args, **kwargs)
+
+        monkeypatch.setattr(backend, name, recording)
+
+    df = _crawl_async(backend, fake_sites.world.root.名稱)
+    assert not df.empty
+    assert blocking == []
+
+
+def test_failed_warm_up_falls_back_to_sync_lookups(backend, fake_sites, monkeypatch):
+    fake_sites.world = generate_world(2, 2, seed=1)
+    seed = fake_sites.world.root.名稱
+    expected = _crawl_sync(backend, seed)
+
+    async def failing_directors(*args, **kwargs):
+        raise RuntimeError("GCIS 暫時無法連線")
+
+    async def failing_company_info(*args, **kwargs):
+        raise RuntimeError("FindBiz 暫時無法連線")
+
+    monkeypatch.setattr(backend, "fetch_directors_by_business_nos_async", failing_directors)
+    monkeypatch.setattr(backend, "fetch_company_info_findbiz_async", failing_company_info)
+    assert _crawl_async(backend, seed).equals(expected)
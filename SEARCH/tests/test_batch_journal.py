@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""批次日誌：查詢失敗須記為 error 讓續跑時重試，只有確定查無此公司才記為 not_found"""
+
+import contextlib
+import io
+
+import pytest
+
+from batch_journal import BatchJournal
+from synthetic_graph import generate_world
+
+UNREACHABLE_URL = "http://127.0.0.1:9/data/company?keyword={keyword}"
+
+
+def _run_batch(backend, tmp_path, keys, use_async):
+    input_path = tmp_path / "input.txt"
+    input_path.write_text("\n".join(keys), encoding="utf-8")
+    journal_path = tmp_path / "input.journal.jsonl"
+    backend.clear_memory_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        counts = backend.run_batch(str(input_path), journal_path=str(journal_path), workers=2, use_async=use_async)
+    with BatchJournal(str(journal_path)) as journal:
+        return counts, journal.load()
+
+
+@pytest.fixture
+def offline_search(backend, fake_sites, monkeypatch):
+    """opendata.vip 連不上；限速器與連線層換成新的，不影響其他測試"""
+    monkeypatch.setattr(backend, "COMPANY_SEARCH_URL", UNREACHABLE_URL)
+    monkeypatch.setattr(backend, "HTTP_RETRIES", 0)
+    monkeypatch.setattr(backend, "_http", None)
+    monkeypatch.setattr(backend, "_rate_limiter", None)
+
+
+@pytest.mark.parametrize("use_async", (False, True))
+def test_unknown_name_is_not_found(backend, fake_sites, tmp_path, use_async):
+    fake_sites.world = generate_world(1, 1)
+    counts, entries = _run_batch(backend, tmp_path, [fake_sites.world.root.名稱, "不存在的公司"], use_async)
+    assert counts == {"done": 1, "not_found": 1, "error": 0}
+    assert entries["不存在的公司"]["status"] == "not_found"
+
+
+@pytest.mark.parametrize("use_async", (False, True))
+def test_failed_lookup_is_retried_on_resume(backend, fake_sites, tmp_path, offline_search, monkeypatch, use_async):
+    fake_sites.world = generate_world(1, 1)
+    name = fake_sites.world.root.名稱
+    counts, entries = _run_batch(backend, tmp_path, [name], use_async)
+    assert counts == {"done": 0, "not_found": 0, "error": 1}
+    assert entries[name]["status"] == "error"
+
+    monkeypatch.undo()
+    counts, entries = _run_batch(backend, tmp_path, [name], use_async)
+    assert counts == {"done": 1, "not_found": 0, "error": 0}
+    assert entries[name]["status"] == "done"
+
+
+@pytest.mark.parametrize("use_async", (False, True))
+def test_missing_company_info_is_error(backend, fake_sites, tmp_path, monkeypatch, use_async):
+    fake_sites.world = generate_world(1, 1)
+    monkeypatch.setattr(backend, "fetch_company_info_findbiz", lambda *args, **kwargs: None)
+    counts, entries = _run_batch(backend, tmp_path, ["99999998"], use_async)
+    assert counts == {"done": 0, "not_found": 0, "error": 1}
+    assert entries["99999998"]["error"] == "查無公司基本資料"
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""FindBiz 純 HTTP 查詢：表單與詳細頁流程，查無此公司不改用瀏覽器，只有 HTTP 查詢失敗才改用"""
+
+import contextlib
+import io
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from bs4 import BeautifulSoup
+
+from synthetic_graph import generate_world
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "findbiz_http")
+
+
+class _RecordingPool:
+    """代替瀏覽器連線池，記錄借用的統編"""
+
+    def __init__(self):
+        self.calls = []
+
+    @contextlib.contextmanager
+    def scraper(self):
+        pool = self
+
+        class _Scraper:
+            def get_company_data(self, ban_no, company_name=None):
+                pool.calls.append(ban_no)
+                return None
+
+        yield _Scraper()
+
+
+@pytest.fixture
+def pool(backend, monkeypatch):
+    pool = _RecordingPool()
+    monkeypatch.setattr(backend, "get_scraper_pool", lambda: pool)
+    backend.clear_memory_caches()
+    return pool
+
+
+def _company_info(backend, business_no):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.fetch_company_info_findbiz(business_no)
+
+
+def test_found_company_uses_http_only(backend, fake_sites, pool):
+    fake_sites.world = generate_world(1, 1)
+    info = _company_info(backend, fake_sites.world.root.統編)
+    assert info["公司名稱"] == fake_sites.world.root.名稱
+    assert pool.calls == []
+
+
+def test_unknown_company_does_not_launch_browser(backend, fake_sites, pool):
+    fake_sites.world = generate_world(1, 1)
+    assert _company_info(backend, "99999999") is None
+    assert pool.calls == []
+
+
+def test_http_failure_falls_back_to_browser(backend, fake_sites, pool, monkeypatch):
+    fake_sites.world = generate_world(1, 1)
+    monkeypatch.setattr(backend, "FINDBIZ_QUERY_INIT_URL", "http://127.0.0.1:9/queryInit.do")
+    monkeypatch.setattr(backend, "HTTP_RETRIES", 0)
+    monkeypatch.setattr(backend._findbiz_http_local, "client", None, raising=False)
+    _company_info(backend, fake_sites.world.root.統編)
+    assert pool.calls == [fake_sites.world.root.統編]
+
+
+def test_link_without_object_id_is_an_error(backend):
+    link = BeautifulSoup('<a class="hover" href="#" onclick="openDetail()">公司</a>', "html.parser").a
+    with pytest.raises(ValueError):
+        backend.FindbizHttpClient._detail_url(link, "12345678", "http://example.test/list")
+
+
+class _Response:
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def recorded_site(backend, monkeypatch):
+    """以錄製的查詢頁、結果頁與詳細頁回應 FindbizHttpClient 的請求，記錄送出的請求"""
+    pages = {}
+    for name in ("query_init", "query_list", "query_detail"):
+        with open(os.path.join(FIXTURE_DIR, f"{name}.html"), encoding="utf-8") as f:
+            pages[name] = f.read()
+    requests_sent = []
+
+    def throttled(send, url, *args, **kwargs):
+        requests_sent.append((send.__name__, url, kwargs.get("data")))
+        path = urlparse(url).path
+        if url == backend.FINDBIZ_QUERY_INIT_URL:
+            return _Response(url, pages["query_init"])
+        if path.endswith("queryList.do"):
+            return _Response(url, pages["query_list"])
+        return _Response(url, pages["query_detail"])
+
+    monkeypatch.setattr(backend, "_throttled", throttled)
+    monkeypatch.setattr(backend, "FINDBIZ_QUERY_INIT_URL", "https://findbiz.test/fts/query/QueryBar/queryInit.do")
+    monkeypatch.setattr(backend, "FINDBIZ_DETAIL_URL", "https://findbiz.test/fts/query/QueryCmpyDetail/queryCmpyDetail.do")
+    return requests_sent
+
+
+def test_form_posts_hidden_fields_and_checked_inputs(backend, recorded_site):
+    client = backend.FindbizHttpClient()
+    data = client.get_company_data("12345678", "測試股份有限公司")
+    assert data["公司名稱"]
+
+    (_, init_url, _), (method, action, form), (_, detail_url, _) = recorded_site
+    assert init_url == backend.FINDBIZ_QUERY_INIT_URL
+    assert (method, action) == ("post", "https://findbiz.test/fts/query/QueryList/queryList.do")
+    assert form == {"validatorOpen": "N", "token": "fixture-token", "qryCond": "12345678",
+                    "infoType": "D", "qryType": "cmpyType"}
+    # 名稱完全相符的連結優先，objectId 取自 onclick
+    query = parse_qs(urlparse(detail_url).query)
+    assert query == {"objectId": ["T2JqZWN0SWQxMjM="], "banNo": ["12345678"]}
+
+
+def test_form_is_loaded_once_per_client(backend, recorded_site):
+    client = backend.FindbizHttpClient()
+    client.get_company_data("12345678")
+    client.get_company_data("12345678")
+    assert [url for _, url, _ in recorded_site].count(backend.FINDBIZ_QUERY_INIT_URL) == 1
+
+
+def test_first_link_used_without_exact_name(backend, recorded_site):
+    backend.FindbizHttpClient().get_company_data("12345678", "不相符的名稱")
+    detail_url = recorded_site[-1][1]
+    assert parse_qs(urlparse(detail_url).query)["objectId"] == ["SEhDMTIzNDU2Nzg="]
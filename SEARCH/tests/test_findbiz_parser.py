@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""FindBiz 詳細頁解析：lxml 版與 BeautifulSoup 版對錄製的頁面須輸出相同的 dict"""
+
+import glob
+import os
+
+import pytest
+
+from bench_findbiz_parser import load_pages
+from findbiz_parser import LXML_AVAILABLE, parse_findbiz_page, parse_with_bs4, parse_with_lxml
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "findbiz")
+# .html 為單一頁面，.json 為 replay.py 錄製的 cassette（取出其中的詳細頁）
+PAGES = load_pages(sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")) + glob.glob(os.path.join(FIXTURE_DIR, "*.json"))))
+
+
+@pytest.mark.skipif(not LXML_AVAILABLE, reason="未安裝 lxml")
+@pytest.mark.parametrize("name, html", PAGES, ids=[name for name, _ in PAGES])
+def test_lxml_matches_bs4(name, html):
+    assert parse_with_lxml(html, "12345678") == parse_with_bs4(html, "12345678")
+
+
+def test_fixtures_cover_real_pages():
+    parsed = {name: parse_findbiz_page(html, "12345678") for name, html in PAGES}
+    assert parsed["fake_detail.html"]["公司名稱"]
+    assert len(parsed["synthetic_large.html"]["所營事業資料"]) == 400
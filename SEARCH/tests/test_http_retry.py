@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""HTTP 重試：每次重試都要重新經過限速器，限速器也要看到每次失敗"""
+
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+from rate_limit import HostRateLimiter
+
+
+class _RecordingLimiter(HostRateLimiter):
+    """記錄每次取得許可與回報的限速器（不冷卻，測試不必等待）"""
+
+    def __init__(self):
+        super().__init__({}, default=(1e6, 1000), base_penalty=0.0)
+        self.reserved = 0
+        self.reported = []
+
+    def reserve(self, host):
+        self.reserved += 1
+        return super().reserve(host)
+
+    def report(self, host, status_code=None, elapsed=None, error=False, retry_after=None):
+        self.reported.append("error" if error else status_code)
+        super().report(host, status_code, elapsed, error, retry_after)
+
+
+@pytest.fixture
+def flaky_server():
+    """前兩次回 503、之後回 200 的本機伺服器"""
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            status = 503 if len(hits) <= 2 else 200
+            body = b"ok"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d/" % server.server_address[1], hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def limiter(backend, monkeypatch):
+    limiter = _RecordingLimiter()
+    monkeypatch.setattr(backend, "_rate_limiter", limiter)
+    monkeypatch.setattr(backend, "HTTP_RETRIES", 3)
+    monkeypatch.setattr(backend, "HTTP_BACKOFF_FACTOR", 0.0)
+    monkeypatch.setattr(backend, "HTTP_BACKOFF_JITTER", 0.0)
+    return limiter
+
+
+def test_sync_retries_take_a_token_per_attempt(backend, flaky_server, limiter):
+    url, hits = flaky_server
+    resp = backend._http_get(url)
+    assert resp.status_code == 200
+    assert len(hits) == 3
+    assert limiter.reserved == 3
+    assert limiter.reported == [503, 503, 200]
+
+
+def test_sync_retries_give_up_with_last_response(backend, flaky_server, limiter, monkeypatch):
+    monkeypatch.setattr(backend, "HTTP_RETRIES", 1)
+    url, hits = flaky_server
+    resp = backend._http_get(url)
+    assert resp.status_code == 503
+    assert limiter.reserved == 2
+    assert limiter.reported == [503, 503]
+
+
+def test_async_retries_take_a_token_per_attempt(backend, flaky_server, limiter):
+    pytest.importorskip("httpx")
+    url, hits = flaky_server
+
+    async def fetch():
+        async with backend.new_async_http() as http:
+            return await backend._http_get_async(http, url)
+
+    resp = asyncio.run(fetch())
+    assert resp.status_code == 200
+    assert len(hits) == 3
+    assert limiter.reserved == 3
+    assert limiter.reported == [503, 503, 200]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""匯入時間預算：後端與報表模組 import 時不載入較慢的套件，且在預算時間內完成"""
+
+from check_import_time import BACKEND_MODULE, REPORT_MODULE, measure_cli, measure_import
+
+IMPORT_BUDGET = 0.3   # 秒，與 check_import_time.py 的預設相同
+CLI_BUDGET = 0.8
+
+
+def test_backend_import_defers_heavy_modules():
+    result = measure_import(3)
+    assert result["loaded"] == []
+    assert result["elapsed"] < IMPORT_BUDGET, f"import {BACKEND_MODULE} 花了 {result['elapsed'] * 1000:.1f} ms"
+
+
+def test_report_writer_import_defers_pandas():
+    assert measure_import(3, REPORT_MODULE)["loaded"] == []
+
+
+def test_listed_cli_within_budget():
+    assert measure_cli(["--listed", "00000000"], 3) < CLI_BUDGET
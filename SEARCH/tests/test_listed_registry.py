@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""上市櫃名單：二進位檔只在 CSV 變動時重建，查表結果正規化"""
+
+import os
+
+import pytest
+
+import listed_registry
+from listed_registry import SIDECAR_SUFFIX, get_listed_registry, load_listed_registry
+
+CSV_ROWS = "統編,公司名稱\n1234567.0,臺灣測試股份有限公司\n87654321,乙公司\n"
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "concat_all.csv"
+    path.write_text(CSV_ROWS, encoding="utf-8-sig")
+    return str(path)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    original = listed_registry._build_from_csv
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(listed_registry, "_build_from_csv", counting)
+    return calls
+
+
+def _touch_later(path: str) -> None:
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_lookups_are_normalized(csv_path):
+    registry = load_listed_registry(csv_path)
+    assert len(registry) == 2
+    assert registry.name_of("1234567") == "臺灣測試股份有限公司"
+    assert registry.ban_of("台灣測試 股份有限公司") == "01234567"
+    assert registry.is_listed(company_name="乙公司")
+    assert not registry.is_listed(business_no="11111111", company_name="丙公司")
+
+
+def test_sidecar_reused_until_csv_changes(csv_path, builds):
+    load_listed_registry(csv_path)
+    assert os.path.exists(csv_path + SIDECAR_SUFFIX)
+    assert len(builds) == 1
+
+    assert load_listed_registry(csv_path).name_of("87654321") == "乙公司"
+    assert len(builds) == 1  # 讀二進位檔，不重新解析 CSV
+
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("11111111,丙公司\n")
+    assert load_listed_registry(csv_path).name_of("11111111") == "丙公司"
+    assert len(builds) == 2
+
+    _touch_later(csv_path)  # 內容相同但修改時間改變也要重建
+    load_listed_registry(csv_path)
+    assert len(builds) == 3
+    load_listed_registry(csv_path)
+    assert len(builds) == 3
+
+
+def test_corrupt_sidecar_is_rebuilt(csv_path, builds):
+    with open(csv_path + SIDECAR_SUFFIX, "wb") as f:
+        f.write(b"not a pickle")
+    assert load_listed_registry(csv_path).name_of("87654321") == "乙公司"
+    assert len(builds) == 1
+    load_listed_registry(csv_path)
+    assert len(builds) == 1
+
+
+def test_process_registry_reloads_on_change(csv_path, builds, monkeypatch):
+    monkeypatch.setattr(listed_registry, "_registries", {})
+    first = get_listed_registry(csv_path)
+    assert get_listed_registry(csv_path) is first
+
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("11111111,丙公司\n")
+    reloaded = get_listed_registry(csv_path)
+    assert reloaded is not first
+    assert reloaded.name_of("11111111") == "丙公司"
+    assert len(builds) == 2
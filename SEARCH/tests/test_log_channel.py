@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""每筆查詢的日誌頻道：同時查詢互不混入，交給執行緒池的工作以 bind_context 沿用頻道"""
+
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import log_channel
+from log_channel import LogChannel, bind_context, capture
+
+
+def _fallback_stdout(monkeypatch) -> io.StringIO:
+    """以 StringIO 作為原本的 stdout，測試結束後還原（pytest 在測試開始前會重設 stdout，需在測試內呼叫）"""
+    fallback = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", fallback)
+    return fallback
+
+
+def _query(name: str, channel: LogChannel, pool: ThreadPoolExecutor, barrier: threading.Barrier) -> None:
+    with capture(channel):
+        print(f"{name} start")
+        barrier.wait()  # 兩筆查詢同時進行
+        futures = [pool.submit(bind_context(print), f"{name} worker {i}") for i in range(4)]
+        for f in futures:
+            f.result()
+        print(f"{name} done")
+
+
+def test_concurrent_queries_route_to_own_channel(monkeypatch):
+    stdout = _fallback_stdout(monkeypatch)
+    channels = {"甲": LogChannel(), "乙": LogChannel()}
+    barrier = threading.Barrier(2)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        threads = [threading.Thread(target=_query, args=(name, ch, pool, barrier)) for name, ch in channels.items()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    print("outside")
+
+    for name, ch in channels.items():
+        other = "乙" if name == "甲" else "甲"
+        lines = ch.getvalue().splitlines()
+        assert lines[0] == f"{name} start" and lines[-1] == f"{name} done"
+        assert sorted(lines[1:-1]) == [f"{name} worker {i}" for i in range(4)]
+        assert other not in ch.getvalue()
+    assert stdout.getvalue() == "outside\n"
+
+
+def test_pool_work_without_bind_context_uses_fallback(monkeypatch):
+    stdout = _fallback_stdout(monkeypatch)
+    channel = LogChannel()
+    with ThreadPoolExecutor(max_workers=1) as pool, capture(channel):
+        pool.submit(print, "unbound").result()
+        pool.submit(bind_context(print), "bound").result()
+    assert channel.getvalue() == "bound\n"
+    assert stdout.getvalue() == "unbound\n"
+
+
+def test_nested_capture_restores_outer_channel(monkeypatch):
+    _fallback_stdout(monkeypatch)
+    outer, inner = LogChannel(), LogChannel()
+    with capture(outer):
+        print("a")
+        with capture(inner):
+            print("b")
+            assert log_channel.current_channel() is inner
+        print("c")
+    assert log_channel.current_channel() is None
+    assert (outer.getvalue(), inner.getvalue()) == ("a\nc\n", "b\n")
+
+
+def test_install_is_idempotent(monkeypatch):
+    stdout = _fallback_stdout(monkeypatch)
+    log_channel.install()
+    proxy = sys.stdout
+    log_channel.install()
+    assert sys.stdout is proxy
+    print("plain")
+    assert stdout.getvalue() == "plain\n"
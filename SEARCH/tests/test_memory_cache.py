@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""行程內快取：TTL 過期、筆數 / 大小上限的 LRU 淘汰，以及命中統計"""
+
+import threading
+
+import pytest
+
+import query_cache
+from query_cache import MISSING, MemoryCache
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", fake)
+    return fake
+
+
+def test_ttl_expiry_per_source(clock):
+    cache = MemoryCache({"company": 60, "directors": 600})
+    cache.set("company", "12345678", {"公司名稱": "甲"})
+    cache.set("directors", "12345678", [])
+    cache.set("name", "甲", "12345678")  # 未設定 TTL 的來源不過期
+
+    clock.now += 60  # 到期當下即視為過期
+    assert cache.get("company", "12345678") is MISSING
+    assert cache.get("directors", "12345678") == []
+    clock.now += 1e6
+    assert cache.get("name", "甲") == "12345678"
+
+    stats = cache.stats()
+    assert (stats["expirations"], stats["hits"], stats["misses"]) == (1, 2, 1)
+    assert stats["entries"] == 2
+
+
+def test_lru_eviction_by_entries(clock):
+    cache = MemoryCache({}, max_entries=2)
+    cache.set("company", "a", 1)
+    cache.set("company", "b", 2)
+    assert cache.get("company", "a") == 1  # a 成為最近使用
+    cache.set("company", "c", 3)
+
+    assert cache.get("company", "b") is MISSING
+    assert (cache.get("company", "a"), cache.get("company", "c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+    assert len(cache) == 2
+
+
+def test_lru_eviction_by_size(clock):
+    cache = MemoryCache({}, max_bytes=20)
+    cache.set("company", "a", "x" * 6)   # 估計大小為 JSON 字元數：8
+    cache.set("company", "b", "y" * 6)
+    assert cache.stats()["bytes"] == 16
+    cache.set("company", "c", "z" * 6)   # 24 > 20，淘汰最舊的 a
+
+    assert cache.get("company", "a") is MISSING
+    assert cache.stats()["bytes"] == 16
+    cache.set("company", "huge", "w" * 100)  # 單筆超過上限不快取，也不淘汰其他項目
+    assert cache.get("company", "huge") is MISSING
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+
+def test_overwrite_and_invalidate_keep_size_accounting(clock):
+    cache = MemoryCache({}, max_bytes=1000)
+    cache.set("company", "12345678", "x" * 10, ban="12345678")
+    cache.set("company", "12345678", "x" * 4, ban="12345678")
+    cache.set("name", "甲", "12345678", ban="12345678")
+    cache.set("name", "乙", "87654321", ban="87654321")
+    assert cache.stats()["bytes"] == 6 + 10 + 10
+
+    assert cache.invalidate_ban("12345678") == 2
+    assert cache.stats()["bytes"] == 10 and len(cache) == 1
+    cache.clear("name")
+    assert cache.stats()["bytes"] == 0 and len(cache) == 0
+
+
+def test_cached_none_counts_as_hit(clock):
+    cache = MemoryCache({})
+    cache.set("company_no", "查無公司", None)
+    assert cache.get("company_no", "查無公司") is None
+    assert cache.get("company_no", "沒查過", default="預設") == "預設"
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_counters_consistent_under_threads():
+    cache = MemoryCache({}, max_entries=50)
+    per_thread = 2000
+
+    def worker(n):
+        for i in range(per_thread):
+            key = str((n * 7 + i) % 100)
+            if cache.get("company", key) is MISSING:
+                cache.set("company", key, i)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 8 * per_thread
+    assert stats["entries"] == 50
+    # 每次未命中寫入一筆，超出上限的被淘汰（兩個執行緒同時寫入同一鍵時只算一筆）
+    assert 0 < stats["evictions"] <= stats["misses"] - 50
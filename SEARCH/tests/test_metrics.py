@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""階段量測：巢狀 span 各自計算、查詢彙總跨執行緒，以及 Prometheus 文字格式"""
+
+import asyncio
+import re
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import metrics
+from log_channel import bind_context
+from metrics import MetricsRegistry, note_cache, note_external_call, query_trace, span, traced
+
+SAMPLE_RE = re.compile(r'^([a-z_]+)\{([a-z]+="[^"]*"(?:,[a-z]+="[^"]*")*)\} (\S+)$')
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", fresh)
+    return fresh
+
+
+def test_nested_spans_record_separately(registry):
+    with query_trace() as trace:
+        with span("outer"):
+            note_cache(False)
+            with span("inner"):
+                note_cache(True, count=2)
+                note_external_call("example.test", 200, 0.01, 100)
+                time.sleep(0.02)
+            note_external_call("example.test", 200, 0.01, 50)
+            time.sleep(0.01)
+
+    stats = registry.span_stats()
+    assert (stats["inner"]["cache_hits"], stats["inner"]["cache_misses"]) == (2, 0)
+    assert (stats["outer"]["cache_hits"], stats["outer"]["cache_misses"]) == (0, 1)
+    assert (stats["inner"]["calls"], stats["inner"]["bytes"]) == (1, 100)
+    assert (stats["outer"]["calls"], stats["outer"]["bytes"]) == (1, 50)  # 內層的呼叫不重複計入外層
+    assert stats["outer"]["seconds"] >= stats["inner"]["seconds"] >= 0.02
+
+    assert trace.elapsed >= stats["outer"]["seconds"]
+    assert [row["階段"] for row in trace.summary()] == ["outer", "inner"]  # 依總耗時排列
+
+
+def test_trace_follows_bound_pool_work(registry):
+    @traced("lookup")
+    def lookup(i):
+        note_cache(i % 2 == 0)
+        return i
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        with query_trace() as trace:
+            assert sorted(pool.map(bind_context(lookup), range(6))) == list(range(6))
+            pool.submit(lookup, 99).result()  # 未以 bind_context 包裝：只計入全域
+
+    (row,) = trace.summary()
+    assert (row["次數"], row["快取命中"], row["快取未命中"]) == (6, 3, 3)
+    assert registry.span_stats()["lookup"]["count"] == 7
+
+
+def test_traced_coroutine_spans_whole_await(registry):
+    @traced()
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    assert asyncio.run(fetch()) == "ok"
+    assert fetch.__name__ == "fetch"
+    assert registry.span_stats()["fetch"]["seconds"] >= 0.02
+
+
+def _parse(text):
+    """解析文字格式：回傳 {指標名稱: TYPE} 與樣本列表，並檢查每個樣本都在其 HELP/TYPE 之後"""
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        match = SAMPLE_RE.match(line)
+        assert match, f"無法解析: {line!r}"
+        name, labels, value = match.groups()
+        base = re.sub(r"_(bucket|sum|count)$", "", name)
+        family = base if types.get(base) == "histogram" else name
+        assert family in types, f"{name} 缺少 TYPE"
+        samples.append((name, dict(re.findall(r'([a-z]+)="([^"]*)"', labels)), float(value)))
+    return types, samples
+
+
+def test_prometheus_format(registry):
+    for seconds in (0.005, 0.2, 3.0):
+        registry.record_span(metrics.Span("crawl"), seconds)
+    registry.record_http("data.gcis.nat.gov.tw", "200", 0.3, 1024)
+    registry.record_http("data.gcis.nat.gov.tw", "200", 0.2, 512)
+    text = registry.render_prometheus()
+    assert text.endswith("\n")
+
+    types, samples = _parse(text)
+    assert types["beneficiary_stage_duration_seconds"] == "histogram"
+    assert types["beneficiary_http_requests_total"] == "counter"
+
+    buckets = [(s[1]["le"], s[2]) for s in samples if s[0] == "beneficiary_stage_duration_seconds_bucket"]
+    counts = [c for _, c in buckets]
+    assert counts == sorted(counts)  # 累計值
+    assert dict(buckets)["0.01"] == 1 and dict(buckets)["0.25"] == 2 and dict(buckets)["+Inf"] == 3
+    values = {(s[0], tuple(sorted(s[1].items()))): s[2] for s in samples}
+    assert values[("beneficiary_stage_duration_seconds_count", (("stage", "crawl"),))] == 3
+    assert values[("beneficiary_stage_duration_seconds_sum", (("stage", "crawl"),))] == pytest.approx(3.205)
+    http_labels = (("host", "data.gcis.nat.gov.tw"), ("status", "200"))
+    assert values[("beneficiary_http_requests_total", http_labels)] == 2
+    assert values[("beneficiary_http_response_bytes_total", http_labels)] == 1536
+
+
+def test_write_prometheus_replaces_file(registry, tmp_path):
+    path = tmp_path / "metrics.prom"
+    path.write_text("old", encoding="utf-8")
+    registry.record_span(metrics.Span("crawl"), 0.1)
+    registry.write_prometheus(str(path))
+    assert path.read_text(encoding="utf-8") == registry.render_prometheus()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_metrics_server_serves_registry(registry):
+    registry.record_span(metrics.Span("crawl"), 0.1)
+    server = metrics.start_metrics_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert resp.read().decode("utf-8") == registry.render_prometheus()
+    finally:
+        server.shutdown()
+        server.server_close()
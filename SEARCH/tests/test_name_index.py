@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""本機名稱索引：命中、同名多家、查無，以及索引檔晚於程式建立時的重試"""
+
+import contextlib
+import io
+
+import pytest
+
+from name_index import CompanyNameIndex, build_name_index
+from synthetic_graph import generate_world
+
+
+def _write_csv(path, rows):
+    lines = ["統一編號,公司名稱"] + [f"{ban},{name}" for ban, name in rows]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8-sig")
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    csv_path = _write_csv(tmp_path / "companies.csv", [
+        ("12345678", "臺灣測試股份有限公司"),
+        ("23456789", "同名股份有限公司"),
+        ("34567890", "同名股份有限公司"),
+        ("4567890.0", "乙公司"),
+    ])
+    index_path = str(tmp_path / "company_names.sqlite3")
+    assert build_name_index(csv_path, index_path) == 4
+    idx = CompanyNameIndex(index_path)
+    yield idx
+    idx.close()
+
+
+def test_index_lookup(index):
+    assert len(index) == 4
+    assert index.lookup("臺灣測試股份有限公司") == "12345678"
+    assert index.lookup(" 台灣測試 股份有限公司 ") == "12345678"  # 正規化名稱
+    assert index.lookup("乙公司") == "04567890"
+    assert index.lookup("同名股份有限公司") is None                # 同名多家
+    assert index.lookup("查無股份有限公司") is None
+    assert index.lookup("") is None
+
+
+@pytest.fixture
+def enabled_index(backend, tmp_path, monkeypatch):
+    """開啟後端的名稱索引，指向 tmp_path 下尚未建立的檔案"""
+    index_path = str(tmp_path / "company_names.sqlite3")
+    monkeypatch.setattr(backend, "NAME_INDEX_ENABLED", True)
+    monkeypatch.setattr(backend, "NAME_INDEX_PATH", index_path)
+    monkeypatch.setattr(backend, "_name_index", None)
+    monkeypatch.setattr(backend, "_name_index_failed", None)
+    yield index_path
+    if backend._name_index is not None:
+        backend._name_index.close()
+
+
+def test_backend_uses_index_before_remote(backend, fake_sites, enabled_index, tmp_path):
+    fake_sites.world = world = generate_world(1, 2)
+    root = world.root
+    other = next(c for c in world.companies.values() if c is not root)
+    rows = [(root.統編, root.名稱), ("99999998", "同名股份有限公司"), ("99999999", "同名股份有限公司")]
+    build_name_index(_write_csv(tmp_path / "companies.csv", rows), enabled_index)
+    backend.clear_memory_caches()
+    fake_sites.reset_counts()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert backend.get_business_no_by_name(root.名稱) == root.統編
+        assert fake_sites.counts["opendata"] == 0          # 命中索引，不查遠端
+
+        backend.get_business_no_by_name("同名股份有限公司")
+        assert fake_sites.counts["opendata"] == 1          # 同名多家交給遠端
+
+        assert backend.get_business_no_by_name(other.名稱) == other.統編
+        assert fake_sites.counts["opendata"] == 2          # 索引查無交給遠端
+
+
+def test_missing_index_is_retried_after_creation(backend, enabled_index, tmp_path, monkeypatch):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert backend.get_name_index() is None
+        build_name_index(_write_csv(tmp_path / "companies.csv", [("12345678", "甲公司")]), enabled_index)
+
+        # 退避期間不重複檢查檔案
+        assert backend.get_name_index() is None
+
+        monkeypatch.setattr(backend, "NAME_INDEX_RETRY_SECONDS", 0)
+        monkeypatch.setattr(backend, "_name_index_failed", (None, 0.0))
+        index = backend.get_name_index()
+    assert index is not None
+    assert index.lookup("甲公司") == "12345678"
+    assert backend.get_name_index() is index
+
+
+def test_unopenable_index_retried_only_when_file_changes(backend, enabled_index, tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "NAME_INDEX_RETRY_SECONDS", 0)
+    opened = []
+
+    def failing_open(path):
+        opened.append(path)
+        raise OSError("locked")
+
+    with open(enabled_index, "wb") as f:
+        f.write(b"partial")
+    monkeypatch.setattr(backend, "CompanyNameIndex", failing_open)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert backend.get_name_index() is None
+        assert backend.get_name_index() is None
+        assert len(opened) == 1                             # 檔案未變，不再嘗試開啟
+
+        monkeypatch.setattr(backend, "CompanyNameIndex", CompanyNameIndex)
+        build_name_index(_write_csv(tmp_path / "companies.csv", [("12345678", "甲公司")]), enabled_index)
+        index = backend.get_name_index()
+    assert index is not None and index.lookup("甲公司") == "12345678"
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""自然人持股計算：矩陣法在無循環時須與逐條路徑法相同，說明紀錄不可隨路徑數暴增"""
+
+import contextlib
+import io
+
+import pytest
+
+from synthetic_graph import generate_world
+
+
+def _crawl(backend, fake_sites, world):
+    fake_sites.world = world
+    backend.clear_memory_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.crawl_director_chain(world.root.名稱, concurrency=4)
+
+
+def _shares(backend, df, method):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.calc_final_natural_person_shares(df, threshold=0.0, method=method)
+
+
+def test_default_method_is_paths(backend):
+    assert backend.OWNERSHIP_METHOD == "paths"
+
+
+@pytest.mark.parametrize("seed", (0, 1, 2))
+def test_matrix_matches_paths_without_cycles(backend, fake_sites, seed):
+    df = _crawl(backend, fake_sites, generate_world(3, 3, 0.0, seed=seed))
+    by_paths, _ = _shares(backend, df, "paths")
+    by_matrix, _ = _shares(backend, df, "matrix")
+    assert by_paths
+    assert by_matrix == pytest.approx(by_paths)
+
+
+def test_matrix_log_does_not_enumerate_paths(backend, fake_sites):
+    df = _crawl(backend, fake_sites, generate_world(4, 3, 0.5, seed=4))
+    graph = backend.OwnershipGraph.from_frame(df)
+    shares, log = _shares(backend, df, "matrix")
+    persons = {name for name, _, _ in graph.person_leaves}
+    assert len(log) <= len(graph.person_leaves) + len(persons) + 1
+    assert shares
+
+
+def test_matrix_rejects_several_roots(backend):
+    graph = backend.OwnershipGraph()
+    graph.roots = {"甲公司", "乙公司"}
+    graph.person_leaves = [("自然人", "甲公司", 0.5)]
+    with pytest.raises(ValueError):
+        backend.solve_ownership_matrix(graph)
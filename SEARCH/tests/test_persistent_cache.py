@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""本機 SQLite 快取：各來源 TTL、LRU 淘汰、依統編失效"""
+
+import pytest
+
+import query_cache
+from query_cache import MISSING, PersistentCache
+
+
+class _Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(query_cache.time, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(ttls, max_entries=50000):
+        cache = PersistentCache(str(tmp_path / "cache.sqlite3"), ttls=ttls, max_entries=max_entries)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_ttl_is_per_source(make_cache, clock):
+    cache = make_cache({"company": 60, "directors": 600})
+    cache.set("company", "12345678", {"公司名稱": "甲"})
+    cache.set("directors", "12345678", [{"姓名": "王小明"}])
+    cache.set("name", "甲", "12345678")  # 未設定 TTL 的來源不過期
+
+    clock.now += 120
+    assert cache.get("company", "12345678") is MISSING
+    assert cache.get("directors", "12345678") == [{"姓名": "王小明"}]
+    assert cache.get("name", "甲") == "12345678"
+
+    clock.now += 600
+    assert cache.get("directors", "12345678") is MISSING
+    assert cache.get("name", "甲") == "12345678"
+
+
+def test_cached_none_is_distinct_from_missing(make_cache, clock):
+    cache = make_cache({})
+    cache.set("name", "查無公司", None)
+    assert cache.get("name", "查無公司") is None
+    assert cache.get("name", "沒查過") is MISSING
+
+
+def test_lru_eviction_keeps_recently_read_entries(make_cache, clock):
+    cache = make_cache({}, max_entries=3)
+    for i in range(3):
+        cache.set("company", str(i), i)
+        clock.now += 1
+    assert cache.get("company", "0") == 0  # 讀取後成為最近使用
+    clock.now += 1
+    cache.set("company", "3", 3)
+    cache._evict()
+
+    assert cache.get("company", "1") is MISSING
+    assert [cache.get("company", k) for k in ("0", "2", "3")] == [0, 2, 3]
+
+
+def test_eviction_runs_periodically_on_write(make_cache, clock):
+    cache = make_cache({}, max_entries=10)
+    for i in range(PersistentCache._EVICT_EVERY):
+        cache.set("company", str(i), i)
+        clock.now += 1
+    kept = [k for k in range(PersistentCache._EVICT_EVERY) if cache.get("company", str(k)) is not MISSING]
+    assert kept == list(range(PersistentCache._EVICT_EVERY - 10, PersistentCache._EVICT_EVERY))
+
+
+def test_entries_survive_reopen(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentCache(path, ttls={"company": 60})
+    cache.set("company", "12345678", {"公司名稱": "甲"})
+    cache.close()
+
+    reopened = PersistentCache(path, ttls={"company": 60})
+    try:
+        assert reopened.get("company", "12345678") == {"公司名稱": "甲"}
+    finally:
+        reopened.close()
+
+
+def test_invalidate_ban_removes_every_source(make_cache, clock):
+    cache = make_cache({})
+    cache.set("company", "12345678", {"公司名稱": "甲"}, ban="12345678")
+    cache.set("directors", "12345678", [], ban="12345678")
+    cache.set("name", "甲", "12345678", ban="12345678")
+    cache.set("company", "87654321", {"公司名稱": "乙"}, ban="87654321")
+
+    assert cache.invalidate_ban("12345678") == 3
+    assert cache.get("company", "12345678") is MISSING
+    assert cache.get("directors", "12345678") is MISSING
+    assert cache.get("name", "甲") is MISSING
+    assert cache.get("company", "87654321") == {"公司名稱": "乙"}
+    assert cache.invalidate_ban("12345678") == 0
+
+
+def test_invalidate_business_no_clears_both_tiers(backend, make_cache, clock, monkeypatch):
+    cache = make_cache({})
+    monkeypatch.setattr(backend, "get_persistent_cache", lambda: cache)
+    memory = backend.get_memory_cache()
+    cache.set("company", "12345678", {"公司名稱": "甲"}, ban="12345678")
+    memory.set("company", "12345678", {"公司名稱": "甲"}, ban="12345678")
+
+    backend.invalidate_business_no("12345678")
+
+    assert cache.get("company", "12345678") is MISSING
+    assert memory.get("company", "12345678") is MISSING
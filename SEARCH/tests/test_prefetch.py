@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""預取：結果與外部請求數須與不預取時相同；深度優先與逐層模式的差異在董監事批次查詢的次數"""
+
+import contextlib
+import io
+import time
+
+import pytest
+
+from synthetic_graph import generate_world
+
+
+def _crawl(backend, sites, seed: str, concurrency: int):
+    backend.clear_memory_caches()
+    sites.reset_counts()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = backend.crawl_director_chain(seed, concurrency=concurrency)
+    # 等背景預取全部結束，請求數才完整
+    while backend._single_flight.in_flight():
+        time.sleep(0.01)
+    return df, dict(sites.counts)
+
+
+@pytest.mark.parametrize("concurrency", (1, 4))
+def test_prefetch_matches_plain_crawl(backend, fake_sites, monkeypatch, concurrency):
+    fake_sites.world = generate_world(3, 2, 0.3, seed=5)
+    seed = fake_sites.world.root.名稱
+    monkeypatch.setattr(backend, "PREFETCH_ENABLED", False)
+    expected, expected_counts = _crawl(backend, fake_sites, seed, concurrency)
+    monkeypatch.setattr(backend, "PREFETCH_ENABLED", True)
+    df, counts = _crawl(backend, fake_sites, seed, concurrency)
+    assert df.equals(expected)
+    assert counts["gcis"] == expected_counts["gcis"]
+    assert counts["opendata"] == expected_counts["opendata"]
+
+
+def test_depth_first_batches_directors_per_parent(backend, fake_sites, monkeypatch):
+    fake_sites.world = generate_world(3, 3, 0.3, seed=3)
+    seed = fake_sites.world.root.名稱
+    monkeypatch.setattr(backend, "PREFETCH_ENABLED", True)
+    depth_first, depth_first_counts = _crawl(backend, fake_sites, seed, 1)
+    levelwise, levelwise_counts = _crawl(backend, fake_sites, seed, 4)
+
+    # 兩種模式查的公司相同（統編查詢次數相同），差別只在董監事批次的切法
+    assert depth_first_counts["opendata"] == levelwise_counts["opendata"]
+    parents = depth_first.loc[depth_first["所代表法人"].astype(str).str.strip().ne(""), "from_company"].nunique()
+    assert levelwise_counts["gcis"] <= levelwise["level"].nunique() + 1
+    assert levelwise_counts["gcis"] < depth_first_counts["gcis"] <= parents + 1
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""門檻剪枝：剪枝結果須與不剪枝時一致，多條路徑累計達門檻的分支不可被剪掉"""
+
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from synthetic_graph import Company, Director, SyntheticWorld, generate_world
+
+MODES = ("depth_first", "levelwise", "async")
+
+
+def _crawl(backend, seed: str, mode: str, prune_threshold):
+    backend.clear_memory_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "async":
+            async def run():
+                async with backend.new_async_http() as http:
+                    return await backend.crawl_director_chain_async(seed, http, prune_threshold=prune_threshold)
+            return asyncio.run(run())
+        concurrency = 4 if mode == "levelwise" else 1
+        return backend.crawl_director_chain(seed, concurrency=concurrency, prune_threshold=prune_threshold)
+
+
+def _diamond_world() -> SyntheticWorld:
+    """種子經 A、B 兩條路徑各持有 X 30%，X 持有 Z 50%：Z 的累計持股為 30%"""
+    def company(ban, name, directors):
+        return Company(統編=ban, 名稱=name, 已發行股數=1000, 董監事=directors)
+
+    seed = company("98000001", "剪枝測試種子股份有限公司", [
+        Director("董事", "甲代表", "剪枝測試A股份有限公司", 500),
+        Director("董事", "乙代表", "剪枝測試B股份有限公司", 500),
+    ])
+    a = company("98000002", "剪枝測試A股份有限公司", [Director("董事", "丙代表", "剪枝測試X股份有限公司", 600)])
+    b = company("98000003", "剪枝測試B股份有限公司", [Director("董事", "丁代表", "剪枝測試X股份有限公司", 600)])
+    x = company("98000004", "剪枝測試X股份有限公司", [
+        Director("董事", "戊代表", "剪枝測試Z股份有限公司", 500),
+        Director("董事長", "自然人己", "", 500),
+    ])
+    z = company("98000005", "剪枝測試Z股份有限公司", [Director("董事長", "自然人庚", "", 600)])
+    companies = {c.統編: c for c in (seed, a, b, x, z)}
+    return SyntheticWorld(root=seed, companies=companies, by_name={c.名稱: c for c in companies.values()})
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_tiny_threshold_matches_unpruned(backend, fake_sites, mode):
+    fake_sites.world = generate_world(3, 3, 0.3, seed=3)
+    seed = fake_sites.world.root.名稱
+    unpruned = _crawl(backend, seed, mode, None)
+    pruned = _crawl(backend, seed, mode, 1e-9)
+    assert pruned.attrs["pruned"] == {}
+    assert pruned.equals(unpruned)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_branch_reached_by_several_paths_is_expanded(backend, fake_sites, mode):
+    fake_sites.world = _diamond_world()
+    df = _crawl(backend, fake_sites.world.root.名稱, mode, 0.25)
+    assert "剪枝測試Z股份有限公司" not in df.attrs["pruned"]
+    assert "剪枝測試Z股份有限公司" in set(df["from_company"])
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_branch_below_threshold_is_pruned(backend, fake_sites, mode):
+    fake_sites.world = _diamond_world()
+    df = _crawl(backend, fake_sites.world.root.名稱, mode, 0.35)
+    assert df.attrs["pruned"] == {"剪枝測試Z股份有限公司": pytest.approx(0.30)}
+    assert "剪枝測試Z股份有限公司" not in set(df["from_company"])
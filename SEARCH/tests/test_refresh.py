@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""增量重查：refresh 不可讀到舊的快取資料，也不為未變動的公司抓公司資料"""
+
+import contextlib
+import io
+import time
+
+from query_cache import MISSING
+from synthetic_graph import Director, generate_world
+
+STALE_DIRECTORS = [{"職稱": "董事長", "姓名": "舊董事長", "所代表法人": "", "所持有股數": 1.0, "出資額": None,
+                    "統一編號": ""}]
+
+
+def test_refresh_fallback_bypasses_persistent_cache(backend, fake_sites, monkeypatch):
+    fake_sites.world = generate_world(1, 1)
+    business_no = fake_sites.world.root.統編
+    backend.clear_memory_caches()
+    # 持久快取中有舊資料，批次請求失敗時逐筆查詢也不可沿用
+    monkeypatch.setattr(backend, "_disk_cache_get",
+                        lambda source, key: STALE_DIRECTORS if source == "directors" else MISSING)
+    monkeypatch.setattr(backend, "_fetch_directors_batch", lambda business_nos: None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fresh = backend.fetch_directors_by_business_nos([business_no], refresh=True)
+    names = {d["姓名"] for d in fresh[business_no]}
+    assert names == {d.姓名 for d in fake_sites.world.root.董監事}
+
+
+def _snapshot(backend, seed: str):
+    previous = {}
+    backend.clear_memory_caches()
+    with contextlib.redirect_stdout(io.StringIO()):
+        backend.crawl_director_chain(seed, concurrency=1, collect=previous)
+    return previous
+
+
+def _refresh(backend, sites, seed: str, previous):
+    backend.clear_memory_caches()
+    sites.reset_counts()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, _, changed = backend.refresh_director_chain(seed, previous)
+    while backend._single_flight.in_flight():
+        time.sleep(0.01)
+    return changed, dict(sites.counts)
+
+
+def test_unchanged_snapshot_fetches_no_company_info(backend, fake_sites, monkeypatch):
+    monkeypatch.setattr(backend, "PREFETCH_ENABLED", True)
+    fake_sites.world = generate_world(2, 3, seed=2)
+    seed = fake_sites.world.root.名稱
+    previous = _snapshot(backend, seed)
+    changed, counts = _refresh(backend, fake_sites, seed, previous)
+    assert changed == []
+    assert counts.get("findbiz", 0) == 0
+
+
+def test_refresh_prefetches_only_changed_companies(backend, fake_sites, monkeypatch):
+    monkeypatch.setattr(backend, "PREFETCH_ENABLED", True)
+    world = generate_world(2, 3, seed=2)
+    fake_sites.world = world
+    seed = world.root.名稱
+    previous = _snapshot(backend, seed)
+
+    backend.clear_memory_caches()
+    fake_sites.reset_counts()
+    backend.fetch_company_info_findbiz(world.root.統編, use_cache=False)
+    one_company = fake_sites.counts["findbiz"]
+
+    world.root.董監事.append(Director("董事", "新任自然人", "", 10))
+    changed, counts = _refresh(backend, fake_sites, seed, previous)
+    assert changed == [seed]
+    # 只重抓種子公司；未變動的子法人沿用快照，不預取
+    assert counts["findbiz"] <= one_company
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""外部回應錄製與回放：錄製後回放得到相同結果，且回放期間完全不連網路"""
+
+import contextlib
+import io
+import json
+import socket
+
+import pandas as pd
+import pytest
+
+from replay import REPLAY, RECORD, ReplayMiss, ResponseRecorder
+from synthetic_graph import generate_world
+
+
+class _Response:
+    def __init__(self, status_code, content, encoding="utf-8", headers=None):
+        self.status_code = status_code
+        self.url = "https://example.test/api"
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers or {"Content-Type": "application/json", "Set-Cookie": "secret"}
+
+
+def test_query_round_trip_without_network(backend, fake_sites, tmp_path, monkeypatch):
+    fake_sites.world = world = generate_world(2, 2, 0.2, seed=3)
+    cassette = str(tmp_path / "cassette.json")
+    fake_sites.reset_counts()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with backend.external_responses(RECORD, cassette) as recorder:
+            recorded = backend.run_query(world.root.統編)
+    assert len(recorder) > 0
+    assert sum(fake_sites.counts.values()) > 0
+
+    def no_network(*args, **kwargs):
+        raise OSError("回放期間不應連線")
+
+    monkeypatch.setattr(socket.socket, "connect", no_network)
+    fake_sites.reset_counts()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with backend.external_responses(REPLAY, cassette):
+            replayed = backend.run_query(world.root.統編)
+
+    assert sum(fake_sites.counts.values()) == 0
+    pd.testing.assert_frame_equal(recorded["full_result"], replayed["full_result"])
+    assert recorded["beneficial_owners"] == replayed["beneficial_owners"]
+    assert not backend.PERSISTENT_CACHE_ENABLED  # 錄放結束後還原 load_backend 的設定
+
+
+def test_repeated_requests_replay_in_order(tmp_path):
+    path = str(tmp_path / "cassette.json")
+    recorder = ResponseRecorder(path, RECORD)
+    params = {"$filter": "Business_Accounting_NO eq 12345678", "$format": "json"}
+    recorder.record_http("GET", "https://example.test/api", {"params": params}, _Response(503, b"busy"))
+    recorder.record_http("GET", "https://example.test/api", {"params": params}, _Response(200, b'[{"a": 1}]'))
+    recorder.record_http("GET", "https://example.test/bin", {}, _Response(200, b"\xff\xfe", encoding="utf-8"))
+    recorder.record_page("12345678", " 甲公司 ", "<html>甲</html>")
+    recorder.save()
+
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    headers = next(iter(saved["entries"].values()))[0]["headers"]
+    assert "Set-Cookie" not in headers  # 只保留需要的標頭
+
+    player = ResponseRecorder(path, REPLAY)
+    reordered = dict(reversed(list(params.items())))  # 參數順序不影響對應
+    first = player.replay_http("GET", "https://example.test/api", {"params": reordered})
+    second = player.replay_http("GET", "https://example.test/api", {"params": params})
+    third = player.replay_http("GET", "https://example.test/api", {"params": params})
+    assert (first.status_code, second.status_code, third.status_code) == (503, 200, 200)  # 用完後重複最後一筆
+    assert second.json() == [{"a": 1}]
+    assert player.replay_http("GET", "https://example.test/bin", {}).content == b"\xff\xfe"
+    assert player.replay_page("12345678", "甲公司") == "<html>甲</html>"
+    assert player.replay_page("87654321", "乙公司") is None
+    with pytest.raises(ReplayMiss):
+        player.replay_http("GET", "https://example.test/other", {})
+
+
+def test_invalid_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseRecorder(str(tmp_path / "cassette.json"), "playback")
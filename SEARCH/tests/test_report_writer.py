@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""報表輸出：XLSX、CSV、Parquet 各格式讀回的內容與工作表一致"""
+
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+import report_writer
+from report_writer import (
+    REPORT_FORMATS, available_formats, batch_sheets, parquet_available, report_bytes, result_sheets,
+)
+
+
+def _result(ban: str, name: str, ratio: float) -> dict:
+    return {
+        "full_result": pd.DataFrame([{"公司名稱": name, "姓名": "王小明", "持股比例": ratio}]),
+        "beneficial_owners": [{"姓名": "王小明", "最終持股比例": ratio}],
+        "company_info": {"統一編號": [ban], "公司名稱": [name]},
+        "holding_process": None,
+        "warnings": pd.DataFrame(),
+    }
+
+
+def _read_back(data: bytes, fmt: str) -> dict:
+    """讀回報表：{工作表名稱: DataFrame}"""
+    if fmt == "xlsx":
+        return pd.read_excel(io.BytesIO(data), sheet_name=None, dtype={"統一編號": str, "查詢統編": str})
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        sheets = {}
+        for info in archive.infolist():
+            sheet, ext = info.filename.rsplit(".", 1)
+            assert ext == fmt
+            with archive.open(info) as f:
+                content = f.read()
+            if fmt == "csv":
+                assert content == b"" or content.startswith(b"\xef\xbb\xbf")  # Excel 需要 BOM
+                sheets[sheet] = pd.read_csv(io.BytesIO(content), encoding="utf-8-sig",
+                                            dtype={"統一編號": str, "查詢統編": str}) \
+                    if content else pd.DataFrame()
+            else:
+                sheets[sheet] = pd.read_parquet(io.BytesIO(content))
+        return sheets
+
+
+FORMATS = [pytest.param(fmt, marks=pytest.mark.skipif(fmt == "parquet" and not parquet_available(),
+                                                      reason="未安裝 pyarrow / fastparquet"))
+           for fmt in REPORT_FORMATS]
+
+
+def test_result_sheets_include_optional_only_when_present():
+    result = _result("12345678", "甲公司", 0.5)
+    assert [sheet for sheet, _ in result_sheets(result)] == [sheet for sheet, _ in report_writer.RESULT_SHEETS]
+    result["timing"] = [{"階段": "crawl", "總耗時(秒)": 1.0}]
+    assert [sheet for sheet, _ in result_sheets(result)][-1] == "查詢耗時"
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_single_result_round_trip(fmt):
+    sheets = _read_back(report_bytes(result_sheets(_result("01234567", "甲公司", 0.5)), fmt), fmt)
+
+    assert set(sheets) == {sheet for sheet, _ in report_writer.RESULT_SHEETS}
+    owners = sheets["實質受益人"]
+    assert owners.to_dict("records") == [{"姓名": "王小明", "最終持股比例": 0.5}]
+    assert sheets["公司基本資料"]["統一編號"].tolist() == ["01234567"]  # 統編前導 0 保留
+    assert sheets["警示報告"].empty and sheets["持股計算過程"].empty
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_batch_sheets_union_columns(fmt):
+    first = _result("12345678", "甲公司", 0.5)
+    second = _result("87654321", "乙公司", 0.25)
+    second["full_result"] = second["full_result"].assign(備註="交叉持股")
+    summary = pd.DataFrame([{"統編": "12345678", "狀態": "完成"}, {"統編": "87654321", "狀態": "完成"}])
+    results = {"12345678": first, "87654321": second, "99999999": "查詢失敗"}
+
+    sheets = _read_back(report_bytes(batch_sheets(summary, results), fmt), fmt)
+
+    assert sheets["批次摘要"]["狀態"].tolist() == ["完成", "完成"]
+    full = sheets["完整查詢結果"]
+    assert list(full.columns) == ["查詢統編", "公司名稱", "姓名", "持股比例", "備註"]
+    assert full["查詢統編"].tolist() == ["12345678", "87654321"]
+    assert pd.isna(full["備註"].iloc[0]) and full["備註"].iloc[1] == "交叉持股"
+    assert sheets["實質受益人"]["最終持股比例"].tolist() == [0.5, 0.25]
+
+
+def test_mixed_object_column_written_as_text():
+    if not parquet_available():
+        pytest.skip("未安裝 pyarrow / fastparquet")
+    frame = pd.DataFrame({"值": [1, "二", None, float("nan")]})
+    sheets = _read_back(report_bytes([("混合", [frame])], "parquet"), "parquet")
+    values = sheets["混合"]["值"]
+    assert values.iloc[:2].tolist() == ["1", "二"]
+    assert values.iloc[2:].isna().all()
+
+
+def test_available_formats_and_unknown_format(monkeypatch):
+    monkeypatch.setattr(report_writer, "parquet_available", lambda: False)
+    assert available_formats() == ["xlsx", "csv"]
+    with pytest.raises(ValueError):
+        report_bytes(result_sheets(_result("12345678", "甲公司", 0.5)), "json")
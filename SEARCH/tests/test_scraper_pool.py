@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""瀏覽器連線池：借出 / 歸還重用同一個瀏覽器，健康檢查失敗或超過頁數上限時換新"""
+
+import pytest
+
+
+class _FakeScraper:
+    """代替 FindbizSeleniumScraper，不啟動 Chromium"""
+
+    created = []
+
+    def __init__(self, headless=True):
+        self.alive = True
+        self.closed = False
+        self.pages_served = 0
+        _FakeScraper.created.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(backend, monkeypatch):
+    _FakeScraper.created = []
+    monkeypatch.setattr(backend, "FindbizSeleniumScraper", _FakeScraper)
+    pool = backend.FindbizScraperPool(max_size=2, max_pages=3, checkout_timeout=0.1)
+    yield pool
+    pool.close()
+
+
+def test_checkin_makes_scraper_reusable(pool):
+    first = pool.checkout()
+    pool.checkin(first)
+    assert pool.checkout() is first
+    assert len(_FakeScraper.created) == 1
+
+
+def test_dead_scraper_is_replaced_on_checkout(pool, capsys):
+    first = pool.checkout()
+    pool.checkin(first)
+    first.alive = False
+    second = pool.checkout()
+    assert second is not first
+    assert first.closed
+    assert "健康檢查失敗" in capsys.readouterr().out
+
+
+def test_checkout_waits_then_times_out_when_pool_is_full(pool):
+    pool.checkout()
+    pool.checkout()
+    with pytest.raises(TimeoutError):
+        pool.checkout()
+
+
+def test_scraper_retired_after_max_pages(pool):
+    first = pool.checkout()
+    first.pages_served = 3
+    pool.checkin(first)
+    assert first.closed
+    assert pool.checkout() is not first
+
+
+def test_error_inside_with_block_discards_scraper(pool):
+    with pytest.raises(RuntimeError):
+        with pool.scraper() as scraper:
+            raise RuntimeError("頁面載入失敗")
+    assert scraper.closed
+    # 名額已釋放，仍可借出兩個
+    pool.checkout()
+    pool.checkout()